@@ -0,0 +1,32 @@
+"""index topics on (created_at, id) for keyset pagination
+
+Revision ID: 7ad3d3a1b9bb
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7ad3d3a1b9bb'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows with a NULL created_at would never be reached by the keyset cursor
+    op.execute(
+        sa.text("UPDATE topics SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    )
+    op.create_index('ix_topics_created_at_id', 'topics', ['created_at', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_topics_created_at_id', table_name='topics')
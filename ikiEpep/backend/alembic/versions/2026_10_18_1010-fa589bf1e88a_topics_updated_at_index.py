@@ -0,0 +1,28 @@
+"""index topics.updated_at for the listing ETag
+
+Revision ID: fa589bf1e88a
+Revises: 7ad3d3a1b9bb
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fa589bf1e88a'
+down_revision: Union[str, None] = '7ad3d3a1b9bb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_topics_updated_at', 'topics', ['updated_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_topics_updated_at', table_name='topics')
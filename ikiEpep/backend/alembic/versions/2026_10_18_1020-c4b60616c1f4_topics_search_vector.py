@@ -0,0 +1,47 @@
+"""full-text search vector and GIN index on topics
+
+Revision ID: c4b60616c1f4
+Revises: fa589bf1e88a
+Create Date: 2026-10-18 10:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4b60616c1f4'
+down_revision: Union[str, None] = 'fa589bf1e88a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # PostgreSQL only (generated columns need 12+); other databases fall
+    # back to the in-process index in forum/search.py.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(
+        """
+        ALTER TABLE topics ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(content, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(username, '')), 'C')
+        ) STORED
+        """
+    )
+    op.create_index(
+        'ix_topics_search_vector', 'topics', ['search_vector'], postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_topics_search_vector', table_name='topics')
+    op.drop_column('topics', 'search_vector')
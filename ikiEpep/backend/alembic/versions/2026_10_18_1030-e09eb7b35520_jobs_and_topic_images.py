@@ -0,0 +1,43 @@
+"""jobs table and topics.imagekit_file_id
+
+Revision ID: e09eb7b35520
+Revises: c4b60616c1f4
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e09eb7b35520'
+down_revision: Union[str, None] = 'c4b60616c1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('topics', sa.Column('imagekit_file_id', sa.String(255), nullable=True))
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('kind', sa.String(100), nullable=False),
+        sa.Column('payload', sa.Text, nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('run_after', sa.DateTime, nullable=False),
+        sa.Column('last_error', sa.Text),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+    )
+    op.create_index('ix_jobs_status_run_after', 'jobs', ['status', 'run_after'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_jobs_status_run_after', table_name='jobs')
+    op.drop_table('jobs')
+    op.drop_column('topics', 'imagekit_file_id')
@@ -0,0 +1,51 @@
+"""topics.user_id foreign key and per-user topic counters
+
+Revision ID: 96814cb1952c
+Revises: e09eb7b35520
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '96814cb1952c'
+down_revision: Union[str, None] = 'e09eb7b35520'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('topics') as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer, nullable=True))
+        batch_op.create_foreign_key(
+            'fk_topics_user_id_users', 'users', ['user_id'], ['id'], ondelete='CASCADE'
+        )
+    op.add_column('users', sa.Column('topic_count', sa.Integer, nullable=False, server_default='0'))
+    op.add_column('users', sa.Column('last_posted_at', sa.DateTime, nullable=True))
+
+    # Backfill from the username column topics were linked by until now
+    op.execute(sa.text(
+        "UPDATE topics SET user_id = "
+        "(SELECT users.id FROM users WHERE users.username = topics.username)"
+    ))
+    op.create_index('ix_topics_user_id_created_at_id', 'topics', ['user_id', 'created_at', 'id'])
+    op.execute(sa.text(
+        "UPDATE users SET "
+        "topic_count = (SELECT count(*) FROM topics WHERE topics.user_id = users.id), "
+        "last_posted_at = (SELECT max(topics.created_at) FROM topics WHERE topics.user_id = users.id)"
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'last_posted_at')
+    op.drop_column('users', 'topic_count')
+    op.drop_index('ix_topics_user_id_created_at_id', table_name='topics')
+    with op.batch_alter_table('topics') as batch_op:
+        batch_op.drop_constraint('fk_topics_user_id_users', type_='foreignkey')
+        batch_op.drop_column('user_id')
@@ -0,0 +1,51 @@
+"""posts table and topic reply counters
+
+Revision ID: 825eb8ebce95
+Revises: 96814cb1952c
+Create Date: 2026-10-18 10:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '825eb8ebce95'
+down_revision: Union[str, None] = '96814cb1952c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('topics', sa.Column('reply_count', sa.Integer, nullable=False, server_default='0'))
+    op.add_column('topics', sa.Column('last_activity_at', sa.DateTime, nullable=True))
+    op.create_table(
+        'posts',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('topic_id', sa.Integer, sa.ForeignKey('topics.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('parent_id', sa.Integer, sa.ForeignKey('posts.id', ondelete='CASCADE'), nullable=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('username', sa.String(255), nullable=False),
+        sa.Column('content', sa.String, nullable=False),
+        sa.Column('path', sa.String(352), nullable=False),
+        sa.Column('depth', sa.Integer, nullable=False),
+        sa.Column('reply_count', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+    )
+    op.create_index('ix_posts_topic_id_path', 'posts', ['topic_id', 'path'])
+    op.create_index('ix_posts_topic_id_depth_path', 'posts', ['topic_id', 'depth', 'path'])
+    op.create_index('ix_posts_parent_id_path', 'posts', ['parent_id', 'path'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_parent_id_path', table_name='posts')
+    op.drop_index('ix_posts_topic_id_depth_path', table_name='posts')
+    op.drop_index('ix_posts_topic_id_path', table_name='posts')
+    op.drop_table('posts')
+    op.drop_column('topics', 'last_activity_at')
+    op.drop_column('topics', 'reply_count')
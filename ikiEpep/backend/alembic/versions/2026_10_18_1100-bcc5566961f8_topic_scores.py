@@ -0,0 +1,38 @@
+"""topic_scores table for trending topics
+
+Revision ID: bcc5566961f8
+Revises: 825eb8ebce95
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bcc5566961f8'
+down_revision: Union[str, None] = '825eb8ebce95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    Existing topics get their scores from ``forum_trending <ini> --rebuild``.
+    """
+    op.create_table(
+        'topic_scores',
+        sa.Column('topic_id', sa.Integer, sa.ForeignKey('topics.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('score', sa.Float, nullable=False),
+        sa.Column('updated_at', sa.DateTime),
+    )
+    op.create_index('ix_topic_scores_score', 'topic_scores', ['score'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_topic_scores_score', table_name='topic_scores')
+    op.drop_table('topic_scores')
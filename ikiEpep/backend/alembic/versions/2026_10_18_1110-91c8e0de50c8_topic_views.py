@@ -0,0 +1,28 @@
+"""topics.views counter
+
+Revision ID: 91c8e0de50c8
+Revises: bcc5566961f8
+Create Date: 2026-10-18 11:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '91c8e0de50c8'
+down_revision: Union[str, None] = 'bcc5566961f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('topics', sa.Column('views', sa.Integer, nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('topics', 'views')
@@ -0,0 +1,44 @@
+"""topic_revisions table for edit history
+
+Revision ID: d69dc98eb797
+Revises: 91c8e0de50c8
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd69dc98eb797'
+down_revision: Union[str, None] = '91c8e0de50c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    Existing topics get their first revision (a snapshot of the content
+    before the edit) the first time they are edited.
+    """
+    op.create_table(
+        'topic_revisions',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('topic_id', sa.Integer, sa.ForeignKey('topics.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('number', sa.Integer, nullable=False),
+        sa.Column('snapshot', sa.Boolean, nullable=False),
+        sa.Column('chain', sa.Integer, nullable=False),
+        sa.Column('title', sa.String(255), nullable=False),
+        sa.Column('data', sa.LargeBinary, nullable=False),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='SET NULL')),
+        sa.Column('created_at', sa.DateTime),
+        sa.UniqueConstraint('topic_id', 'number', name='uq_topic_revisions_topic_id_number'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('topic_revisions')
@@ -0,0 +1,272 @@
+# backend/benchmarks/harness.py
+"""Reproducible benchmark of the forum API.
+
+Seeds a database (SQLite file by default, or any --database-url such as a
+local Postgres), boots ``forum.main`` on it and drives the real routes
+in-process through WebTest:
+
+    login           POST /login
+    topics_page     GET  /api/get-topics?limit=20
+    topic_detail    GET  /api/topics/{id}       (random ids)
+    create_topic    POST /api/topics            (authenticated)
+
+Throughput and latency percentiles are printed as JSON. ``--save-baseline``
+stores them, ``--baseline`` compares a run against a stored file and exits
+with status 1 when a scenario regressed by more than ``--tolerance``.
+
+    python benchmarks/harness.py --topics 100000 --users 10000 --save-baseline bench.json
+    python benchmarks/harness.py --topics 100000 --users 10000 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import bcrypt
+from sqlalchemy import create_engine, func, insert, select
+from webtest import TestApp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forum import main  # noqa: E402
+from forum.models.meta import Base  # noqa: E402
+from forum.models.topic import Topic  # noqa: E402
+from forum.models.user import User  # noqa: E402
+
+PASSWORD = 'benchmark-password'
+SEED_BATCH_SIZE = 10000
+# Compared against the baseline; lower is better for latencies
+COMPARED = (('requests_per_second', 1), ('p50_ms', -1), ('p95_ms', -1), ('p99_ms', -1))
+
+
+def seed(url, users, topics, rounds, content_length, seed_value):
+    """Fill an empty database; an already seeded one is reused as is."""
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        have_users = conn.execute(select(func.count(User.id))).scalar()
+        have_topics = conn.execute(select(func.count(Topic.id))).scalar()
+    if have_users >= users and have_topics >= topics:
+        engine.dispose()
+        return
+
+    rng = random.Random(seed_value)
+    # One bcrypt hash shared by every user: seeding 100k users must not
+    # take 100k times the cost factor
+    hashed = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+    start = datetime.utcnow() - timedelta(days=365)
+    words = ('forum', 'topic', 'reply', 'python', 'pyramid', 'database', 'index',
+             'cache', 'query', 'latency', 'thread', 'process', 'socket', 'json')
+
+    with engine.begin() as conn:
+        for offset in range(have_users, users, SEED_BATCH_SIZE):
+            conn.execute(insert(User.__table__), [
+                {'username': 'user%d' % n, 'email': 'user%d@example.com' % n, 'password': hashed}
+                for n in range(offset, min(users, offset + SEED_BATCH_SIZE))
+            ])
+        usernames = dict(conn.execute(select(User.id, User.username)).all())
+        user_ids = sorted(usernames)
+
+        step = 365 * 86400 / max(1, topics)
+        for offset in range(have_topics, topics, SEED_BATCH_SIZE):
+            batch = []
+            for n in range(offset, min(topics, offset + SEED_BATCH_SIZE)):
+                user_id = rng.choice(user_ids)
+                created = start + timedelta(seconds=n * step)
+                text = ' '.join(rng.choice(words) for _ in range(content_length // 6))
+                batch.append({
+                    'title': 'Topic %d about %s' % (n, rng.choice(words)),
+                    'content': text,
+                    'username': usernames[user_id],
+                    'user_id': user_id,
+                    'created_at': created,
+                    'updated_at': created,
+                })
+            conn.execute(insert(Topic.__table__), batch)
+
+        # Counters the views read instead of counting
+        conn.execute(User.__table__.update().values(
+            topic_count=select(func.count(Topic.id)).where(Topic.user_id == User.id).scalar_subquery(),
+            last_posted_at=select(func.max(Topic.created_at)).where(Topic.user_id == User.id).scalar_subquery(),
+        ))
+    engine.dispose()
+
+
+def make_app(url, overrides):
+    settings = {
+        'sqlalchemy.url': url,
+        'forum.bcrypt.workers': '0',
+        'forum.cache.backend': 'memory',
+        'forum.metrics.query_warning': '1000',
+    }
+    settings.update(overrides)
+    return main({}, **settings)
+
+
+class Scenarios:
+    def __init__(self, app, users, topic_ids, rng):
+        self.app = app
+        self.users = users
+        self.topic_ids = topic_ids
+        self.rng = rng
+        response = TestApp(app).post_json('/login', {'email': 'user0@example.com', 'password': PASSWORD})
+        self.auth = {'Authorization': 'Bearer %s' % response.json['token']}
+
+    def login(self, client):
+        n = self.rng.randrange(self.users)
+        return client.post_json('/login', {'email': 'user%d@example.com' % n, 'password': PASSWORD},
+                                expect_errors=True)
+
+    def topics_page(self, client):
+        return client.get('/api/get-topics', {'limit': '20'}, expect_errors=True)
+
+    def topic_detail(self, client):
+        return client.get('/api/topics/%d' % self.rng.choice(self.topic_ids), expect_errors=True)
+
+    def create_topic(self, client):
+        return client.post_json('/api/topics', {
+            'title': 'Benchmark topic',
+            'content': 'Created by the benchmark harness.',
+            'username': 'user0',
+        }, headers=self.auth, expect_errors=True)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_scenario(app, action, requests, warmup, concurrency):
+    """``requests`` calls of ``action`` spread over ``concurrency`` threads."""
+    client = TestApp(app)
+    for _ in range(warmup):
+        action(client)
+
+    latencies, errors, lock = [], [0], threading.Lock()
+
+    def worker(count):
+        client = TestApp(app)
+        local, failed = [], 0
+        for _ in range(count):
+            start = time.perf_counter()
+            response = action(client)
+            local.append(time.perf_counter() - start)
+            if response.status_int >= 400:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    shares = [requests // concurrency + (1 if n < requests % concurrency else 0) for n in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(share,)) for share in shares if share]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline``, as readable strings."""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for key, direction in COMPARED:
+            old, new = previous.get(key), current.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * direction
+            if change < -tolerance:
+                regressions.append('%s %s: %s -> %s (%+.0f%%)' % (name, key, old, new, (new - old) / old * 100))
+    return regressions
+
+
+def main_cli(argv=sys.argv):
+    parser = argparse.ArgumentParser(description="Benchmark the forum API in-process.")
+    parser.add_argument('--database-url', help="default: a SQLite file in the temp directory")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--topics', type=int, default=10000)
+    parser.add_argument('--content-length', type=int, default=600)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--requests', type=int, default=500, help="per scenario")
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=1, help="client threads")
+    parser.add_argument('--scenario', action='append', choices=('login', 'topics_page', 'topic_detail', 'create_topic'),
+                        help="run only these (repeatable)")
+    parser.add_argument('--setting', action='append', default=[], metavar='KEY=VALUE',
+                        help="app setting override, e.g. forum.cache.backend=memory")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', help="compare against this JSON file, exit 1 on regressions")
+    parser.add_argument('--save-baseline', help="write the results to this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv[1:])
+
+    url = args.database_url or 'sqlite:///%s' % os.path.join(
+        tempfile.gettempdir(), 'forum-bench-%d-%d.sqlite' % (args.users, args.topics))
+    seed(url, args.users, args.topics, args.bcrypt_rounds, args.content_length, args.seed)
+
+    overrides = dict(setting.split('=', 1) for setting in args.setting)
+    overrides.setdefault('forum.bcrypt.rounds', str(args.bcrypt_rounds))
+    app = make_app(url, overrides)
+
+    engine = app.registry.db_engine
+    with engine.connect() as conn:
+        topic_ids = [row[0] for row in conn.execute(select(Topic.id))]
+    rng = random.Random(args.seed)
+    scenarios = Scenarios(app, args.users, topic_ids, rng)
+
+    results = {
+        'meta': {
+            'database': engine.dialect.name,
+            'users': args.users,
+            'topics': len(topic_ids),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'at': datetime.utcnow().isoformat(),
+        },
+        'scenarios': {},
+    }
+    for name in args.scenario or ('login', 'topics_page', 'topic_detail', 'create_topic'):
+        results['scenarios'][name] = run_scenario(
+            app, getattr(scenarios, name), args.requests, args.warmup, args.concurrency)
+        print('%-14s %s' % (name, json.dumps(results['scenarios'][name])), file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        for line in regressions:
+            print('REGRESSION', line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
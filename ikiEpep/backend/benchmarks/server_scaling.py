@@ -0,0 +1,157 @@
+# backend/benchmarks/server_scaling.py
+"""Throughput of forum_serve as the number of worker processes grows.
+
+Starts the pre-fork server with 1, 2, 4, ... workers against the given
+.ini file, hammers one endpoint with keep-alive HTTP clients (running in
+their own processes so the load generator is not GIL bound either) and
+prints requests/s, latency percentiles and the speedup over one worker
+as JSON.
+
+    python benchmarks/server_scaling.py production.ini --path /api/get-topics?limit=20
+
+The clients share the machine with the server, so pin them elsewhere
+(taskset) or use a second host for numbers close to production.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(HERE)
+
+
+def _client_process(host, port, path, headers, connections, duration):
+    """Run ``connections`` keep-alive clients for ``duration`` seconds."""
+    deadline = time.monotonic() + duration
+    results = []
+    lock = threading.Lock()
+
+    def run():
+        latencies, errors = [], 0
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+        conn.close()
+        with lock:
+            results.append((latencies, errors))
+
+    threads = [threading.Thread(target=run) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = [value for lat, _ in results for value in lat]
+    return latencies, sum(errors for _, errors in results)
+
+
+def _wait_ready(host, port, path, headers, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request('GET', path, headers=headers)
+            conn.getresponse().read()
+            conn.close()
+            return
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.2)
+    raise RuntimeError("server did not come up on port %d" % port)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def measure(args, workers, headers):
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'forum.scripts.serve', args.config_uri,
+         '--workers', str(workers), '--threads', str(args.threads), '--port', str(port)],
+        cwd=BACKEND,
+    )
+    try:
+        _wait_ready('127.0.0.1', port, args.path, headers)
+        per_process = max(1, args.connections // args.client_processes)
+        job = ('127.0.0.1', port, args.path, headers, per_process)
+        with multiprocessing.Pool(args.client_processes) as pool:
+            pool.starmap(_client_process, [job + (args.warmup,)] * args.client_processes)
+            started = time.monotonic()
+            runs = pool.starmap(_client_process, [job + (args.duration,)] * args.client_processes)
+            elapsed = time.monotonic() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    latencies = sorted(value for lat, _ in runs for value in lat)
+    return {
+        'workers': workers,
+        'threads': args.threads,
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in runs),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def main(argv=sys.argv):
+    cpus = os.cpu_count() or 1
+    default_workers = [n for n in (1, 2, 4, 8, 16, 32) if n <= cpus] or [1]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('config_uri', nargs='?', default='production.ini')
+    parser.add_argument('--path', default='/api/get-topics?limit=20')
+    parser.add_argument('--header', action='append', default=[],
+                        help="extra request header, e.g. 'Authorization: Bearer ...'")
+    parser.add_argument('--workers', default=','.join(map(str, default_workers)),
+                        help="comma separated worker counts to try")
+    parser.add_argument('--threads', type=int, default=4, help="threads per worker")
+    parser.add_argument('--connections', type=int, default=64, help="concurrent keep-alive clients")
+    parser.add_argument('--client-processes', type=int, default=max(1, cpus // 2))
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    args = parser.parse_args(argv[1:])
+
+    headers = dict(h.split(':', 1) for h in args.header)
+    headers = {k.strip(): v.strip() for k, v in headers.items()}
+
+    results = []
+    for workers in (int(n) for n in args.workers.split(',')):
+        result = measure(args, workers, headers)
+        base = (results[0] if results else result)['requests_per_second']
+        result['speedup'] = round(result['requests_per_second'] / base, 2) if base else None
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+
+    print(json.dumps({'cpus': cpus, 'path': args.path, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,92 @@
 # __init__.py
+import os
+
 from pyramid.config import Configurator
-from sqlalchemy import engine_from_config
-from pyramid.renderers import JSON
 
+from .counters import configure_view_counter
+from .db import make_engine, make_replicas, pool_metric_lines
+from .hashing import configure_hashing
+from .identity import configure_identity_cache, request_user
+from .imagekit import configure_imagekit
 from .models.meta import Base, DBSession
-from .security import cors_tween_factory, prevent_logged_in_user_tween_factory
+from .metrics import instrument_engine, metrics
+from .renderers import FastJSON, StreamingJSON
+from .security import (
+    configure_jwt_cache,
+    cors_tween_factory,
+    jwt_claims,
+    prevent_logged_in_user_tween_factory,
+)
+from .events import configure_events
+from .revisions import configure_revisions
+from .sse import configure_sse
+from .trending import configure_trending
+
 
 def main(global_config, **settings):
     config = Configurator(settings=settings)
 
     # Database setup
-    engine = engine_from_config(settings, 'sqlalchemy.')
+    engine = make_engine(settings, 'sqlalchemy.')
     DBSession.configure(bind=engine)
     Base.metadata.bind = engine
+    config.registry.db_engine = engine
+    # A forked worker (forum_serve with preload) must not reuse the parent's
+    # connections; close=False leaves them open for the parent
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+    instrument_engine(engine)
+    metrics.add_collector(lambda: pool_metric_lines(engine))
+
+    # Optional read replicas (sqlalchemy.replicas), used by GET requests
+    replicas = config.registry.replicas = make_replicas(settings, 'sqlalchemy.')
+    for n, replica in enumerate(replicas.engines if replicas else ()):
+        os.register_at_fork(after_in_child=lambda e=replica: e.dispose(close=False))
+        instrument_engine(replica)
+        metrics.add_collector(lambda e=replica, name='replica%d' % n: pool_metric_lines(e, name))
+
+    # Auth: verified JWTs are cached and decoded at most once per request
+    configure_jwt_cache(settings)
+    config.add_request_method(jwt_claims, 'jwt_claims', reify=True)
+    configure_identity_cache(settings)
+    config.add_request_method(request_user, 'user', reify=True)
+
+    # Read cache (request.cache): memory or redis, invalidated by tag on commit
+    config.include('.cache')
 
-    # Tweens: CORS and block logged-in users from login/signup
-    config.add_tween('ecommerce.security.cors_tween_factory')
-    config.add_tween('ecommerce.security.prevent_logged_in_user_tween_factory')
+    # Passwords: bcrypt runs in a bounded process pool
+    configure_hashing(settings)
+
+    # Remote media (image deletes run in the forum_jobs worker)
+    configure_imagekit(settings)
+
+    # Trending scores: view/edit/reply events are batched by a write-behind buffer
+    metrics.add_collector(configure_trending(settings, engine).metric_lines)
+    # Topic view counts, same idea: batched UPDATEs instead of one per GET
+    metrics.add_collector(configure_view_counter(settings, engine).metric_lines)
+    # Edit history: deltas between snapshots, see forum/revisions.py
+    configure_revisions(settings)
+
+    # Topic change events for /api/topics/stream, and the asyncio listener
+    # that holds the streams when forum.sse.port is set
+    metrics.add_collector(configure_events(settings).metric_lines)
+    sse_server = configure_sse(settings)
+    if sse_server is not None:
+        config.add_subscriber('forum.sse.ensure_started', 'pyramid.events.NewRequest')
+        metrics.add_collector(sse_server.metric_lines)
+
+    # Tweens, innermost first: replica routing for reads, rate limits and
+    # in-flight caps (inside CORS so a 429 is readable by the browser),
+    # CORS, block logged-in users from login/signup
+    config.add_tween('forum.db.replica_tween_factory')
+    config.add_tween('forum.ratelimit.ratelimit_tween_factory')
+    config.add_tween('forum.security.cors_tween_factory')
+    config.add_tween('forum.security.prevent_logged_in_user_tween_factory')
+    # gzip/brotli/zstd; compressed bodies cached by (encoding, sha1(body))
+    config.add_tween('forum.security.compression_tween_factory')
+    # Outermost: per-route latency, SQL counts and the Server-Timing header.
+    # Colon form: a dotted name would find the ``metrics`` registry imported
+    # above as forum.metrics, not the module
+    config.add_tween('forum.metrics:timing_tween_factory')
 
     config.include('pyramid_tm')
 
@@ -28,15 +98,35 @@ def main(global_config, **settings):
     config.add_route('update_user_profile', '/api/user/profile', request_method='PUT')
     config.add_route('update_user_password', '/api/user/password', request_method='PUT')
     config.add_route('delete_account', '/api/user/account', request_method='DELETE')
+    config.add_route('get_seller_topics', '/api/user/topics', request_method='GET')
+    config.add_route('get_user_topics', '/api/users/{user_id}/topics', request_method='GET')
 
     # Forum
     config.add_route('create_topic', '/api/topics', request_method='POST')
+    config.add_route('get_topics_by_ids', '/api/topics', request_method='GET')
     config.add_route('get_topics', '/api/get-topics', request_method='GET')
+    # must come before /api/topics/{topic_id}
+    config.add_route('search_topics', '/api/topics/search', request_method='GET')
+    config.add_route('trending_topics', '/api/topics/trending', request_method='GET')
+    config.add_route('topics_stream', '/api/topics/stream', request_method='GET')
+    config.add_route('export_topics', '/api/topics/export', request_method='GET')
+    config.add_route('import_topics', '/api/topics/import', request_method='POST')
     config.add_route('get_topic_detail', '/api/topics/{topic_id}', request_method='GET')
     config.add_route('edit_topic', '/api/topics/{topic_id}', request_method='PUT')
     config.add_route('delete_topic', '/api/topics/{topic_id}', request_method='DELETE')
+    config.add_route('get_posts', '/api/topics/{topic_id}/posts', request_method='GET')
+    config.add_route('create_post', '/api/topics/{topic_id}/posts', request_method='POST')
+    config.add_route('topic_revisions', '/api/topics/{topic_id}/revisions', request_method='GET')
+    config.add_route('topic_revision', '/api/topics/{topic_id}/revisions/{number}', request_method='GET')
+    config.add_route('batch', '/api/batch', request_method='POST')
+
+    # Debug
+    config.add_route('debug_jwt_cache', '/debug/jwt-cache', request_method='GET')
+    config.add_route('debug_pool', '/debug/pool', request_method='GET')
+    config.add_route('metrics', '/metrics', request_method='GET')
 
-    config.add_renderer('json', JSON())
+    config.add_renderer('json', FastJSON())
+    config.add_renderer('json_stream', StreamingJSON())
 
     # from .views import product
     config.scan()
@@ -0,0 +1,328 @@
+# backend/forum/cache.py
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from pyramid.response import Response
+from sqlalchemy import event
+
+from .db import routed_engine
+from .lru import ExpiringLRU
+from .models.meta import DBSession
+from .models.post import Post
+from .models.topic import Topic
+from .models.user import User
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """In-process LRU + TTL store. Values are shared, treat them as read-only."""
+
+    def __init__(self, max_entries=10000):
+        self._data = ExpiringLRU(maxsize=max_entries)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key, _MISSING)
+
+    def get_many(self, keys):
+        return [self._data.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        self._data.set(key, value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        self._data.invalidate(key)
+
+    def incr(self, key):
+        with self._lock:
+            value = (self._data.get(key) or 0) + 1
+            self._data.set(key, value)
+            return value
+
+    @contextmanager
+    def lock(self, key, timeout):
+        # in-process locking is already done by TaggedCache
+        yield
+
+    def stats(self):
+        return self._data.stats()
+
+
+class RedisBackend:
+    """Store speaking the Redis protocol, shared by every server process.
+
+    ``url`` is a redis:// URL, or ``fakeredis://`` to use an in-memory
+    fakeredis server (tests).
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='forum:', client=None):
+        if client is None:
+            if url.startswith('fakeredis://'):
+                import fakeredis
+                client = fakeredis.FakeRedis()
+            else:
+                import redis
+                client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return _MISSING if raw is None else json.loads(raw)
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [
+            None if raw is None else json.loads(raw)
+            for raw in self.client.mget([self.prefix + key for key in keys])
+        ]
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value, separators=(',', ':')),
+                        ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    @contextmanager
+    def lock(self, key, timeout):
+        # collapses stampedes across processes, on top of the in-process lock
+        lock = self.client.lock(self.prefix + 'lock:' + key, timeout=timeout,
+                                blocking_timeout=timeout)
+        acquired = lock.acquire()
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except Exception:
+                    pass  # expired while we were computing
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+
+class _KeyLocks:
+    """One lock per cache key, dropped again once nobody holds or waits for it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    @contextmanager
+    def __call__(self, key):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+class TaggedCache:
+    """Cache with tag based invalidation and stampede protection.
+
+    Every tag has a version counter in the backend; an entry remembers the
+    versions of its tags when it was computed and is stale as soon as one
+    of them was bumped by ``invalidate_tags``.
+    """
+
+    def __init__(self, backend, default_ttl=60, lock_timeout=10, replica_window=0):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.lock_timeout = lock_timeout
+        # Seconds a replica may still return rows from before a tag was
+        # bumped; values read from a replica in that time are not stored
+        self.replica_window = replica_window
+        self._key_locks = _KeyLocks()
+
+    def _versions(self, tags):
+        return [v or 0 for v in self.backend.get_many(['tag:' + t for t in tags])]
+
+    def _fresh(self, key, versions):
+        entry = self.backend.get(key)
+        if entry is not _MISSING and list(entry[0]) == versions:
+            return entry[1]
+        return _MISSING
+
+    def get_or_create(self, key, creator, tags=(), ttl=None):
+        tags = list(tags)
+        versions = self._versions(tags)
+        value = self._fresh(key, versions)
+        if value is not _MISSING:
+            return value
+
+        # Only one caller per key recomputes, the others wait and reuse it
+        with self._key_locks(key), self.backend.lock(key, self.lock_timeout):
+            value = self._fresh(key, versions)
+            if value is not _MISSING:
+                return value
+            value = creator()
+            if not self._maybe_stale(tags):
+                self.backend.set(key, [versions, value], ttl or self.default_ttl)
+            return value
+
+    def _maybe_stale(self, tags):
+        """Whether ``creator`` just read from a replica that may not have
+        the write behind a recent bump of ``tags`` yet."""
+        if not self.replica_window or not tags or routed_engine() is None:
+            return False
+        return any(v is not None for v in self.backend.get_many(['bumped:' + t for t in tags]))
+
+    def tag_version(self, tag):
+        return self._versions([tag])[0]
+
+    def get(self, key, default=None):
+        """Plain untagged read, for markers and counters."""
+        value = self.backend.get(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl or self.default_ttl)
+
+    def invalidate_tags(self, *tags):
+        for tag in tags:
+            self.backend.incr('tag:' + tag)
+            if self.replica_window:
+                self.backend.set('bumped:' + tag, 1, self.replica_window)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def stats(self):
+        return self.backend.stats()
+
+
+# The cache of the running app, set up by includeme()
+cache = None
+
+
+class _Uncacheable(Exception):
+    def __init__(self, result):
+        self.result = result
+
+
+def cached_view(tags=(), ttl=None):
+    """Cache a view's rendered-to-be value per route, matchdict and query string.
+
+    ``tags`` may use matchdict placeholders, e.g. ``'topic:{topic_id}'``.
+    Only plain 200 results are cached; Response objects and error statuses
+    go straight through.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request):
+            active = getattr(request.registry, 'cache', None)
+            if active is None or request.method != 'GET':
+                return view(request)
+            matchdict = request.matchdict or {}
+            key = 'view:%s:%s?%s' % (
+                request.matched_route.name,
+                ','.join('%s=%s' % item for item in sorted(matchdict.items())),
+                request.query_string,
+            )
+
+            def creator():
+                result = view(request)
+                if isinstance(result, Response) or request.response.status_code != 200:
+                    raise _Uncacheable(result)
+                return result
+
+            try:
+                return active.get_or_create(
+                    key, creator, [tag.format(**matchdict) for tag in tags], ttl
+                )
+            except _Uncacheable as uncacheable:
+                return uncacheable.result
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    """Invalidate ``tags`` once the current transaction commits.
+
+    For writes the flush hooks below cannot see: bulk ``query.update()`` /
+    ``delete()`` and Core statements.
+    """
+    DBSession().info.setdefault('cache_tags', set()).update(tags)
+
+
+# Tags of the ORM objects written in a flush; bumped after the commit so a
+# concurrent reader cannot re-cache the old rows in between.
+
+def _object_tags(obj):
+    if isinstance(obj, Topic):
+        return ('topic:%s' % obj.id, 'topics', 'user-topics:%s' % obj.user_id)
+    if isinstance(obj, Post):
+        # a reply moves its topic's reply_count, shown in the listings too
+        return ('posts:%s' % obj.topic_id, 'topic:%s' % obj.topic_id, 'topics')
+    if isinstance(obj, User):
+        return ('user:%s' % obj.id,)
+    return ()
+
+
+@event.listens_for(DBSession, 'after_flush')
+def _collect_tags(session, flush_context):
+    if cache is None:
+        return
+    tags = session.info.setdefault('cache_tags', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags.update(_object_tags(obj))
+
+
+@event.listens_for(DBSession, 'after_commit')
+def _invalidate_committed(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags and cache is not None:
+        try:
+            cache.invalidate_tags(*tags)
+        except Exception:
+            log.exception("cache invalidation failed for %s", sorted(tags))
+
+
+@event.listens_for(DBSession, 'after_transaction_end')
+def _discard_tags(session, session_transaction):
+    # rolled back, or already taken by after_commit
+    if session_transaction.parent is None:
+        session.info.pop('cache_tags', None)
+
+
+def includeme(config):
+    global cache
+    settings = config.get_settings()
+    backend_name = settings.get('forum.cache.backend', 'memory')
+    if backend_name == 'redis':
+        backend = RedisBackend(
+            url=settings.get('forum.cache.url', 'redis://localhost:6379/0'),
+            prefix=settings.get('forum.cache.prefix', 'forum:'),
+        )
+    else:
+        backend = MemoryBackend(max_entries=int(settings.get('forum.cache.max_entries', 10000)))
+    replica_window = 0
+    if settings.get('sqlalchemy.replicas', '').strip():
+        replica_window = max(float(settings.get('forum.replicas.max_lag') or 0),
+                             float(settings.get('forum.replicas.sticky_seconds', 5)))
+    cache = TaggedCache(
+        backend,
+        default_ttl=float(settings.get('forum.cache.default_ttl', 60)),
+        replica_window=replica_window,
+    )
+    config.registry.cache = cache
+    config.add_request_method(lambda request: request.registry.cache, 'cache', reify=True)
@@ -0,0 +1,82 @@
+# backend/forum/counters.py
+"""Topic view counts, buffered in memory and written in batches.
+
+Counting a view must not turn the hottest read into a row-locking write,
+so ``record_view`` only bumps a per-process dict; the write-behind buffer
+adds the totals to ``topics.views`` at most ``flush_interval`` seconds
+later (and on shutdown). Counts are approximate by that much.
+
+Each flush bumps the ``topic:<id>`` cache tags of the topics it wrote, so
+cached detail payloads pick up the new count; cached listing pages catch
+up when they expire.
+"""
+import time
+from datetime import datetime
+
+from sqlalchemy import Integer, bindparam, column, values
+
+from . import cache as shared
+from .models.topic import Topic
+from .writebehind import WriteBehindBuffer
+
+# Pending view increments per topic id
+buffer = None
+# Flushes leave updated_at alone, so the HTTP validators of pages showing
+# view counts also move every this many seconds
+VIEWS_VALIDATOR_SECONDS = 60
+
+
+def configure_view_counter(settings, engine):
+    global buffer, VIEWS_VALIDATOR_SECONDS
+    VIEWS_VALIDATOR_SECONDS = max(1, int(settings.get('forum.views.validator_seconds', VIEWS_VALIDATOR_SECONDS)))
+    buffer = WriteBehindBuffer(
+        'topic_views',
+        lambda batch: flush_views(engine, batch),
+        interval=float(settings.get('forum.views.flush_interval', 5)),
+        max_keys=int(settings.get('forum.views.max_pending', 10000)),
+    )
+    return buffer
+
+
+def views_validators(last_modified):
+    """``(bucket, last_modified)`` for a page that shows view counts: a
+    coarse time bucket for its ETag, and ``last_modified`` moved up to the
+    bucket's start so If-Modified-Since stops matching as well."""
+    bucket = int(time.time()) // VIEWS_VALIDATOR_SECONDS
+    start = datetime.utcfromtimestamp(bucket * VIEWS_VALIDATOR_SECONDS)
+    if last_modified is None or last_modified < start:
+        last_modified = start
+    return bucket, last_modified
+
+
+def record_view(topic_id):
+    if buffer is not None:
+        buffer.add(topic_id, 1)
+
+
+def flush_views(engine, batch):
+    """Add ``{topic_id: views}`` to the topics, in one statement on Postgres."""
+    topics = Topic.__table__
+    # Only the counter moves: updated_at (the ETag validator) stays put
+    keep_updated_at = topics.c.updated_at
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            # UPDATE topics SET views = topics.views + v.n FROM (VALUES ...) AS v(id, n)
+            increments = values(
+                column('id', Integer), column('n', Integer), name='v'
+            ).data(list(batch.items()))
+            conn.execute(
+                topics.update()
+                .values(views=topics.c.views + increments.c.n, updated_at=keep_updated_at)
+                .where(topics.c.id == increments.c.id)
+            )
+        else:
+            conn.execute(
+                topics.update()
+                .values(views=topics.c.views + bindparam('n'), updated_at=keep_updated_at)
+                .where(topics.c.id == bindparam('key')),
+                [{'key': topic_id, 'n': count} for topic_id, count in batch.items()],
+            )
+    # Outside any request transaction, so the tags are bumped directly
+    if shared.cache is not None:
+        shared.cache.invalidate_tags(*('topic:%d' % topic_id for topic_id in batch))
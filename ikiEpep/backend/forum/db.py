@@ -0,0 +1,295 @@
+# backend/forum/db.py
+import bisect
+import itertools
+import logging
+import os
+import threading
+import time
+
+from pyramid.settings import asbool, aslist
+from sqlalchemy import engine_from_config, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+log = logging.getLogger(__name__)
+
+# waitress' own default for [server:main] threads
+DEFAULT_THREADS = 4
+
+# Upper bounds (seconds) of the checkout wait-time histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PoolMetrics:
+    """Counters and a checkout wait-time histogram for one connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def observe_wait(self, seconds):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_sum += seconds
+            self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(WAIT_BUCKETS + (float('inf'),), self.wait_buckets):
+                cumulative += count
+                buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+            return {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'wait_seconds': {
+                    'count': self.wait_count,
+                    'sum': round(self.wait_sum, 6),
+                    'buckets': buckets,
+                },
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kw):
+        self.metrics = kw.pop('metrics', None) or PoolMetrics()
+        super().__init__(*args, **kw)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            self.metrics.incr('timeouts')
+            raise
+        finally:
+            self.metrics.observe_wait(time.perf_counter() - start)
+
+
+def pool_options(settings, prefix='sqlalchemy.'):
+    """Pool settings for ``engine_from_config``, defaulting to the thread count.
+
+    Every ``<prefix>pool_*`` / ``<prefix>max_overflow`` key set in the .ini
+    wins; otherwise the pool holds one connection per waitress thread
+    (``forum.threads``) plus some overflow for out-of-request work.
+    """
+    if settings[prefix + 'url'].startswith('sqlite'):
+        return {}
+    threads = int(settings.get('forum.threads', DEFAULT_THREADS))
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(settings.get(prefix + 'pool_size', threads)),
+        'max_overflow': int(settings.get(prefix + 'max_overflow', max(2, threads // 2))),
+        'pool_timeout': float(settings.get(prefix + 'pool_timeout', 10)),
+        'pool_recycle': int(settings.get(prefix + 'pool_recycle', 1800)),
+        'pool_pre_ping': asbool(settings.get(prefix + 'pool_pre_ping', True)),
+    }
+
+
+def make_engine(settings, prefix='sqlalchemy.'):
+    # <prefix>replicas is read by make_replicas, it is no create_engine() argument
+    config = {key: value for key, value in settings.items() if key != prefix + 'replicas'}
+    engine = engine_from_config(config, prefix, **pool_options(settings, prefix))
+    metrics = getattr(engine.pool, 'metrics', None)
+    if metrics is not None:
+        event.listen(engine.pool, 'connect', lambda *a: metrics.incr('connects'))
+        event.listen(engine.pool, 'checkout', lambda *a: metrics.incr('checkouts'))
+        event.listen(engine.pool, 'checkin', lambda *a: metrics.incr('checkins'))
+        event.listen(engine.pool, 'invalidate', lambda *a: metrics.incr('invalidations'))
+    return engine
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'timeout': pool.timeout(),
+        })
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
+
+
+def pool_metric_lines(engine, name='primary'):
+    """Prometheus exposition lines for the pool of ``engine``."""
+    status = pool_status(engine)
+    lines = []
+    for key in ('checked_out', 'idle', 'overflow'):
+        if key in status:
+            lines.append('forum_db_pool_%s{pool="%s"} %d' % (key, name, status[key]))
+    wait = status.get('wait_seconds')
+    if wait:
+        for bound, count in wait['buckets'].items():
+            lines.append('forum_db_pool_wait_seconds_bucket{pool="%s",le="%s"} %d' % (name, bound, count))
+        lines.append('forum_db_pool_wait_seconds_sum{pool="%s"} %s' % (name, wait['sum']))
+        lines.append('forum_db_pool_wait_seconds_count{pool="%s"} %d' % (name, wait['count']))
+        lines.append('forum_db_pool_timeouts_total{pool="%s"} %d' % (name, status['timeouts']))
+    return lines
+
+
+# Replication delay of a Postgres standby in seconds; 0 when it has replayed
+# everything it received (an idle primary does not make it look stale)
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# The replica engine the current request reads from, None for the primary.
+# Set by replica_tween_factory, consulted by models.meta.RoutingSession.
+_routing = threading.local()
+
+
+def routed_engine():
+    return getattr(_routing, 'engine', None)
+
+
+def stop_routing():
+    """Send the rest of the current request to the primary."""
+    _routing.engine = None
+
+
+class ReplicaSet:
+    """Read replicas handed out round-robin, skipping unhealthy ones.
+
+    A daemon thread (one per process, started on first use so it survives
+    forum_serve's fork) runs ``SELECT 1`` -- or the standby lag query on
+    Postgres -- every ``check_interval`` seconds.
+    """
+
+    def __init__(self, engines, check_interval=5.0, max_lag=None):
+        self.engines = engines
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.healthy = [True] * len(engines)
+        self.lag = [None] * len(engines)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def choose(self):
+        self._ensure_checker()
+        healthy = [engine for engine, ok in zip(self.engines, self.healthy) if ok]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    def _ensure_checker(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._check_loop, name='replica-health', daemon=True).start()
+
+    def _check_loop(self):
+        while True:
+            self.check()
+            time.sleep(self.check_interval)
+
+    def check(self):
+        for i, engine in enumerate(self.engines):
+            lag = None
+            try:
+                with engine.connect() as conn:
+                    if engine.dialect.name == 'postgresql':
+                        lag = conn.execute(REPLICA_LAG_SQL).scalar()
+                        lag = float(lag) if lag is not None else None
+                    else:
+                        conn.execute(text('SELECT 1'))
+                healthy = self.max_lag is None or lag is None or lag <= self.max_lag
+            except Exception as err:
+                healthy = False
+                if self.healthy[i]:
+                    log.warning("Replica %s failed its health check: %s", engine.url, err)
+            if healthy and not self.healthy[i]:
+                log.info("Replica %s is back", engine.url)
+            elif not healthy and self.healthy[i] and lag is not None:
+                log.warning("Replica %s is %.1fs behind, taking it out", engine.url, lag)
+            self.healthy[i] = healthy
+            self.lag[i] = lag
+
+    def status(self):
+        return [
+            {'url': repr(engine.url), 'healthy': ok, 'lag_seconds': lag}
+            for engine, ok, lag in zip(self.engines, self.healthy, self.lag)
+        ]
+
+
+def make_replicas(settings, prefix='sqlalchemy.'):
+    """The ``<prefix>replicas`` URLs as a ReplicaSet, or None without any.
+
+    Replica engines share the primary's pool settings.
+    """
+    urls = aslist(settings.get(prefix + 'replicas', ''))
+    if not urls:
+        return None
+    engines = [make_engine(dict(settings, **{prefix + 'url': url}), prefix) for url in urls]
+    max_lag = settings.get('forum.replicas.max_lag')
+    return ReplicaSet(
+        engines,
+        check_interval=float(settings.get('forum.replicas.check_interval', 5)),
+        max_lag=float(max_lag) if max_lag else None,
+    )
+
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def replica_tween_factory(handler, registry):
+    """Route the reads of GET/HEAD requests to a replica.
+
+    A user who just wrote something reads from the primary for
+    ``forum.replicas.sticky_seconds`` afterwards, so they always see their
+    own writes. The marker lives in the shared cache (request.cache) so it
+    holds across worker processes with the redis backend.
+    """
+    replicas = getattr(registry, 'replicas', None)
+    if replicas is None:
+        return handler
+    sticky_seconds = float((registry.settings or {}).get('forum.replicas.sticky_seconds', 5))
+
+    def replica_tween(request):
+        payload, error = request.jwt_claims
+        user_id = payload.get('user_id') if payload else None
+        sticky_key = 'rw:%s' % user_id
+
+        if request.method in SAFE_METHODS and not (user_id and request.cache.get(sticky_key)):
+            _routing.engine = replicas.choose()
+        try:
+            response = handler(request)
+        finally:
+            _routing.engine = None
+
+        # pyramid_tm sits below this tween, the write is committed by now
+        if request.method not in SAFE_METHODS and user_id and response.status_code < 400:
+            request.cache.set(sticky_key, True, sticky_seconds)
+        return response
+    return replica_tween
@@ -0,0 +1,227 @@
+# backend/forum/events.py
+"""Topic change events fanned out to the SSE subscribers (forum/sse.py).
+
+Views call ``publish_after_commit``; the event reaches the hub only once
+the request transaction has committed. The hub keeps the last
+``history`` events in a ring buffer for ``Last-Event-ID`` resumes and
+gives every subscriber a bounded queue: a subscriber that falls
+``queue_size`` events behind is dropped, and its client reconnects and
+resumes from the ring buffer.
+
+With ``forum.events.backend = redis`` events go through a Redis channel
+so every forum_serve worker sees every write, and ids (from INCR) are
+the same in every process.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+log = logging.getLogger(__name__)
+
+Event = namedtuple('Event', 'id type data')
+
+
+class Subscriber:
+    """One client's queue. ``notify`` is called (from any thread) after
+    events were added or the subscriber was dropped."""
+
+    def __init__(self, notify, maxsize):
+        self._notify = notify
+        self.maxsize = maxsize
+        self.dropped = False
+        self._queue = deque()
+        self._lock = threading.Lock()
+
+    def put(self, event):
+        """Queue ``event``; False once the subscriber is dropped."""
+        with self._lock:
+            if self.dropped:
+                return False
+            if len(self._queue) >= self.maxsize:
+                self.dropped = True
+                self._queue.clear()
+            else:
+                self._queue.append(event)
+        self._notify()
+        return not self.dropped
+
+    def drain(self):
+        with self._lock:
+            events = list(self._queue)
+            self._queue.clear()
+        return events
+
+
+class EventHub:
+    def __init__(self, history=1000, queue_size=100):
+        self.queue_size = queue_size
+        self._ring = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.last_id = 0
+        # instrumentation
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, type, data, event_id=None):
+        """Hand an event to every subscriber of this process."""
+        with self._lock:
+            event_id = event_id or self.last_id + 1
+            if event_id <= self.last_id:
+                # already seen, or overtaken by a later id from another
+                # process; the ring buffer must stay in id order
+                return
+            self.last_id = event_id
+            event = Event(event_id, type, json.dumps(data, separators=(',', ':')))
+            self._ring.append(event)
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if not subscriber.put(event):
+                self.unsubscribe(subscriber)
+                with self._lock:
+                    self.dropped += 1
+
+    def subscribe(self, notify, last_event_id=None):
+        """``(subscriber, backlog, complete)``: the events after
+        ``last_event_id`` still in the ring buffer, and whether that is all
+        of them (False when the client was away too long)."""
+        subscriber = Subscriber(notify, self.queue_size)
+        with self._lock:
+            # under the lock, so nothing falls between backlog and queue
+            self._subscribers.add(subscriber)
+            if last_event_id is None:
+                return subscriber, [], True
+            backlog = [event for event in self._ring if event.id > last_event_id]
+            oldest = self._ring[0].id if self._ring else self.last_id + 1
+            complete = last_event_id >= oldest - 1 and last_event_id <= self.last_id
+        return subscriber, backlog, complete
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'history': len(self._ring),
+                'last_id': self.last_id,
+                'published': self.published,
+                'dropped': self.dropped,
+            }
+
+    def metric_lines(self):
+        stats = self.stats()
+        return [
+            'forum_events_subscribers %d' % stats['subscribers'],
+            'forum_events_published_total %d' % stats['published'],
+            'forum_events_dropped_subscribers_total %d' % stats['dropped'],
+        ]
+
+
+# INCR and PUBLISH in one atomic step: messages reach the channel in id
+# order, so no process ever sees a smaller id after a larger one
+PUBLISH_SCRIPT = """
+local id = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', ARGV[1], id .. ' ' .. ARGV[2])
+return id
+"""
+
+
+class RedisBridge:
+    """Publishes through a Redis channel; a thread per process (started on
+    first use, so it survives forum_serve's fork) feeds the local hub."""
+
+    def __init__(self, hub, url='redis://localhost:6379/0', prefix='forum:events:', client=None):
+        if client is None:
+            if url.startswith('fakeredis://'):
+                import fakeredis
+                client = fakeredis.FakeRedis()
+            else:
+                import redis
+                client = redis.Redis.from_url(url)
+        self.hub = hub
+        self.client = client
+        self.channel = prefix + 'topics'
+        self.counter = prefix + 'id'
+        self._publish = client.register_script(PUBLISH_SCRIPT)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def publish(self, type, data):
+        self._publish(keys=[self.counter], args=[self.channel, json.dumps({'type': type, 'data': data})])
+
+    def ensure_listening(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._listen, name='events-bridge', daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    event_id, _, body = message['data'].partition(b' ')
+                    event = json.loads(body)
+                    self.hub.publish(event['type'], event['data'], int(event_id))
+            except Exception:
+                log.exception("event bridge lost its Redis subscription, retrying")
+                time.sleep(1)
+
+
+# The process' hub, and the Redis bridge in front of it if configured
+hub = EventHub()
+bridge = None
+
+
+def configure_events(settings):
+    global hub, bridge
+    hub = EventHub(
+        history=int(settings.get('forum.events.history', 1000)),
+        queue_size=int(settings.get('forum.events.queue_size', 100)),
+    )
+    bridge = None
+    if settings.get('forum.events.backend', 'memory') == 'redis':
+        bridge = RedisBridge(
+            hub,
+            url=settings.get('forum.events.url') or settings.get('forum.cache.url', 'redis://localhost:6379/0'),
+            prefix=settings.get('forum.events.prefix', 'forum:events:'),
+        )
+    return hub
+
+
+def publish(type, data):
+    if bridge is not None:
+        bridge.publish(type, data)
+    else:
+        hub.publish(type, data)
+
+
+def _after_commit(success, type, data):
+    if not success:
+        return
+    try:
+        publish(type, data)
+    except Exception:
+        # the write is committed; a lost notification must not turn it into an error
+        log.exception("publishing %s failed", type)
+
+
+def publish_after_commit(request, type, data):
+    """Publish once the request's transaction (pyramid_tm) has committed."""
+    request.tm.get().addAfterCommitHook(_after_commit, args=(type, data))
+
+
+def subscribe(notify, last_event_id=None):
+    if bridge is not None:
+        bridge.ensure_listening()
+    return hub.subscribe(notify, last_event_id)
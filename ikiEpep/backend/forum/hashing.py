@@ -0,0 +1,112 @@
+# backend/forum/hashing.py
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+log = logging.getLogger(__name__)
+
+DEFAULT_ROUNDS = 12
+
+
+class HashingPoolBusy(Exception):
+    """Raised when the password hashing queue is full; answer with a 503."""
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class HashingPool:
+    """Runs bcrypt in a bounded process pool, off the waitress worker threads.
+
+    At most ``max_pending`` jobs (running or queued) are admitted; anything
+    beyond that fails fast with ``HashingPoolBusy``. With ``workers = 0`` the
+    hashing runs inline in the calling thread.
+    """
+
+    def __init__(self, workers=0, max_pending=16, rounds=DEFAULT_ROUNDS, timeout=10.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # Created lazily and per pid, so forked server workers get their own pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._broken()
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job is really gone from the executor,
+        # not just until this caller stops waiting, so max_pending keeps
+        # bounding the backlog after timeouts
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()  # still queued: drop it; running: it finishes
+            raise HashingPoolBusy()
+        except BrokenProcessPool:
+            self._broken()
+
+    def _broken(self):
+        log.warning("bcrypt pool broke, it will be restarted on next use")
+        with self._lock:
+            self._executor = None
+        raise HashingPoolBusy()
+
+    def hash_password(self, password: str) -> str:
+        return self._run(_hashpw, password.encode('utf-8'), self.rounds)
+
+    def verify_password(self, password: str, hashed: str) -> bool:
+        return self._run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+pool = HashingPool()
+atexit.register(lambda: pool.shutdown())
+
+
+def configure_hashing(settings):
+    """Replace the module pool with one sized from the ``forum.bcrypt.*`` settings."""
+    global pool
+    pool.shutdown()
+    pool = HashingPool(
+        workers=int(settings.get('forum.bcrypt.workers', 2)),
+        max_pending=int(settings.get('forum.bcrypt.max_pending', 16)),
+        rounds=int(settings.get('forum.bcrypt.rounds', DEFAULT_ROUNDS)),
+        timeout=float(settings.get('forum.bcrypt.timeout', 10)),
+    )
+    return pool
@@ -0,0 +1,78 @@
+# backend/forum/httpcache.py
+import hashlib
+from datetime import datetime, timezone
+
+from pyramid.httpexceptions import HTTPNotModified
+
+# Used when a route has no forum.cache_control.<route_name> setting:
+# clients may keep a copy but must revalidate it (cheap thanks to 304s).
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+
+def make_etag(*parts):
+    """Build an opaque ETag value from the validator parts (ids, timestamps...)."""
+    raw = '|'.join(
+        '' if p is None else p.isoformat() if isinstance(p, datetime) else str(p)
+        for p in parts
+    )
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _as_http_date(value):
+    # DateTime columns are naive UTC; HTTP dates have second resolution
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def _parse_etags(header):
+    tags = set()
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        tags.add(tag.strip('"'))
+    return tags
+
+
+def is_conditional(request):
+    return 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+
+
+def is_not_modified(request, etag, last_modified=None):
+    """True when the client's cached copy, per its conditional headers, is current."""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present (RFC 7232)
+        # Weak comparison: the compression tween sends W/ variants of our
+        # ETags for gzip/br/zstd bodies, and those must still match
+        tags = _parse_etags(if_none_match)
+        return '*' in tags or etag in tags
+
+    if_modified_since = request.if_modified_since
+    last_modified = _as_http_date(last_modified)
+    if if_modified_since is not None and last_modified is not None:
+        return last_modified <= if_modified_since
+    return False
+
+
+def cache_control_for(request, route_name=None):
+    if route_name is None:
+        route = getattr(request, 'matched_route', None)
+        route_name = getattr(route, 'name', None)
+    settings = request.registry.settings or {}
+    return settings.get('forum.cache_control.%s' % route_name, DEFAULT_CACHE_CONTROL)
+
+
+def set_validators(request, response, etag, last_modified=None):
+    response.etag = etag
+    if last_modified is not None:
+        response.last_modified = _as_http_date(last_modified)
+    response.headers['Cache-Control'] = cache_control_for(request)
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    return set_validators(request, HTTPNotModified(), etag, last_modified)
@@ -0,0 +1,91 @@
+# backend/forum/identity.py
+import time
+from collections import namedtuple
+
+from pyramid.settings import aslist
+from sqlalchemy import event
+
+from . import cache as shared
+from .lru import ExpiringLRU
+from .models.meta import DBSession
+from .models.user import User
+from .security import get_user_id_from_jwt
+
+# The slice of a user row the views need on every authenticated request
+Identity = namedtuple('Identity', ['id', 'username', 'email'])
+
+IDENTITY_TTL = 30
+
+identity_cache = ExpiringLRU(maxsize=4096)
+
+
+def configure_identity_cache(settings):
+    global IDENTITY_TTL
+    IDENTITY_TTL = float(settings.get('forum.identity_cache.ttl', IDENTITY_TTL))
+    identity_cache.maxsize = int(settings.get('forum.identity_cache.size', identity_cache.maxsize))
+    identity_cache.clear()
+
+
+def _version(user_id):
+    # The 'user:<id>' tag of the shared cache: bumped after every commit
+    # that changes the user, in whichever process it happened
+    active = shared.cache
+    return active.tag_version('user:%s' % user_id) if active is not None else 0
+
+
+def load_identity(user_id):
+    version = _version(user_id)
+    entry = identity_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    # version read before the row: a change committed in between makes
+    # this entry stale on the next request instead of pinning the old row
+    row = DBSession.query(User.id, User.username, User.email).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    identity = Identity(row.id, row.username, row.email)
+    if IDENTITY_TTL > 0:
+        identity_cache.set(user_id, (version, identity), time.time() + IDENTITY_TTL)
+    return identity
+
+
+def invalidate_identity(user_id):
+    """Forget ``user_id``'s identity once the current transaction commits,
+    here and (through the shared cache tag) in every other process.
+
+    Dropping it right away would let a concurrent request load the old row
+    before the commit and cache it for the whole TTL.
+    """
+    DBSession().info.setdefault('identity_ids', set()).add(user_id)
+    shared.invalidate('user:%s' % user_id)
+
+
+@event.listens_for(DBSession, 'after_commit')
+def _drop_committed(session):
+    for user_id in session.info.pop('identity_ids', ()):
+        identity_cache.invalidate(user_id)
+
+
+@event.listens_for(DBSession, 'after_transaction_end')
+def _discard_identities(session, session_transaction):
+    # Whatever after_commit did not take was rolled back; zope.sqlalchemy
+    # aborts by closing the session, which sends no rollback event
+    if session_transaction.parent is None:
+        session.info.pop('identity_ids', None)
+
+
+def request_user(request):
+    """Identity of the JWT bearer, registered as the reified ``request.user``.
+
+    Raises ``HTTPUnauthorized`` for a missing or bad token and returns
+    ``None`` when the token's user no longer exists.
+    """
+    return load_identity(get_user_id_from_jwt(request))
+
+
+def is_admin(request):
+    """Whether the JWT bearer is listed in the ``forum.admin_usernames`` setting."""
+    admins = aslist(request.registry.settings.get('forum.admin_usernames', ''))
+    user = request.user
+    return user is not None and user.username in admins
@@ -0,0 +1,38 @@
+# backend/forum/imagekit.py
+import threading
+
+try:
+    from imagekitio import ImageKit
+except ImportError:  # only the job worker needs it
+    ImageKit = None
+
+_settings = {}
+_client = None
+_lock = threading.Lock()
+
+
+def configure_imagekit(settings):
+    global _client
+    _settings.update({
+        key[len('imagekit.'):]: value
+        for key, value in settings.items() if key.startswith('imagekit.')
+    })
+    _client = None
+
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            if ImageKit is None:
+                raise RuntimeError("imagekitio is not installed")
+            _client = ImageKit(
+                private_key=_settings.get('private_key'),
+                public_key=_settings.get('public_key'),
+                url_endpoint=_settings.get('url_endpoint'),
+            )
+        return _client
+
+
+def delete_file(file_id):
+    get_client().delete_file(file_id=file_id)
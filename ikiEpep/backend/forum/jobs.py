@@ -0,0 +1,127 @@
+# backend/forum/jobs.py
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import transaction
+from sqlalchemy import insert
+
+from . import imagekit
+from .models.job import Job
+from .models.meta import DBSession
+
+log = logging.getLogger(__name__)
+
+# How long a claimed job may run before another worker may pick it up again
+LEASE = timedelta(minutes=10)
+RETRY_BASE_SECONDS = 5
+DEFAULT_MAX_ATTEMPTS = 5
+
+# kind -> callable(**payload); must be safe to run more than once
+HANDLERS = {
+    'imagekit.delete_file': imagekit.delete_file,
+}
+
+
+def enqueue_many(kind, payloads):
+    """Queue one ``kind`` job per payload, in the caller's transaction."""
+    if kind not in HANDLERS:
+        raise ValueError("Unknown job kind: %s" % kind)
+    if not payloads:
+        return 0
+    now = datetime.utcnow()
+    DBSession.execute(insert(Job.__table__), [
+        {
+            'kind': kind,
+            'payload': json.dumps(payload),
+            'status': 'pending',
+            'attempts': 0,
+            'run_after': now,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for payload in payloads
+    ])
+    return len(payloads)
+
+
+def enqueue(kind, **payload):
+    return enqueue_many(kind, [payload])
+
+
+def claim(limit):
+    """Lease up to ``limit`` due jobs to this worker; returns (id, kind, payload)."""
+    now = datetime.utcnow()
+    with transaction.manager:
+        jobs = (
+            DBSession.query(Job)
+            .filter(Job.status.in_(('pending', 'running')), Job.run_after <= now)
+            .order_by(Job.run_after, Job.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        for job in jobs:
+            job.status = 'running'
+            job.attempts += 1
+            job.run_after = now + LEASE
+        return [(job.id, job.kind, json.loads(job.payload), job.attempts) for job in jobs]
+
+
+def _run(kind, payload):
+    HANDLERS[kind](**payload)
+
+
+def _finish(results, max_attempts):
+    now = datetime.utcnow()
+    with transaction.manager:
+        for job_id, attempts, error in results:
+            job = DBSession.query(Job).get(job_id)
+            if job is None:
+                continue
+            if error is None:
+                job.status = 'done'
+                job.last_error = None
+            elif attempts >= max_attempts:
+                job.status = 'dead'
+                job.last_error = error
+            else:
+                job.status = 'pending'
+                job.last_error = error
+                job.run_after = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def run_batch(executor, batch_size, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Claim a batch of jobs and run them concurrently; returns how many ran."""
+    jobs = claim(batch_size)
+    if not jobs:
+        return 0
+    futures = [(job_id, attempts, executor.submit(_run, kind, payload))
+               for job_id, kind, payload, attempts in jobs]
+    results = []
+    for job_id, attempts, future in futures:
+        try:
+            future.result()
+            results.append((job_id, attempts, None))
+        except Exception as err:
+            log.warning("job %s failed (attempt %d): %s", job_id, attempts, err)
+            results.append((job_id, attempts, repr(err)))
+    _finish(results, max_attempts)
+    return len(jobs)
+
+
+def run_worker(settings, once=False):
+    concurrency = int(settings.get('forum.jobs.concurrency', 8))
+    batch_size = int(settings.get('forum.jobs.batch_size', concurrency * 4))
+    max_attempts = int(settings.get('forum.jobs.max_attempts', DEFAULT_MAX_ATTEMPTS))
+    poll_interval = float(settings.get('forum.jobs.poll_interval', 2))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            ran = run_batch(executor, batch_size, max_attempts)
+            if once and not ran:
+                return
+            if not ran:
+                time.sleep(poll_interval)
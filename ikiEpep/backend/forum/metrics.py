@@ -0,0 +1,145 @@
+# backend/forum/metrics.py
+import logging
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+# Per-thread SQL accounting for the request being handled: [count, seconds]
+_local = threading.local()
+
+
+class RouteStats:
+    def __init__(self, reservoir_size):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        # the latest latencies, quantiles are computed over these
+        self.samples = deque(maxlen=reservoir_size)
+
+
+class RequestMetrics:
+    """Latency and SQL totals aggregated per route name."""
+
+    def __init__(self, reservoir_size=1024):
+        self.reservoir_size = reservoir_size
+        self._routes = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, route, seconds, sql_count, sql_seconds, error=False):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats(self.reservoir_size)
+            stats.count += 1
+            stats.errors += int(error)
+            stats.seconds += seconds
+            stats.sql_count += sql_count
+            stats.sql_seconds += sql_seconds
+            stats.samples.append(seconds)
+
+    def add_collector(self, collector):
+        """Register a callable returning extra Prometheus exposition lines."""
+        self._collectors.append(collector)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                route: (s.count, s.errors, s.seconds, s.sql_count, s.sql_seconds, sorted(s.samples))
+                for route, s in self._routes.items()
+            }
+
+    def render_prometheus(self):
+        routes = self.snapshot()
+        lines = [
+            '# HELP forum_request_duration_seconds Request latency per route.',
+            '# TYPE forum_request_duration_seconds summary',
+        ]
+        for route, (count, errors, seconds, sql_count, sql_seconds, samples) in sorted(routes.items()):
+            for q in QUANTILES:
+                lines.append('forum_request_duration_seconds{route="%s",quantile="%s"} %.6f'
+                             % (route, q, _quantile(samples, q)))
+            lines.append('forum_request_duration_seconds_sum{route="%s"} %.6f' % (route, seconds))
+            lines.append('forum_request_duration_seconds_count{route="%s"} %d' % (route, count))
+        for name, kind, help_text, index in (
+            ('forum_request_errors_total', 'counter', 'Requests answered with a 5xx.', 1),
+            ('forum_sql_queries_total', 'counter', 'SQL statements executed per route.', 3),
+            ('forum_sql_duration_seconds_total', 'counter', 'Time spent in SQL per route.', 4),
+        ):
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for route, values in sorted(routes.items()):
+                lines.append('%s{route="%s"} %s' % (name, route, values[index]))
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception:
+                log.exception("metrics collector %r failed", collector)
+        return '\n'.join(lines) + '\n'
+
+
+def _quantile(samples, q):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+metrics = RequestMetrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('forum_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('forum_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    sql = getattr(_local, 'sql', None)
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += elapsed
+
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def timing_tween_factory(handler, registry):
+    settings = registry.settings or {}
+    query_warning = int(settings.get('forum.metrics.query_warning', 25))
+
+    def timing_tween(request):
+        sql = _local.sql = [0, 0.0]
+        start = time.perf_counter()
+        response = None
+        try:
+            response = handler(request)
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            _local.sql = None
+            route = getattr(request, 'matched_route', None)
+            route_name = getattr(route, 'name', None) or 'notfound'
+            error = response is None or response.status_code >= 500
+            metrics.observe(route_name, elapsed, sql[0], sql[1], error)
+            if response is not None:
+                response.headers['Server-Timing'] = (
+                    'app;dur=%.1f, db;dur=%.1f;desc="%d queries"'
+                    % (elapsed * 1000, sql[1] * 1000, sql[0])
+                )
+            if sql[0] > query_warning:
+                log.warning("%s ran %d SQL statements (possible N+1)", route_name, sql[0])
+    return timing_tween
+
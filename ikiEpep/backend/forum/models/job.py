@@ -0,0 +1,23 @@
+# backend/forum/models/job.py
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from .meta import Base
+from datetime import datetime
+
+class Job(Base):
+    """Durable background job, run by the ``forum_jobs`` worker command."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # the worker polls for due jobs: status IN (...) AND run_after <= now
+        Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False, default='{}')  # JSON
+    status = Column(String(20), nullable=False, default='pending')  # pending/running/done/dead
+    attempts = Column(Integer, nullable=False, default=0)
+    # when the job may (next) be picked up; while running, the lease expiry
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
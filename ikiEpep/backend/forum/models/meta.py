@@ -1,10 +1,45 @@
+from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import scoped_session, sessionmaker
-from zope.sqlalchemy import register
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from zope.sqlalchemy import mark_changed, register
 
-DBSession = scoped_session(sessionmaker())
+from ..db import routed_engine, stop_routing
+
+
+class RoutingSession(Session):
+    """Reads go to the replica picked for the request (forum.db), if any.
+
+    Flushes and INSERT/UPDATE/DELETE statements always use the primary,
+    and once a request has written, its later reads do too.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        engine = routed_engine()
+        if engine is not None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                stop_routing()
+            else:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+DBSession = scoped_session(sessionmaker(class_=RoutingSession))
 register(DBSession)
+
+
+@event.listens_for(DBSession, 'do_orm_execute')
+def _mark_dml(orm_execute_state):
+    # zope.sqlalchemy only commits a session it saw change (a flush, a
+    # query.update()/delete()); Core INSERT/UPDATE/DELETE statements run
+    # through DBSession.execute() would otherwise be rolled back
+    if orm_execute_state.statement.is_dml:
+        mark_changed(orm_execute_state.session)
+
 Base = declarative_base()
 
 from .user import User
 from .topic import Topic
+from .job import Job
+from .post import Post
+from .topic_score import TopicScore
+from .topic_revision import TopicRevision
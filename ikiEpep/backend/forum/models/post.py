@@ -0,0 +1,37 @@
+# backend/forum/models/post.py
+from sqlalchemy import Column, Integer, String, DateTime, Index, ForeignKey
+from .meta import Base
+from datetime import datetime
+
+# Each path segment is the zero-padded post id, so ordering by path walks a
+# thread depth-first with every reply right after its parent.
+PATH_SEGMENT_WIDTH = 10
+PATH_SEPARATOR = '.'
+MAX_DEPTH = 32
+
+class Post(Base):
+    __tablename__ = 'posts'
+    __table_args__ = (
+        # whole thread in display order
+        Index('ix_posts_topic_id_path', 'topic_id', 'path'),
+        # first level of a thread, opened before anything is expanded
+        Index('ix_posts_topic_id_depth_path', 'topic_id', 'depth', 'path'),
+        # expanding one post's direct replies
+        Index('ix_posts_parent_id_path', 'parent_id', 'path'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    topic_id = Column(Integer, ForeignKey('topics.id', ondelete='CASCADE'), nullable=False)
+    parent_id = Column(Integer, ForeignKey('posts.id', ondelete='CASCADE'))
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'))
+    username = Column(String(255), nullable=False)
+    content = Column(String, nullable=False)
+    path = Column(String((PATH_SEGMENT_WIDTH + 1) * MAX_DEPTH), nullable=False, default='')
+    depth = Column(Integer, nullable=False, default=0)
+    reply_count = Column(Integer, nullable=False, default=0, server_default='0')  # direct replies
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @staticmethod
+    def path_segment(post_id):
+        return str(post_id).zfill(PATH_SEGMENT_WIDTH)
@@ -1,14 +1,29 @@
 # backend/forum/models/topic.py
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index, ForeignKey
 from .meta import Base
 from datetime import datetime
 
 class Topic(Base):
     __tablename__ = 'topics'
+    __table_args__ = (
+        # Keyset pagination for /api/get-topics walks (created_at, id) newest first
+        Index('ix_topics_created_at_id', 'created_at', 'id'),
+        # max(updated_at) is the validator for the listing's ETag
+        Index('ix_topics_updated_at', 'updated_at'),
+        # a user's topics, newest first (/api/users/{user_id}/topics)
+        Index('ix_topics_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True)
     title = Column(String(255), nullable=False)
     content = Column(String, nullable=False)
     username = Column(String(255), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
+    imagekit_file_id = Column(String(255))  # uploaded image, if any
+    # maintained when replies are posted (forum/views/post.py)
+    reply_count = Column(Integer, nullable=False, default=0, server_default='0')
+    # detail page views, written in batches by forum/counters.py
+    views = Column(Integer, nullable=False, default=0, server_default='0')
+    last_activity_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,28 @@
+# backend/forum/models/topic_revision.py
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, LargeBinary, ForeignKey, UniqueConstraint
+from .meta import Base
+from datetime import datetime
+
+class TopicRevision(Base):
+    """One version of a topic's title and content, see forum/revisions.py.
+
+    ``data`` is either the zlib-compressed content (``snapshot``) or a
+    compressed delta against revision ``number - 1``; ``chain`` counts the
+    deltas since the last snapshot, so a revision is rebuilt from the rows
+    ``number - chain`` .. ``number``.
+    """
+    __tablename__ = 'topic_revisions'
+    __table_args__ = (
+        # also the index for reading a revision and its chain
+        UniqueConstraint('topic_id', 'number', name='uq_topic_revisions_topic_id_number'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    topic_id = Column(Integer, ForeignKey('topics.id', ondelete='CASCADE'), nullable=False)
+    number = Column(Integer, nullable=False)  # 1 is the topic as created
+    snapshot = Column(Boolean, nullable=False, default=False)
+    chain = Column(Integer, nullable=False, default=0)
+    title = Column(String(255), nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'))
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,21 @@
+# backend/forum/models/topic_score.py
+from sqlalchemy import Column, Integer, Float, DateTime, Index, ForeignKey
+from .meta import Base
+from datetime import datetime
+
+class TopicScore(Base):
+    """Trending score of a topic, maintained by forum/trending.py.
+
+    ``score`` is the log of the topic's exponentially decayed activity,
+    kept relative to a fixed epoch so it never has to be decayed in place:
+    ordering by it is ordering by current hotness.
+    """
+    __tablename__ = 'topic_scores'
+    __table_args__ = (
+        # /api/topics/trending reads the top K off this index
+        Index('ix_topic_scores_score', 'score'),
+    )
+
+    topic_id = Column(Integer, ForeignKey('topics.id', ondelete='CASCADE'), primary_key=True)
+    score = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, DateTime
 from .meta import Base
-import bcrypt
+from .. import hashing
 
 class User(Base):
     __tablename__ = 'users'
@@ -8,13 +8,15 @@ class User(Base):
     username = Column(String(50), unique=True, nullable=False)
     email = Column(String(100), unique=True, nullable=False)
     password = Column(String(255), nullable=False)  # store hashed password in production
+    # maintained by create_topic/delete_topic so profiles never count topics
+    topic_count = Column(Integer, nullable=False, default=0, server_default='0')
+    last_posted_at = Column(DateTime)
 
     @staticmethod
     def hash_password(password: str) -> str:
-        # Hash the password with bcrypt
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode('utf-8'),salt)
-        return hashed.decode('utf-8')
+        # Hash the password with bcrypt in the hashing pool
+        # (raises hashing.HashingPoolBusy when the pool is saturated)
+        return hashing.pool.hash_password(password)
     def verify_password(self, password: str) -> bool:
-        # Verify the password with bcrypt
-        return bcrypt.checkpw(password.encode('utf-8'), self.password.encode('utf-8'))
+        # Verify the password with bcrypt in the hashing pool
+        return hashing.pool.verify_password(password, self.password)
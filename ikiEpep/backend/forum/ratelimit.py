@@ -0,0 +1,333 @@
+# backend/forum/ratelimit.py
+import json
+import logging
+import math
+import threading
+import time
+from collections import Counter, namedtuple
+
+from pyramid.exceptions import ConfigurationError
+from pyramid.response import Response
+from pyramid.settings import asbool
+
+from .lru import ExpiringLRU
+from .metrics import metrics
+from .security import matched_route_name
+from .streaming import ClosingIter
+
+log = logging.getLogger(__name__)
+
+# ``count`` requests per ``period`` seconds
+Limit = namedtuple('Limit', 'count period')
+
+UNITS = {
+    's': 1, 'sec': 1, 'second': 1, 'seconds': 1,
+    'm': 60, 'min': 60, 'minute': 60, 'minutes': 60,
+    'h': 3600, 'hour': 3600, 'hours': 3600,
+}
+# forum.ratelimit.* keys that are not route names
+RESERVED = {'enabled', 'backend', 'url', 'prefix', 'default', 'trust_forwarded', 'max_keys'}
+
+
+def parse_limit(value):
+    """``"10/minute"``, ``"5/30"`` (per 30 seconds) or ``"off"``; raises
+    ValueError for anything else."""
+    value = value.strip()
+    if value.lower() in ('', '0', 'off', 'none'):
+        return None
+    count, _, per = value.partition('/')
+    per = per.strip().lower() or 'second'
+    period = UNITS[per] if per in UNITS else float(per)
+    if period <= 0:
+        raise ValueError("period must be positive: %r" % value)
+    return Limit(int(count), float(period))
+
+
+def _limit_setting(key, value):
+    try:
+        return parse_limit(value)
+    except ValueError:
+        raise ConfigurationError(
+            '%s = %r: expected "<count>/<seconds or second, minute, hour>" or "off"' % (key, value))
+
+
+def _window(limit, now):
+    """``(window, slot, elapsed)``: fixed windows of ``period`` seconds."""
+    window = max(1, int(limit.period))
+    slot, elapsed = divmod(now, window)
+    return window, int(slot), elapsed
+
+
+def _decide(limit, window, elapsed, count, before):
+    """Sliding-window check of one key.
+
+    ``count`` is the current fixed window including this request, ``before``
+    the previous window, weighted by how much of it still overlaps the
+    sliding window. Returns ``(allowed, retry_after_seconds)``.
+    """
+    weight = (window - elapsed) / window
+    if before * weight + count <= limit.count:
+        return True, 0
+    count -= 1
+    if before and count < limit.count:
+        # when the previous window's weight has decayed enough for one more
+        retry_after = window - elapsed - (limit.count - count - 1) * window / before
+    else:
+        retry_after = window - elapsed
+    return False, max(retry_after, 0)
+
+
+def _verdict(decisions):
+    """The request passes only if every key had room."""
+    waits = [retry_after for allowed, retry_after in decisions if not allowed]
+    return (False, max(waits)) if waits else (True, 0)
+
+
+class MemoryStore:
+    """Sliding-window counters in this process, same algorithm as RedisStore."""
+
+    def __init__(self, max_keys=100000):
+        self._counts = ExpiringLRU(maxsize=max_keys)
+        self._lock = threading.Lock()
+
+    def hit(self, keys, limit, now=None):
+        """Count a request against every key in ``keys``; return ``(allowed,
+        retry_after_seconds)``. A rejected request counts against none of them."""
+        now = time.time() if now is None else now
+        window, slot, elapsed = _window(limit, now)
+        with self._lock:
+            counts = [self._counts.get((key, slot), 0) + 1 for key in keys]
+            allowed, retry_after = _verdict([
+                _decide(limit, window, elapsed, count, self._counts.get((key, slot - 1), 0))
+                for key, count in zip(keys, counts)
+            ])
+            if allowed:
+                # needed until the end of the next window
+                expires_at = time.time() + (slot + 2) * window - now
+                for key, count in zip(keys, counts):
+                    self._counts.set((key, slot), count, expires_at)
+        return allowed, retry_after
+
+
+class RedisStore:
+    """Sliding-window counters shared by every process.
+
+    The count is the current fixed window plus the previous one weighted by
+    how much of it still overlaps the sliding window; two plain counters per
+    key, no per-key scripts. MemoryStore makes the same decisions.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='forum:rl:', client=None):
+        if client is None:
+            if url.startswith('fakeredis://'):
+                import fakeredis
+                client = fakeredis.FakeRedis()
+            else:
+                import redis
+                client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, keys, limit, now=None):
+        now = time.time() if now is None else now
+        window, slot, elapsed = _window(limit, now)
+        current = ['%s%s:%d' % (self.prefix, key, slot) for key in keys]
+
+        pipe = self.client.pipeline()
+        for key, name in zip(keys, current):
+            pipe.incr(name)
+            pipe.expire(name, window * 2)
+            pipe.get('%s%s:%d' % (self.prefix, key, slot - 1))
+        results = pipe.execute()
+        allowed, retry_after = _verdict([
+            _decide(limit, window, elapsed, count, int(before or 0))
+            for count, _, before in zip(results[0::3], results[1::3], results[2::3])
+        ])
+        if not allowed:
+            # Rejected requests do not count against the client
+            pipe = self.client.pipeline()
+            for name in current:
+                pipe.decr(name)
+            pipe.execute()
+        return allowed, retry_after
+
+
+class InFlight:
+    """Requests currently being handled, per route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def acquire(self, route, cap):
+        with self._lock:
+            if self._counts[route] >= cap:
+                return False
+            self._counts[route] += 1
+            return True
+
+    def release(self, route):
+        with self._lock:
+            self._counts[route] -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class RateLimiter:
+    def __init__(self, store, limits, default=None, inflight=None, inflight_default=None,
+                 trust_forwarded=False):
+        self.store = store
+        self.limits = limits
+        self.default = default
+        self.inflight_caps = inflight or {}
+        self.inflight_default = inflight_default
+        self.trust_forwarded = trust_forwarded
+        self.inflight = InFlight()
+        self.rejected = Counter()  # (route, reason) -> count
+        self._lock = threading.Lock()
+
+    def limit_for(self, route):
+        return self.limits.get(route, self.default)
+
+    def client_keys(self, request):
+        """The client IP, plus the JWT user for authenticated requests.
+
+        Both have to be under the limit: one user cannot spread over many
+        addresses, and one address cannot rotate through many accounts.
+        """
+        # client_addr trusts X-Forwarded-For; only do that behind our own proxy
+        addr = request.client_addr if self.trust_forwarded else request.remote_addr
+        keys = ['ip:%s' % addr]
+        payload, error = request.jwt_claims
+        if payload and payload.get('user_id'):
+            keys.append('user:%s' % payload['user_id'])
+        return keys
+
+    def admit(self, route, request):
+        """Check ``request`` against ``route``'s limit and in-flight cap.
+
+        Returns ``(rejection, release)``: a 429/503 response, or None and a
+        callable (None when the route has no cap) to call once the request
+        is done.
+        """
+        limit = self.limit_for(route)
+        if limit is not None:
+            try:
+                allowed, retry_after = self.store.hit(
+                    ['%s:%s' % (route, key) for key in self.client_keys(request)], limit)
+            except Exception:
+                # fail open: a broken limiter store must not take the site down
+                log.exception("rate limiter store failed")
+                allowed = True
+            if not allowed:
+                self.reject(route, 'rate')
+                return _error(429, 'Too many requests, slow down.', retry_after), None
+
+        cap = self.inflight_caps.get(route, self.inflight_default)
+        if cap is None:
+            return None, None
+        if not self.inflight.acquire(route, cap):
+            self.reject(route, 'inflight')
+            return _error(503, 'Server is busy, please try again shortly.', 1), None
+        return None, lambda: self.inflight.release(route)
+
+    def reject(self, route, reason):
+        with self._lock:
+            self.rejected[(route, reason)] += 1
+
+    def metric_lines(self):
+        lines = []
+        with self._lock:
+            rejected = sorted(self.rejected.items())
+        for (route, reason), count in rejected:
+            lines.append('forum_ratelimit_rejected_total{route="%s",reason="%s"} %d' % (route, reason, count))
+        for route, count in sorted(self.inflight.snapshot().items()):
+            lines.append('forum_requests_in_flight{route="%s"} %d' % (route, count))
+        return lines
+
+
+def _error(status, message, retry_after):
+    response = Response(
+        body=json.dumps({'error': message}),
+        status=status,
+        content_type='application/json',
+        charset='utf-8',
+    )
+    # not headers=...: that would replace the Content-Type set above
+    response.headers['Retry-After'] = str(max(1, int(math.ceil(retry_after))))
+    return response
+
+
+def _route_settings(settings, prefix):
+    values = {}
+    for key, value in settings.items():
+        if key.startswith(prefix) and key[len(prefix):] not in RESERVED:
+            values[key[len(prefix):]] = value
+    return values
+
+
+def make_limiter(settings):
+    if settings.get('forum.ratelimit.backend', 'memory') == 'redis':
+        store = RedisStore(
+            url=settings.get('forum.ratelimit.url') or settings.get('forum.cache.url', 'redis://localhost:6379/0'),
+            prefix=settings.get('forum.ratelimit.prefix', 'forum:rl:'),
+        )
+    else:
+        store = MemoryStore(max_keys=int(settings.get('forum.ratelimit.max_keys', 100000)))
+
+    limits = {
+        route: _limit_setting('forum.ratelimit.' + route, value)
+        for route, value in _route_settings(settings, 'forum.ratelimit.').items()
+    }
+    inflight = {
+        route: int(value)
+        for route, value in _route_settings(settings, 'forum.inflight.').items()
+    }
+    default_cap = settings.get('forum.inflight.default')
+    return RateLimiter(
+        store,
+        limits,
+        default=_limit_setting('forum.ratelimit.default', settings.get('forum.ratelimit.default', 'off')),
+        inflight=inflight,
+        inflight_default=int(default_cap) if default_cap else None,
+        trust_forwarded=asbool(settings.get('forum.ratelimit.trust_forwarded', False)),
+    )
+
+
+def ratelimit_tween_factory(handler, registry):
+    """Per-client rate limits (429) and per-route in-flight caps (503).
+
+    Both are checked before the view runs, so a shed request never takes
+    a database connection or a bcrypt slot.
+    """
+    settings = registry.settings or {}
+    if not asbool(settings.get('forum.ratelimit.enabled', True)):
+        return handler
+    limiter = registry.ratelimiter = make_limiter(settings)
+    metrics.add_collector(limiter.metric_lines)
+
+    def ratelimit_tween(request):
+        route = matched_route_name(request)
+        if route is None:
+            return handler(request)
+
+        rejection, release = limiter.admit(route, request)
+        if rejection is not None:
+            return rejection
+        if release is None:
+            return handler(request)
+        try:
+            response = handler(request)
+        except BaseException:
+            release()
+            raise
+        if isinstance(response.app_iter, (list, tuple)):
+            release()
+        else:
+            # Streamed bodies (json_stream, SSE) do their real work after
+            # the view returned: the slot is held until the server closes them
+            response.app_iter = ClosingIter(response.app_iter, release)
+        return response
+    return ratelimit_tween
@@ -0,0 +1,108 @@
+# backend/forum/renderers.py
+import logging
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see the "speedups" extra in setup.py
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+# Rows encoded per chunk written by the json_stream renderer
+STREAM_CHUNK_ROWS = 500
+
+
+def _default(obj):
+    if hasattr(obj, '_asdict'):  # namedtuples and query rows
+        return obj._asdict()
+    if hasattr(obj, '__json__'):
+        return obj.__json__()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError("%r is not JSON serializable" % (obj,))
+
+
+if orjson is not None:
+    def json_dumps(value):
+        """Serialize ``value`` to JSON bytes."""
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    import json
+
+    def json_dumps(value):
+        """Serialize ``value`` to JSON bytes."""
+        return json.dumps(value, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSON:
+    """The ``json`` renderer, encoding with orjson when it is installed."""
+
+    def __call__(self, info):
+        def _render(value, system):
+            request = system.get('request')
+            if request is not None:
+                response = request.response
+                if response.content_type == response.default_content_type:
+                    response.content_type = 'application/json'
+            return json_dumps(value)
+        return _render
+
+
+class JSONStream:
+    """A JSON array for the ``json_stream`` renderer, encoded while it is sent.
+
+    ``rows`` is any iterable, typically ``stream_rows(...)`` over a
+    server-side cursor; ``dump`` turns one row into something
+    ``json_dumps`` accepts (e.g. ``topic_dumper.dump``). Only one chunk of
+    rows is held in memory at a time.
+    """
+
+    def __init__(self, rows, dump=None, chunk_rows=STREAM_CHUNK_ROWS):
+        self.rows = rows
+        self.dump = dump
+        self.chunk_rows = chunk_rows
+
+    def __iter__(self):
+        dump = self.dump
+        chunk, first = [], True
+        try:
+            yield b'['
+            for row in self.rows:
+                chunk.append(json_dumps(dump(row) if dump else row))
+                if len(chunk) >= self.chunk_rows:
+                    yield (b'' if first else b',') + b','.join(chunk)
+                    chunk, first = [], False
+            if chunk:
+                yield (b'' if first else b',') + b','.join(chunk)
+            yield b']'
+        except Exception:
+            # The status line is already out; all we can do is cut the body short
+            log.exception("JSON stream failed")
+            raise
+        finally:
+            close = getattr(self.rows, 'close', None)
+            if close is not None:
+                close()
+
+
+class StreamingJSON(FastJSON):
+    """The ``json_stream`` renderer: JSONStream values become the response's
+    ``app_iter``, anything else is rendered like the ``json`` renderer.
+    """
+
+    def __call__(self, info):
+        render = super().__call__(info)
+
+        def _render(value, system):
+            if not isinstance(value, JSONStream):
+                return render(value, system)
+            request = system.get('request')
+            if request is not None:
+                request.response.content_type = 'application/json'
+                request.response.charset = 'utf-8'
+            # an iterable result is used as the app_iter by pyramid
+            return iter(value)
+        return _render
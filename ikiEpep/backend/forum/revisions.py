@@ -0,0 +1,208 @@
+# backend/forum/revisions.py
+"""Topic edit history as compressed deltas between periodic snapshots.
+
+Revision 1 is the topic as created. Every edit adds a revision holding
+the new content as a delta against the previous one (character ranges to
+copy plus inserted text, JSON, zlib). Every ``SNAPSHOT_EVERY`` revisions,
+or whenever the delta would not be smaller, the full content is stored
+instead, so rebuilding any revision reads at most ``SNAPSHOT_EVERY`` rows
+and applies that many deltas.
+"""
+import json
+import logging
+import re
+import zlib
+from difflib import SequenceMatcher
+
+from sqlalchemy import select
+
+from .models.meta import DBSession
+from .models.topic_revision import TopicRevision
+
+log = logging.getLogger(__name__)
+
+# A full snapshot at least every this many revisions
+SNAPSHOT_EVERY = 20
+COMPRESSION_LEVEL = 6
+
+# Words, runs of whitespace and single punctuation marks: the diff works
+# on these rather than on characters, which is much cheaper on long posts
+_TOKEN = re.compile(r'\w+|\s+|[^\w\s]')
+
+
+class RevisionNotFound(LookupError):
+    pass
+
+
+def configure_revisions(settings):
+    global SNAPSHOT_EVERY
+    SNAPSHOT_EVERY = max(1, int(settings.get('forum.revisions.snapshot_every', SNAPSHOT_EVERY)))
+
+
+def make_delta(old, new):
+    """Ops turning ``old`` into ``new``: ``[start, end]`` copies old[start:end],
+    a string is inserted as is."""
+    a, b = _TOKEN.findall(old), _TOKEN.findall(new)
+    offsets = [0]
+    for token in a:
+        offsets.append(offsets[-1] + len(token))
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append([offsets[i1], offsets[i2]])
+        elif j2 > j1:
+            ops.append(''.join(b[j1:j2]))
+    return ops
+
+
+def apply_delta(old, ops):
+    return ''.join(old[op[0]:op[1]] if isinstance(op, list) else op for op in ops)
+
+
+def _pack(value):
+    return zlib.compress(value.encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def _unpack(data):
+    return zlib.decompress(data).decode('utf-8')
+
+
+def encode(previous, content, chain):
+    """``(snapshot, chain, data)`` for ``content`` following ``previous``
+    at ``chain`` deltas from its snapshot."""
+    full = _pack(content)
+    if previous is None or chain + 1 >= SNAPSHOT_EVERY:
+        return True, 0, full
+    delta = _pack(json.dumps(make_delta(previous, content), separators=(',', ':')))
+    if len(delta) >= len(full):
+        return True, 0, full
+    return False, chain + 1, delta
+
+
+def decode(rows):
+    """The content of the last of ``rows``, which start with a snapshot and
+    are consecutive (any objects with ``snapshot`` and ``data``)."""
+    content = None
+    for row in rows:
+        if row.snapshot:
+            content = _unpack(row.data)
+        else:
+            content = apply_delta(content, json.loads(_unpack(row.data)))
+    return content
+
+
+def _latest(topic_id):
+    return (
+        DBSession.query(TopicRevision.number, TopicRevision.chain)
+        .filter(TopicRevision.topic_id == topic_id)
+        .order_by(TopicRevision.number.desc())
+        .first()
+    )
+
+
+def record_create(topic):
+    """Revision 1 of a new topic, in the request's transaction."""
+    DBSession.add(TopicRevision(
+        topic_id=topic.id, number=1, snapshot=True, chain=0,
+        title=topic.title, data=_pack(topic.content),
+        user_id=topic.user_id, created_at=topic.created_at,
+    ))
+
+
+def record_edit(topic, previous_title, previous_content, user_id):
+    """The revision for an edit of ``topic`` whose content was
+    ``previous_content``, in the request's transaction.
+
+    Topics from before revisions existed (or bulk imported) first get a
+    snapshot of their previous state as revision 1.
+    """
+    latest = _latest(topic.id)
+    if latest is None:
+        DBSession.add(TopicRevision(
+            topic_id=topic.id, number=1, snapshot=True, chain=0,
+            title=previous_title, data=_pack(previous_content),
+            user_id=topic.user_id, created_at=topic.created_at,
+        ))
+        number, chain = 1, 0
+    else:
+        number, chain = latest
+    snapshot, chain, data = encode(previous_content, topic.content, chain)
+    DBSession.add(TopicRevision(
+        topic_id=topic.id, number=number + 1, snapshot=snapshot, chain=chain,
+        title=topic.title, data=data, user_id=user_id, created_at=topic.updated_at,
+    ))
+
+
+def list_revisions(topic_id, limit, before=None):
+    """Revision metadata, newest first; the content is not decoded."""
+    query = DBSession.query(
+        TopicRevision.number, TopicRevision.snapshot, TopicRevision.title,
+        TopicRevision.user_id, TopicRevision.created_at,
+    ).filter(TopicRevision.topic_id == topic_id)
+    if before is not None:
+        query = query.filter(TopicRevision.number < before)
+    return query.order_by(TopicRevision.number.desc()).limit(limit).all()
+
+
+def get_revision(topic_id, number):
+    """``(revision row, content)``; raises RevisionNotFound."""
+    target = (
+        DBSession.query(TopicRevision)
+        .filter(TopicRevision.topic_id == topic_id, TopicRevision.number == number)
+        .first()
+    )
+    if target is None:
+        raise RevisionNotFound(number)
+    rows = (
+        DBSession.query(TopicRevision.snapshot, TopicRevision.data)
+        .filter(
+            TopicRevision.topic_id == topic_id,
+            TopicRevision.number >= number - target.chain,
+            TopicRevision.number <= number,
+        )
+        .order_by(TopicRevision.number)
+        .all()
+    )
+    return target, decode(rows)
+
+
+def resnapshot(engine, max_chain=None):
+    """Turn revisions into snapshots wherever a chain is longer than
+    ``max_chain`` (default ``SNAPSHOT_EVERY``), e.g. after lowering the
+    setting. Returns the number of revisions rewritten.
+
+    A delta is against the previous revision's content, not the snapshot,
+    so only the rewritten rows and the chain counts of later ones change.
+    """
+    max_chain = SNAPSHOT_EVERY if max_chain is None else max_chain
+    revisions = TopicRevision.__table__
+    with engine.connect() as conn:
+        topic_ids = list(conn.execute(
+            select(revisions.c.topic_id).where(revisions.c.chain >= max_chain).distinct()
+        ).scalars())
+
+    rewritten = 0
+    for topic_id in topic_ids:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(revisions.c.id, revisions.c.snapshot, revisions.c.chain, revisions.c.data)
+                .where(revisions.c.topic_id == topic_id)
+                .order_by(revisions.c.number)
+            ).all()
+            content, chain = None, 0
+            for row in rows:
+                content = decode([row]) if row.snapshot else apply_delta(content, json.loads(_unpack(row.data)))
+                if row.snapshot:
+                    chain = 0
+                elif chain + 1 >= max_chain:
+                    chain = 0
+                    conn.execute(revisions.update().where(revisions.c.id == row.id)
+                                 .values(snapshot=True, chain=0, data=_pack(content)))
+                    rewritten += 1
+                    continue
+                else:
+                    chain += 1
+                if chain != row.chain:
+                    conn.execute(revisions.update().where(revisions.c.id == row.id).values(chain=chain))
+        log.debug("Re-snapshotted topic %d", topic_id)
+    return rewritten
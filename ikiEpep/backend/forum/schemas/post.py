@@ -0,0 +1,12 @@
+from marshmallow import Schema, fields, validate
+
+class PostSchema(Schema):
+    id = fields.Int(dump_only=True)
+    topic_id = fields.Int(dump_only=True)
+    parent_id = fields.Int(allow_none=True)
+    username = fields.Str(dump_only=True)
+    content = fields.Str(required=True, validate=validate.Length(min=1))
+    depth = fields.Int(dump_only=True)
+    reply_count = fields.Int(dump_only=True)
+    created_at = fields.DateTime(dump_only=True)
+    updated_at = fields.DateTime(dump_only=True)
@@ -1,7 +1,36 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, EXCLUDE
 
 class TopicSchema(Schema):
     id = fields.Int(dump_only=True)
     title = fields.Str(required=True)
     content = fields.Str(required=True)
     username = fields.Str(required=True)
+    reply_count = fields.Int(dump_only=True)
+    views = fields.Int(dump_only=True)
+    last_activity_at = fields.DateTime(dump_only=True)
+    created_at = fields.DateTime(dump_only=True)
+    updated_at = fields.DateTime(dump_only=True)
+
+class TopicSummarySchema(Schema):
+    # Listing rows: the content is cut down to an excerpt
+    id = fields.Int(dump_only=True)
+    title = fields.Str(dump_only=True)
+    username = fields.Str(dump_only=True)
+    excerpt = fields.Str(dump_only=True)
+    reply_count = fields.Int(dump_only=True)
+    views = fields.Int(dump_only=True)
+    last_activity_at = fields.DateTime(dump_only=True)
+    created_at = fields.DateTime(dump_only=True)
+    updated_at = fields.DateTime(dump_only=True)
+
+
+class TopicImportSchema(Schema):
+    # One line of a bulk import; exported ids are dropped, new ones are assigned
+    class Meta:
+        unknown = EXCLUDE
+
+    title = fields.Str(required=True)
+    content = fields.Str(required=True)
+    username = fields.Str(required=True)
+    created_at = fields.DateTime()
+    updated_at = fields.DateTime()
@@ -0,0 +1,30 @@
+# backend/forum/scripts/jobs.py
+import argparse
+import logging
+import sys
+
+from pyramid.paster import bootstrap, setup_logging
+
+from ..jobs import run_worker
+
+log = logging.getLogger(__name__)
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(description="Run the forum background job worker.")
+    parser.add_argument('config_uri', help="e.g. development.ini")
+    parser.add_argument('--once', action='store_true', help="exit once no job is due")
+    args = parser.parse_args(argv[1:])
+
+    setup_logging(args.config_uri)
+    with bootstrap(args.config_uri) as env:
+        settings = env['registry'].settings
+        log.info("Job worker started")
+        try:
+            run_worker(settings, once=args.once)
+        except KeyboardInterrupt:
+            log.info("Job worker stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+# backend/forum/scripts/revisions.py
+import argparse
+import logging
+import sys
+
+from pyramid.paster import bootstrap, setup_logging
+
+from .. import revisions
+
+log = logging.getLogger(__name__)
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        description="Re-snapshot topic revision chains longer than forum.revisions.snapshot_every.")
+    parser.add_argument('config_uri', help="e.g. development.ini")
+    parser.add_argument('--max-chain', type=int,
+                        help="longest delta chain to keep (default: the snapshot_every setting)")
+    args = parser.parse_args(argv[1:])
+
+    setup_logging(args.config_uri)
+    with bootstrap(args.config_uri) as env:
+        engine = env['registry'].db_engine
+        rewritten = revisions.resnapshot(engine, args.max_chain)
+        log.info("Revisions: %d deltas turned into snapshots", rewritten)
+
+
+if __name__ == '__main__':
+    main()
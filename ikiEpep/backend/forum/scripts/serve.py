@@ -0,0 +1,314 @@
+# backend/forum/scripts/serve.py
+"""Pre-fork production server: N waitress worker processes on one port.
+
+The master binds the listening socket and forks the workers, which all
+accept from it (or, with ``reuse_port = true``, each bind their own
+SO_REUSEPORT socket and let the kernel balance). Everything is read from
+the ``[server:main]`` section of the .ini file.
+
+Signals sent to the master:
+
+* HUP   -- rolling reload: each worker is replaced by a fresh one, the old
+           one finishes its in-flight requests first
+* TERM / INT -- graceful shutdown
+* TTIN / TTOU -- one worker more / less
+"""
+import argparse
+import errno
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+from pyramid.paster import get_appsettings, setup_logging
+from plaster import get_settings
+
+from ..writebehind import flush_all
+
+log = logging.getLogger(__name__)
+
+# [server:main] keys handled here; everything else is passed to waitress
+LAUNCHER_KEYS = {'use', 'host', 'port', 'listen', 'workers', 'threads',
+                 'reuse_port', 'preload', 'graceful_timeout', 'ready_timeout'}
+# A worker that dies sooner than this after its start counts as crashing
+MIN_UPTIME = 2.0
+MAX_BACKOFF = 30.0
+
+
+def _flag(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def load_server_options(config_uri, overrides=None):
+    server = dict(get_settings(config_uri, 'server:main'))
+    server.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return {
+        'host': server.get('host', '0.0.0.0'),
+        'port': int(server.get('port', 6543)),
+        'workers': int(server.get('workers') or os.cpu_count() or 1),
+        'threads': int(server.get('threads', 4)),
+        'reuse_port': _flag(server.get('reuse_port', False)),
+        'preload': _flag(server.get('preload', False)),
+        'graceful_timeout': float(server.get('graceful_timeout', 30)),
+        'ready_timeout': float(server.get('ready_timeout', 60)),
+        'waitress': {k: v for k, v in server.items() if k not in LAUNCHER_KEYS},
+    }
+
+
+def load_app(config_uri, threads):
+    """Build the WSGI app with the pool sized for this worker's threads."""
+    from .. import main as make_app
+
+    settings = get_appsettings(config_uri)
+    settings['forum.threads'] = str(threads)
+    return make_app(getattr(settings, 'global_conf', {}), **settings)
+
+
+def bind_socket(host, port, reuse_port=False, backlog=1024):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    # Several processes accept from the same socket: the loser of a
+    # wake-up must get EAGAIN instead of blocking its event loop
+    sock.setblocking(False)
+    return sock
+
+
+class Worker:
+    """Runs inside the forked child: serve until told to stop, then drain."""
+
+    def __init__(self, config_uri, app, sock, options, ready_fd):
+        self.config_uri = config_uri
+        self.app = app
+        self.sock = sock
+        self.options = options
+        self.ready_fd = ready_fd
+        self.stopping = False
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        from waitress.channel import HTTPChannel
+        from waitress.server import create_server
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        for signum in (signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(signum, signal.SIG_IGN)
+
+        options = self.options
+        sock = self.sock
+        if sock is None:
+            sock = bind_socket(options['host'], options['port'], reuse_port=True)
+        if self.app is None:
+            self.app = load_app(self.config_uri, options['threads'])
+
+        server = create_server(self.app, sockets=[sock], threads=options['threads'],
+                               **options['waitress'])
+        os.write(self.ready_fd, b'1')
+        os.close(self.ready_fd)
+        log.info("Worker %d serving with %d threads", os.getpid(), options['threads'])
+
+        master = os.getppid()
+        channel_map = server._map
+        while not self.stopping:
+            server.asyncore.loop(timeout=1.0, map=channel_map, count=1)
+            if os.getppid() != master:
+                log.warning("Master %d went away, worker %d stopping", master, os.getpid())
+                break
+
+        # Stop accepting (this process' copy of the socket only), let the
+        # requests in flight finish, then leave
+        server.close()
+        deadline = time.monotonic() + options['graceful_timeout']
+        while time.monotonic() < deadline:
+            busy = False
+            for channel in list(channel_map.values()):
+                if not isinstance(channel, HTTPChannel):
+                    continue
+                if getattr(channel, 'requests', None) or getattr(channel, 'total_outbufs_len', 0):
+                    busy = True
+                    channel.will_close = True
+                elif not getattr(channel, 'request', None):
+                    channel.handle_close()  # idle keep-alive connection
+                else:
+                    busy = True
+            if not busy:
+                break
+            server.asyncore.loop(timeout=0.5, map=channel_map, count=1)
+        server.task_dispatcher.shutdown(timeout=5)
+        # os._exit() skips atexit, write the buffered counters out here
+        flush_all()
+        log.info("Worker %d stopped", os.getpid())
+
+
+class Master:
+    def __init__(self, config_uri, options):
+        self.config_uri = config_uri
+        self.options = options
+        self.sock = None
+        self.app = None
+        self.workers = {}  # pid -> started_at
+        self.signals = []
+        self.backoff = 0.0
+
+    def _queue_signal(self, signum, frame):
+        self.signals.append(signum)
+
+    def spawn(self, wait=False):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            code = 0
+            try:
+                Worker(self.config_uri, self.app, self.sock, self.options, write_fd).run()
+            except Exception:
+                log.exception("Worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+
+        os.close(write_fd)
+        self.workers[pid] = time.monotonic()
+        try:
+            if wait:
+                ready, _, _ = select.select([read_fd], [], [], self.options['ready_timeout'])
+                if not ready or not os.read(read_fd, 1):
+                    log.error("Worker %d did not become ready", pid)
+                    del self.workers[pid]
+                    self.stop_workers([pid], signal.SIGKILL)
+                    return None
+        finally:
+            os.close(read_fd)
+        return pid
+
+    def stop_workers(self, pids, sig=signal.SIGTERM):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except OSError as err:
+                if err.errno != errno.ESRCH:
+                    raise
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue  # an old generation worker, already replaced
+            code = os.waitstatus_to_exitcode(status)
+            log.warning("Worker %d exited with %s", pid, code)
+            if time.monotonic() - started < MIN_UPTIME:
+                self.backoff = min(MAX_BACKOFF, max(1.0, self.backoff * 2))
+            else:
+                self.backoff = 0.0
+
+    def reload(self):
+        """Replace the workers one by one; old ones drain while new ones start."""
+        log.info("Reloading %d workers", len(self.workers))
+        options = load_server_options(self.config_uri)
+        for key in ('workers', 'threads', 'graceful_timeout', 'waitress'):
+            self.options[key] = options[key]
+        for pid, started in list(self.workers.items()):
+            del self.workers[pid]
+            if self.spawn(wait=True) is None:
+                log.error("Reload aborted, keeping the remaining old workers")
+                self.workers[pid] = started
+                return
+            self.stop_workers([pid])
+
+    def shutdown(self):
+        log.info("Shutting down %d workers", len(self.workers))
+        self.stop_workers(list(self.workers))
+        deadline = time.monotonic() + self.options['graceful_timeout'] + 5
+        while time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                time.sleep(0.1)
+        else:
+            self.stop_workers(list(self.workers), signal.SIGKILL)
+
+    def run(self):
+        options = self.options
+        if not options['reuse_port']:
+            self.sock = bind_socket(options['host'], options['port'])
+        if options['preload']:
+            # Shared copy-on-write app; every worker disposes the inherited
+            # engine pool after the fork (see forum.main). Code changes then
+            # need a restart instead of HUP.
+            self.app = load_app(self.config_uri, options['threads'])
+            self.app.registry.db_engine.dispose()
+
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT,
+                       signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(signum, self._queue_signal)
+
+        log.info("Listening on %s:%d with %d workers x %d threads%s",
+                 options['host'], options['port'], options['workers'], options['threads'],
+                 ' (SO_REUSEPORT)' if options['reuse_port'] else '')
+        for _ in range(options['workers']):
+            self.spawn()
+
+        while True:
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.shutdown()
+                    return
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum == signal.SIGTTIN:
+                    options['workers'] += 1
+                elif signum == signal.SIGTTOU and options['workers'] > 1:
+                    options['workers'] -= 1
+                    pid = next(iter(self.workers))
+                    del self.workers[pid]
+                    self.stop_workers([pid])
+
+            self.reap()
+            if len(self.workers) < options['workers']:
+                if self.backoff:
+                    log.warning("Workers keep crashing, waiting %.0fs", self.backoff)
+                    time.sleep(self.backoff)
+                for _ in range(options['workers'] - len(self.workers)):
+                    self.spawn()
+            time.sleep(0.5)
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(description="Run the forum with several worker processes.")
+    parser.add_argument('config_uri', nargs='?', default='production.ini')
+    parser.add_argument('--workers', type=int, help="default: [server:main] workers or the CPU count")
+    parser.add_argument('--threads', type=int, help="threads per worker")
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--reuse-port', action='store_const', const='true', dest='reuse_port')
+    args = parser.parse_args(argv[1:])
+
+    setup_logging(args.config_uri)
+    options = load_server_options(args.config_uri, {
+        'workers': args.workers, 'threads': args.threads,
+        'port': args.port, 'reuse_port': args.reuse_port,
+    })
+    Master(args.config_uri, options).run()
+
+
+if __name__ == '__main__':
+    main()
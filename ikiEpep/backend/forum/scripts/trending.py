@@ -0,0 +1,30 @@
+# backend/forum/scripts/trending.py
+import argparse
+import logging
+import sys
+
+from pyramid.paster import bootstrap, setup_logging
+
+from .. import trending
+
+log = logging.getLogger(__name__)
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        description="Compact the trending scores; run it periodically (e.g. hourly from cron).")
+    parser.add_argument('config_uri', help="e.g. development.ini")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="recompute every score from creation times and replies")
+    args = parser.parse_args(argv[1:])
+
+    setup_logging(args.config_uri)
+    with bootstrap(args.config_uri) as env:
+        engine = env['registry'].db_engine
+        scored = trending.rebuild(engine, missing_only=not args.rebuild)
+        pruned = trending.compact(engine)
+        log.info("Trending: %d topics scored, %d cold scores pruned", scored, pruned)
+
+
+if __name__ == '__main__':
+    main()
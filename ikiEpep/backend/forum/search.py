@@ -0,0 +1,186 @@
+# backend/forum/search.py
+import logging
+import math
+import re
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, func, literal_column, or_
+
+from .models.meta import DBSession
+from .models.topic import Topic
+
+log = logging.getLogger(__name__)
+
+# Text search configuration of the generated topics.search_vector column
+SEARCH_CONFIG = 'english'
+
+# Mirrors the A/B/C setweight() of the search_vector column
+FIELD_WEIGHTS = {'title': 1.0, 'content': 0.4, 'username': 0.2}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall((text or '').lower()) if len(t) > 1]
+
+
+class InvertedIndex:
+    """In-process inverted index over topics.
+
+    Only used when the database is not PostgreSQL (e.g. SQLite in tests);
+    built from the topics table on first search and kept up to date from
+    committed session changes.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # term -> {topic_id: weight}
+        self._terms = {}  # topic_id -> terms, to remove a document again
+
+    def load(self, session):
+        with self._lock:
+            if self.loaded:
+                return
+            rows = session.query(Topic.id, Topic.title, Topic.content, Topic.username).yield_per(1000)
+            for row in rows:
+                self._add(row.id, row.title, row.content, row.username)
+            self.loaded = True
+            log.info("Search index built with %d topics", len(self._terms))
+
+    def _add(self, topic_id, title, content, username):
+        weights = defaultdict(float)
+        for field, text in (('title', title), ('content', content), ('username', username)):
+            for term in tokenize(text):
+                weights[term] += FIELD_WEIGHTS[field]
+        for term, weight in weights.items():
+            # dampen long documents repeating the same word
+            self._postings[term][topic_id] = 1.0 + math.log(weight) if weight > 1 else weight
+        self._terms[topic_id] = list(weights)
+
+    def _remove(self, topic_id):
+        for term in self._terms.pop(topic_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(topic_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def add(self, topic_id, title, content, username):
+        with self._lock:
+            self._remove(topic_id)
+            self._add(topic_id, title, content, username)
+
+    def remove(self, topic_id):
+        with self._lock:
+            self._remove(topic_id)
+
+    def search(self, query, limit, offset=0):
+        """Rank topics containing every query term; returns ``[(topic_id, rank)]``."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if not all(postings):
+                return []
+            total = len(self._terms)
+            postings.sort(key=len)
+            scores = {}
+            for topic_id in postings[0]:
+                score = 0.0
+                for p in postings:
+                    weight = p.get(topic_id)
+                    if weight is None:
+                        break
+                    score += weight * math.log(1 + total / len(p))
+                else:
+                    scores[topic_id] = score
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return ranked[offset:offset + limit]
+
+
+index = InvertedIndex()
+
+
+def search_topics(query, limit, offset=0):
+    """Ids of topics matching ``query`` with their rank, best first."""
+    if DBSession.get_bind().dialect.name == 'postgresql':
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        vector = literal_column('topics.search_vector')
+        rank = func.ts_rank_cd(vector, tsquery).label('rank')
+        rows = (
+            DBSession.query(Topic.id, rank)
+            .filter(vector.op('@@')(tsquery))
+            .order_by(rank.desc(), Topic.id.desc())
+            .limit(limit)
+            .offset(offset)
+            .all()
+        )
+        return [(row.id, float(row.rank)) for row in rows]
+
+    index.load(DBSession())
+    return index.search(query, limit, offset)
+
+
+# Keep the in-process index in step with committed topic changes. Changes
+# are collected at flush time and only applied once the commit succeeded.
+
+@event.listens_for(DBSession, 'after_flush')
+def _collect_topic_changes(session, flush_context):
+    if not index.loaded:
+        return
+    pending = session.info.setdefault('search_pending', [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Topic):
+            pending.append((obj.id, obj.title, obj.content, obj.username))
+    for obj in session.deleted:
+        if isinstance(obj, Topic):
+            pending.append((obj.id, None, None, None))
+
+
+def reindex_topics(*criteria):
+    """Re-read the topics matching ``criteria`` into the in-process index
+    once the transaction commits, for Core statements the flush hooks
+    cannot see."""
+    DBSession().info.setdefault('search_reindex', []).extend(criteria)
+
+
+def unindex_topics(topic_ids):
+    """Drop ``topic_ids`` from the in-process index once the transaction
+    commits, for set-based deletes."""
+    DBSession().info.setdefault('search_pending', []).extend(
+        (topic_id, None, None, None) for topic_id in topic_ids)
+
+
+@event.listens_for(DBSession, 'before_commit')
+def _collect_reindexed_topics(session):
+    criteria = session.info.pop('search_reindex', None)
+    if not criteria or not index.loaded:
+        return
+    rows = (
+        session.query(Topic.id, Topic.title, Topic.content, Topic.username)
+        .filter(or_(*criteria))
+        .yield_per(1000)
+    )
+    session.info.setdefault('search_pending', []).extend(
+        (row.id, row.title, row.content, row.username) for row in rows)
+
+
+@event.listens_for(DBSession, 'after_commit')
+def _apply_topic_changes(session):
+    for topic_id, title, content, username in session.info.pop('search_pending', ()):
+        if title is None:
+            index.remove(topic_id)
+        else:
+            index.add(topic_id, title, content, username)
+
+
+@event.listens_for(DBSession, 'after_transaction_end')
+def _discard_topic_changes(session, session_transaction):
+    # rolled back (zope.sqlalchemy aborts by closing the session, without
+    # a rollback event), or already applied by after_commit
+    if session_transaction.parent is None:
+        session.info.pop('search_pending', None)
+        session.info.pop('search_reindex', None)
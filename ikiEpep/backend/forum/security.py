@@ -2,10 +2,33 @@
 from pyramid.response import Response
 from pyramid.request import Request
 from pyramid.httpexceptions import HTTPFound, HTTPUnauthorized
+from pyramid.interfaces import IRoutesMapper
+from pyramid.settings import asbool
+import hashlib
+import time
+import zlib
 import jwt
 
+try:
+    import brotli
+except ImportError:  # optional, see the "compression" extra in setup.py
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # optional, see the "compression" extra in setup.py
+    zstandard = None
+
+from .lru import ExpiringLRU
+from .streaming import ClosingIter
+
 JWT_SECRET = "hidup jokowi"
 
+# Verified tokens are kept until their own ``exp``; tokens without one are
+# re-verified after this many seconds.
+JWT_CACHE_MAX_TTL = 300
+
+jwt_cache = ExpiringLRU(maxsize=1024)
+
 def cors_tween_factory(handler, registry):
     def cors_tween(request):
         if request.method == 'OPTIONS':
@@ -15,30 +38,266 @@ def cors_tween_factory(handler, registry):
         response.headers.update({
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-            'Access-Control-Allow-Headers': 'Origin, Content-Type, Authorization',
+            'Access-Control-Allow-Headers': 'Origin, Content-Type, Authorization, If-None-Match, If-Modified-Since',
+            'Access-Control-Expose-Headers': 'ETag, Last-Modified, Cache-Control, Server-Timing, Retry-After',
         })
         return response
     return cors_tween
 
-def is_authenticated(request):
+# Content types worth compressing (prefix match)
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/', 'image/svg+xml')
+# Server preference when the client rates several encodings the same
+ENCODING_PREFERENCE = ('br', 'zstd', 'gzip')
+
+# Compressed bodies by (encoding, digest of the identity body): a hot
+# response is compressed once. Not by ETag, which does not cover
+# everything in a body (e.g. the topics' view counts).
+compressed_cache = ExpiringLRU(maxsize=256)
+COMPRESSED_CACHE_TTL = 3600
+
+
+class _Compressor:
+    """One streaming compressor: ``compress`` chunks, ``sync`` to push out
+    what is buffered so far, ``finish`` at the end."""
+
+    def __init__(self, encoding, settings):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._obj = brotli.Compressor(quality=int(settings.get('forum.compression.brotli_quality', 5)))
+        elif encoding == 'zstd':
+            self._obj = zstandard.ZstdCompressor(
+                level=int(settings.get('forum.compression.zstd_level', 3))).compressobj()
+        else:
+            # wbits 31: zlib stream with a gzip header and trailer
+            self._obj = zlib.compressobj(int(settings.get('forum.compression.gzip_level', 6)), zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def sync(self):
+        if self.encoding == 'br':
+            return self._obj.flush()
+        if self.encoding == 'zstd':
+            return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def available_encodings():
+    encodings = ['gzip']
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    return encodings
+
+
+def negotiate_encoding(accept_encoding, available):
+    """The best of ``available`` for an Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        qualities[name] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODING_PREFERENCE:
+        if encoding not in available:
+            continue
+        q = qualities.get(encoding, qualities.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _add_vary(response, header):
+    vary = list(response.vary or ())
+    if header not in vary:
+        response.vary = vary + [header]
+
+
+def _weaken_etag(response):
+    # The compressed bytes differ from the identity ones, so the validator
+    # becomes weak; httpcache compares If-None-Match weakly either way
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response.headers['ETag'] = 'W/' + etag
+    return response.headers.get('ETag')
+
+
+def _compress_iter(app_iter, compressor):
+    try:
+        for chunk in app_iter:
+            if chunk:
+                # flush per chunk so the client gets the rows as they come
+                yield compressor.compress(chunk) + compressor.sync()
+        yield compressor.finish()
+    finally:
+        close = getattr(app_iter, 'close', None)
+        if close is not None:
+            close()
+
+
+def compression_tween_factory(handler, registry):
+    """gzip/brotli/zstd for JSON and text responses, by Accept-Encoding.
+
+    Buffered bodies under ``forum.compression.min_size`` bytes are sent as
+    is; app_iter (streamed) responses are compressed chunk by chunk. A body
+    with an ETag is compressed once and then served from compressed_cache,
+    looked up by a digest of the body itself.
+    """
+    settings = registry.settings or {}
+    if not asbool(settings.get('forum.compression.enabled', True)):
+        return handler
+    min_size = int(settings.get('forum.compression.min_size', 1024))
+    max_cached = int(settings.get('forum.compression.cache_max_body', 1024 * 1024))
+    compressed_cache.maxsize = int(settings.get('forum.compression.cache_size', compressed_cache.maxsize))
+    available = available_encodings()
+
+    def compression_tween(request):
+        response = handler(request)
+        if response.status_code == 304:
+            if response.headers.get('ETag') and negotiate_encoding(request.headers.get('Accept-Encoding'), available):
+                _weaken_etag(response)
+            return response
+        content_type = response.content_type or ''
+        if (request.method == 'HEAD'
+                or response.status_code < 200 or response.status_code == 204
+                or 'Content-Encoding' in response.headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+                or 'no-transform' in (response.headers.get('Cache-Control') or '')):
+            return response
+
+        _add_vary(response, 'Accept-Encoding')
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'), available)
+        if encoding is None:
+            return response
+
+        if not isinstance(response.app_iter, (list, tuple)):
+            # streamed body: length unknown, compress as it is produced
+            inner = response.app_iter
+            # close() must reach the inner app_iter even if the generator never started
+            response.app_iter = ClosingIter(_compress_iter(inner, _Compressor(encoding, settings)),
+                                            getattr(inner, 'close', None))
+            response.content_length = None
+            response.content_encoding = encoding
+            _weaken_etag(response)
+            return response
+
+        body = response.body
+        if len(body) < min_size:
+            return response
+        etag = _weaken_etag(response)
+        # only validated (cacheable, so likely repeated) bodies are kept
+        key = (encoding, hashlib.sha1(body).digest()) if etag and response.status_code == 200 else None
+        compressed = compressed_cache.get(key) if key else None
+        if compressed is None:
+            compressor = _Compressor(encoding, settings)
+            compressed = compressor.compress(body) + compressor.finish()
+            if key and len(compressed) <= max_cached:
+                compressed_cache.set(key, compressed, time.time() + COMPRESSED_CACHE_TTL)
+        response.body = compressed
+        response.content_encoding = encoding
+        return response
+    return compression_tween
+
+
+def configure_jwt_cache(settings):
+    jwt_cache.maxsize = int(settings.get('forum.jwt_cache.size', jwt_cache.maxsize))
+    jwt_cache.clear()
+
+def decode_jwt(token):
+    """Verify ``token`` and return its payload, reusing earlier verifications."""
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    payload = jwt_cache.get(key)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    exp = payload.get('exp')
+    if isinstance(exp, (int, float)):
+        expires_at = exp
+    else:
+        expires_at = time.time() + JWT_CACHE_MAX_TTL
+    jwt_cache.set(key, payload, expires_at)
+    return payload
+
+def _bearer_token(request):
     auth = request.headers.get('Authorization')
     if not auth:
-        return False
+        return None
+    scheme, _, token = auth.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
+def jwt_claims(request):
+    """Decode the bearer token of ``request`` as a ``(payload, error)`` pair.
+
+    Registered as the reified ``request.jwt_claims`` property so the tweens
+    and the views share a single decode per request. Sub-requests of
+    /api/batch find their parent's result in the ``forum.jwt_claims``
+    environ key.
+    """
+    shared = request.environ.get('forum.jwt_claims')
+    if shared is not None:
+        return shared
+    token = _bearer_token(request)
+    if token is None:
+        return None, "Missing or invalid Authorization header"
+    try:
+        return decode_jwt(token), None
+    except jwt.ExpiredSignatureError:
+        return None, "Token expired"
+    except jwt.InvalidTokenError:
+        return None, "Invalid token"
+
+def _request_claims(request):
     try:
-        scheme, token = auth.split(' ', 1)
-        if scheme.lower() != 'bearer':
-            return False
-        jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        return True
-    except Exception:
-        return False
+        return request.jwt_claims
+    except AttributeError:
+        # Request built outside the app, without the request extensions
+        return jwt_claims(request)
+
+def matched_route_name(request):
+    """Name of the route ``request`` will match, usable from inside a tween.
+
+    Tweens run before the router sets ``request.matched_route``, so the
+    routes mapper is asked directly; the answer is kept in the environ so
+    the tweens after the first one do not match again.
+    """
+    route = getattr(request, 'matched_route', None)
+    if route is not None:
+        return route.name
+    environ = request.environ
+    if 'forum.route_name' not in environ:
+        mapper = request.registry.queryUtility(IRoutesMapper)
+        route = mapper(request)['route'] if mapper is not None else None
+        environ['forum.route_name'] = getattr(route, 'name', None)
+    return environ['forum.route_name']
+
+def is_authenticated(request):
+    payload, error = _request_claims(request)
+    return payload is not None
 
 def prevent_logged_in_user_tween_factory(handler, registry):
     def tween(request):
-        # get the matched route object (or None)
-        route = getattr(request, 'matched_route', None)
-        # extract its name
-        route_name = getattr(route, 'name', None)
+        # extract the name of the route this request is going to
+        route_name = matched_route_name(request)
 
         # if this is the login or signup route and user is already logged in…
         if route_name in ('login', 'signup') and is_authenticated(request):
@@ -48,18 +307,11 @@ def prevent_logged_in_user_tween_factory(handler, registry):
     return tween
 
 def get_user_id_from_jwt(request: Request):
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPUnauthorized("Missing or invalid Authorization header")
+    payload, error = _request_claims(request)
+    if payload is None:
+        raise HTTPUnauthorized(error)
 
-    token = auth_header.split(" ")[1]
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        user_id = payload.get("user_id")  # Ensure this field matches your JWT payload
-        if not user_id:
-            raise HTTPUnauthorized("Invalid token payload: user_id missing")
-        return user_id
-    except jwt.ExpiredSignatureError:
-        raise HTTPUnauthorized("Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPUnauthorized("Invalid token")
\ No newline at end of file
+    user_id = payload.get("user_id")  # Ensure this field matches your JWT payload
+    if not user_id:
+        raise HTTPUnauthorized("Invalid token payload: user_id missing")
+    return user_id
@@ -0,0 +1,75 @@
+# backend/forum/serializers.py
+from marshmallow import fields
+
+from .schemas.post import PostSchema
+from .schemas.topic import TopicSchema, TopicSummarySchema, TopicImportSchema
+from .schemas.user import UserSchema, UserSignupSchema, UserLoginSchema, UserUpdatePasswordSchema
+
+# Schemas hold no per-call state, so one instance per schema is shared by
+# every request instead of being rebuilt in each view.
+topic_schema = TopicSchema()
+post_schema = PostSchema()
+topic_import_schema = TopicImportSchema()
+user_schema = UserSchema()
+user_signup_schema = UserSignupSchema()
+user_login_schema = UserLoginSchema()
+user_update_password_schema = UserUpdatePasswordSchema()
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _identity(value):
+    return value
+
+
+# Field types whose dump is a plain attribute read (plus isoformat for dates)
+_CONVERTERS = {
+    fields.Int: _identity,
+    fields.Integer: _identity,
+    fields.Float: _identity,
+    fields.Str: _identity,
+    fields.String: _identity,
+    fields.Email: _identity,
+    fields.Bool: _identity,
+    fields.Boolean: _identity,
+    fields.DateTime: _isoformat,
+}
+
+
+class Dumper:
+    """Dumps objects (ORM rows, query rows, namedtuples) the way ``schema`` would.
+
+    The schema's dump fields are compiled once into (key, attribute,
+    converter) triples, skipping marshmallow's per-field machinery on the
+    hot listing paths. Schemas with other field types fall back to
+    ``schema.dump``.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._plan = []
+        for name, field in schema.dump_fields.items():
+            converter = _CONVERTERS.get(type(field))
+            if converter is None:
+                self._plan = None
+                break
+            self._plan.append((field.data_key or name, field.attribute or name, converter))
+
+    def dump(self, obj):
+        if self._plan is None:
+            return self.schema.dump(obj)
+        return {key: convert(getattr(obj, attr)) for key, attr, convert in self._plan}
+
+    def dump_many(self, objs):
+        if self._plan is None:
+            return self.schema.dump(objs, many=True)
+        plan = self._plan
+        return [{key: convert(getattr(obj, attr)) for key, attr, convert in plan} for obj in objs]
+
+
+topic_dumper = Dumper(topic_schema)
+topic_summary_dumper = Dumper(TopicSummarySchema())
+post_dumper = Dumper(post_schema)
+user_dumper = Dumper(user_schema)
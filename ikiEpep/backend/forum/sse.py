@@ -0,0 +1,265 @@
+# backend/forum/sse.py
+"""Server-Sent Events for /api/topics/stream.
+
+Waitress gives every request a worker thread until its body is sent, so
+a stream left open for minutes would pin a thread per client. With
+``forum.sse.port`` set, each process instead runs a small asyncio server
+in one background thread that holds every stream; the Pyramid route then
+only redirects there (``forum.sse.url`` is the public address, usually
+the same path behind the reverse proxy). Without it, the Pyramid route
+streams from the waitress thread itself and ends the response after
+``forum.sse.thread_seconds`` so the thread comes back; EventSource
+reconnects on its own and resumes with Last-Event-ID.
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from urllib.parse import parse_qs
+
+from . import events
+
+log = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/topics/stream'
+# Comment line sent on idle streams so proxies do not time them out
+HEARTBEAT_SECONDS = 15.0
+# Client reconnect delay, sent as the stream's ``retry`` field
+RETRY_MS = 3000
+MAX_HEADER_BYTES = 8192
+
+HEADERS = [
+    ('Content-Type', 'text/event-stream; charset=utf-8'),
+    # no-transform also keeps the compression tween away
+    ('Cache-Control', 'no-cache, no-transform'),
+    ('X-Accel-Buffering', 'no'),
+    ('Access-Control-Allow-Origin', '*'),
+]
+
+
+def format_event(event):
+    lines = ['id: %d' % event.id, 'event: %s' % event.type]
+    lines.extend('data: %s' % line for line in event.data.split('\n'))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def reset_event():
+    # The client was away longer than the ring buffer reaches: it has to
+    # reload the listing instead of applying events
+    return b'event: reset\ndata: {}\n\n'
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _preamble(backlog, complete):
+    chunks = [b'retry: %d\n\n' % RETRY_MS]
+    if not complete:
+        chunks.append(reset_event())
+    chunks.extend(format_event(event) for event in backlog)
+    return b''.join(chunks)
+
+
+class _ThreadStreams:
+    """How many waitress threads the fallback streams hold right now."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, cap):
+        with self._lock:
+            if self.count >= cap:
+                return False
+            self.count += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.count -= 1
+
+
+thread_streams = _ThreadStreams()
+
+
+def busy_stream(retry_ms):
+    # A 503 would make EventSource give up for good; an empty stream with
+    # a longer ``retry`` has it come back later instead
+    yield b'retry: %d\n\n' % retry_ms
+
+
+def thread_stream(last_event_id, max_seconds):
+    """The fallback: a generator for a waitress app_iter, ending after
+    ``max_seconds``."""
+    wakeup = threading.Event()
+    subscriber, backlog, complete = events.subscribe(wakeup.set, last_event_id)
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield _preamble(backlog, complete)
+        while not subscriber.dropped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not wakeup.wait(min(HEARTBEAT_SECONDS, remaining)):
+                yield b': ping\n\n'
+                continue
+            wakeup.clear()
+            pending = subscriber.drain()
+            if pending:
+                yield b''.join(format_event(event) for event in pending)
+    finally:
+        events.hub.unsubscribe(subscriber)
+
+
+class SSEServer:
+    """An asyncio HTTP server that only answers GET /api/topics/stream."""
+
+    def __init__(self, host='0.0.0.0', port=6544, max_streams=10000):
+        self.host = host
+        self.port = port
+        self.max_streams = max_streams
+        self.streams = 0
+        self.loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start the server thread in this process (again after a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.streams = 0
+            threading.Thread(target=self._run, name='sse', daemon=True).start()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            # every forum_serve worker binds the port, the kernel balances
+            server = self.loop.run_until_complete(asyncio.start_server(
+                self._handle, self.host, self.port,
+                reuse_port=hasattr(socket, 'SO_REUSEPORT'), backlog=1024,
+            ))
+        except OSError:
+            log.exception("SSE server could not listen on %s:%d", self.host, self.port)
+            return
+        log.info("SSE server %d listening on %s:%d", os.getpid(), self.host, self.port)
+        self.loop.run_forever()
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                return
+            if len(head) > MAX_HEADER_BYTES:
+                return
+            request_line, _, header_block = head.decode('latin-1').partition('\r\n')
+            parts = request_line.split()
+            headers = {}
+            for line in header_block.split('\r\n'):
+                name, sep, value = line.partition(':')
+                if sep:
+                    headers[name.strip().lower()] = value.strip()
+
+            path, _, query = parts[1].partition('?') if len(parts) == 3 else ('', '', '')
+            if path != STREAM_PATH:
+                writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                return
+            if parts[0] == 'OPTIONS':
+                writer.write(b'HTTP/1.1 204 No Content\r\nAccess-Control-Allow-Origin: *\r\n'
+                             b'Access-Control-Allow-Headers: Last-Event-ID, Cache-Control\r\n'
+                             b'Connection: close\r\n\r\n')
+                return
+            if parts[0] != 'GET':
+                writer.write(b'HTTP/1.1 405 Method Not Allowed\r\nAllow: GET\r\nContent-Length: 0\r\n'
+                             b'Connection: close\r\n\r\n')
+                return
+            if self.streams >= self.max_streams:
+                writer.write(b'HTTP/1.1 503 Service Unavailable\r\nRetry-After: 5\r\nContent-Length: 0\r\n'
+                             b'Connection: close\r\n\r\n')
+                return
+            # the query parameter is set by the redirect from the Pyramid route
+            last_event_id = headers.get('last-event-id') or parse_qs(query).get('last_event_id', [None])[0]
+            await self._stream(writer, parse_last_event_id(last_event_id))
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        except Exception:
+            log.exception("SSE stream failed")
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _stream(self, writer, last_event_id):
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        subscriber, backlog, complete = events.subscribe(
+            lambda: loop.call_soon_threadsafe(wakeup.set), last_event_id)
+        self.streams += 1
+        try:
+            head = ['HTTP/1.1 200 OK'] + ['%s: %s' % header for header in HEADERS] + ['Connection: close']
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+            writer.write(_preamble(backlog, complete))
+            await asyncio.wait_for(writer.drain(), HEARTBEAT_SECONDS)
+            while not subscriber.dropped:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b': ping\n\n')
+                else:
+                    wakeup.clear()
+                    pending = subscriber.drain()
+                    if pending:
+                        writer.write(b''.join(format_event(event) for event in pending))
+                # a client that cannot take a heartbeat's worth in time is gone
+                await asyncio.wait_for(writer.drain(), HEARTBEAT_SECONDS)
+        finally:
+            self.streams -= 1
+            events.hub.unsubscribe(subscriber)
+
+    def metric_lines(self):
+        return ['forum_sse_streams %d' % self.streams] if self._pid == os.getpid() else []
+
+
+# The listener of this process, when forum.sse.port is set
+server = None
+# Fallback streams: short, and only a few at once, so that a handful of
+# open tabs cannot take every waitress thread
+THREAD_SECONDS = 5.0
+MAX_THREAD_STREAMS = 1
+PUBLIC_URL = None
+
+
+def configure_sse(settings):
+    global server, THREAD_SECONDS, MAX_THREAD_STREAMS, PUBLIC_URL, HEARTBEAT_SECONDS
+    HEARTBEAT_SECONDS = float(settings.get('forum.sse.heartbeat_seconds', HEARTBEAT_SECONDS))
+    THREAD_SECONDS = float(settings.get('forum.sse.thread_seconds', THREAD_SECONDS))
+    MAX_THREAD_STREAMS = int(settings.get('forum.sse.max_thread_streams', MAX_THREAD_STREAMS))
+    port = settings.get('forum.sse.port')
+    server = None
+    if port:
+        server = SSEServer(
+            host=settings.get('forum.sse.host', '0.0.0.0'),
+            port=int(port),
+            max_streams=int(settings.get('forum.sse.max_streams', 10000)),
+        )
+        PUBLIC_URL = settings.get('forum.sse.url') or None
+    return server
+
+
+def ensure_started(event=None):
+    """NewRequest subscriber: the first request of every process starts
+    its listener, after forum_serve forked it."""
+    if server is not None:
+        server.ensure_started()
@@ -0,0 +1,41 @@
+# backend/forum/streaming.py
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ClosingIter:
+    """An ``app_iter`` that calls ``on_close`` once the server closes it.
+
+    WSGI servers call ``close()`` on the app_iter after sending (or
+    abandoning) the body, even when iteration never started, which a
+    generator's ``finally`` does not cover.
+    """
+
+    def __init__(self, app_iter, on_close):
+        self.app_iter = app_iter
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self.app_iter)
+
+    def close(self):
+        try:
+            close = getattr(self.app_iter, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+
+
+def stream_rows(engine, stmt, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield the rows of ``stmt`` through a server-side cursor.
+
+    Runs on its own connection so it can be consumed from a response's
+    ``app_iter``, after pyramid_tm has already finished the request
+    transaction. Only ``batch_size`` rows are held in memory at a time.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(stmt)
+        for partition in result.yield_per(batch_size).partitions():
+            yield from partition
@@ -0,0 +1,187 @@
+# backend/forum/trending.py
+"""Trending topics: exponentially decayed activity, kept in log space.
+
+An event of weight ``w`` at time ``t`` contributes ``w * 2^(-age/half_life)``
+to a topic's hotness. Dividing every term by the same growing factor does
+not change the order, so each event is stored as the time-independent
+
+    log(w) + (t - EPOCH) / tau        (tau = half_life / ln 2)
+
+and a topic's score is the log-sum-exp of its events. New events are
+folded in with ``logaddexp``, old scores never need rewriting, and
+``ORDER BY score DESC`` on the indexed column is the hot list.
+"""
+import logging
+import math
+from datetime import datetime
+
+from sqlalchemy import DateTime, Float, Integer, bindparam, column, func, literal, select, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .models.meta import DBSession
+from .models.topic import Topic
+from .models.topic_score import TopicScore
+from .writebehind import WriteBehindBuffer
+
+log = logging.getLogger(__name__)
+
+# Scores are relative to this instant so they stay small numbers
+EPOCH = datetime(2024, 1, 1)
+HALF_LIFE_HOURS = 24.0
+# Event weights, must be positive (0 turns an event kind off)
+WEIGHTS = {'create': 1.0, 'edit': 0.5, 'reply': 2.0, 'view': 0.1}
+# Compaction drops scores whose current weight fell below this
+PRUNE_BELOW = 0.001
+
+# Pending event scores per topic id, written by a background thread
+buffer = None
+
+
+def _tau():
+    return HALF_LIFE_HOURS * 3600 / math.log(2)
+
+
+def event_score(weight, at=None):
+    """The score of one event of ``weight`` at ``at`` (default: now)."""
+    at = at or datetime.utcnow()
+    return math.log(weight) + (at - EPOCH).total_seconds() / _tau()
+
+
+def logaddexp(a, b):
+    """log(e^a + e^b) without overflowing."""
+    hi, lo = (a, b) if a >= b else (b, a)
+    return hi + math.log1p(math.exp(lo - hi))
+
+
+def hotness(score, now=None):
+    """The decayed activity behind ``score`` as of ``now``."""
+    return math.exp(score - event_score(1.0, now))
+
+
+def configure_trending(settings, engine):
+    global HALF_LIFE_HOURS, PRUNE_BELOW, buffer
+    HALF_LIFE_HOURS = float(settings.get('forum.trending.half_life_hours', HALF_LIFE_HOURS))
+    PRUNE_BELOW = float(settings.get('forum.trending.prune_below', PRUNE_BELOW))
+    for kind in WEIGHTS:
+        WEIGHTS[kind] = float(settings.get('forum.trending.weight.' + kind, WEIGHTS[kind]))
+    buffer = WriteBehindBuffer(
+        'trending',
+        lambda batch: apply_scores(engine, batch),
+        combine=logaddexp,
+        interval=float(settings.get('forum.trending.flush_interval', 10)),
+        max_keys=int(settings.get('forum.trending.max_pending', 10000)),
+    )
+    return buffer
+
+
+def record(topic_id, kind, at=None):
+    """Count one ``kind`` event of the topic; written out by the buffer."""
+    weight = WEIGHTS[kind]
+    if buffer is not None and weight > 0:
+        buffer.add(topic_id, event_score(weight, at))
+
+
+def record_create(topic):
+    """Score row of a new topic, added to the request's transaction."""
+    if WEIGHTS['create'] > 0:
+        DBSession.add(TopicScore(topic_id=topic.id, score=event_score(WEIGHTS['create'], topic.created_at)))
+
+
+def apply_scores(engine, batch):
+    """Fold ``{topic_id: event score}`` into topic_scores.
+
+    On Postgres this is one INSERT ... ON CONFLICT over a VALUES list, with
+    the log-sum-exp done in SQL so concurrent processes never lose
+    updates. Elsewhere the rows are read, combined and written back.
+    Topics deleted in the meantime are skipped.
+    """
+    scores = TopicScore.__table__
+    topics = Topic.__table__
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            incoming = values(
+                column('topic_id', Integer), column('score', Float), name='incoming'
+            ).data(list(batch.items()))
+            stmt = pg_insert(scores).from_select(
+                ['topic_id', 'score', 'updated_at'],
+                select(incoming.c.topic_id, incoming.c.score, literal(now, DateTime))
+                .join(topics, topics.c.id == incoming.c.topic_id),
+            )
+            old, new = scores.c.score, stmt.excluded.score
+            # exp() of float8 raises on underflow, hence the floor
+            stmt = stmt.on_conflict_do_update(index_elements=[scores.c.topic_id], set_={
+                'score': func.greatest(old, new)
+                + func.ln(1 + func.exp(func.greatest(-func.abs(old - new), -50))),
+                'updated_at': stmt.excluded.updated_at,
+            })
+            conn.execute(stmt)
+            return
+
+        ids = list(batch)
+        current = dict(conn.execute(
+            select(scores.c.topic_id, scores.c.score).where(scores.c.topic_id.in_(ids))
+        ).all())
+        alive = set(conn.execute(select(topics.c.id).where(topics.c.id.in_(ids))).scalars())
+        updates = [
+            {'key': topic_id, 'new_score': logaddexp(current[topic_id], score), 'now': now}
+            for topic_id, score in batch.items() if topic_id in current
+        ]
+        inserts = [
+            {'topic_id': topic_id, 'score': score, 'updated_at': now}
+            for topic_id, score in batch.items() if topic_id not in current and topic_id in alive
+        ]
+        if updates:
+            conn.execute(
+                scores.update().where(scores.c.topic_id == bindparam('key'))
+                .values(score=bindparam('new_score'), updated_at=bindparam('now')),
+                updates,
+            )
+        if inserts:
+            conn.execute(scores.insert(), inserts)
+
+
+def compact(engine, now=None):
+    """Drop the scores too cold to reach the hot list again; new activity
+    re-creates them. Keeps the table and its index small."""
+    cutoff = event_score(PRUNE_BELOW, now)
+    with engine.begin() as conn:
+        return conn.execute(TopicScore.__table__.delete().where(TopicScore.score < cutoff)).rowcount
+
+
+def rebuild(engine, missing_only=True, batch_size=1000):
+    """Score topics from their creation time and replies.
+
+    With ``missing_only`` only topics without a score are done (bulk
+    imports, topics from before the table existed); otherwise every score
+    is recomputed, dropping the accumulated edit and view events.
+    """
+    topics, scores = Topic.__table__, TopicScore.__table__
+    stmt = select(topics.c.id, topics.c.created_at, topics.c.reply_count, topics.c.last_activity_at)
+    if missing_only:
+        stmt = stmt.outerjoin(scores, scores.c.topic_id == topics.c.id).where(scores.c.topic_id.is_(None))
+    else:
+        with engine.begin() as conn:
+            conn.execute(scores.delete())
+
+    # Keyset batches rather than one long cursor: the writes in between
+    # must not wait on an open read (SQLite)
+    done, last_id = 0, 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                stmt.where(topics.c.id > last_id).order_by(topics.c.id).limit(batch_size)
+            ).all()
+        if not rows:
+            return done
+        batch = {}
+        for row in rows:
+            created = row.created_at or datetime.utcnow()
+            score = event_score(WEIGHTS['create'] or 1.0, created)
+            if row.reply_count and WEIGHTS['reply'] > 0:
+                score = logaddexp(score, event_score(WEIGHTS['reply'] * row.reply_count,
+                                                     row.last_activity_at or created))
+            batch[row.id] = score
+        apply_scores(engine, batch)
+        done += len(batch)
+        last_id = rows[-1].id
@@ -0,0 +1,138 @@
+# backend/forum/views/batch.py
+import json
+import logging
+
+from pyramid.httpexceptions import HTTPBadRequest, HTTPException
+from pyramid.request import Request
+from pyramid.view import view_config
+
+from ..security import matched_route_name
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_REQUESTS = 20
+# Sub-response headers worth passing back
+RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Location', 'Retry-After')
+# Sub-request headers taken from the batch entry
+REQUEST_HEADERS = ('If-None-Match', 'If-Modified-Since', 'Accept')
+# Routes a batch refuses, with the reason
+UNBATCHED_ROUTES = {
+    # commits every few hundred lines itself, outside the batch's transaction
+    'import_topics': 'Imports cannot be batched',
+    # never ends; not something a batch can wait for
+    'topics_stream': 'Streams cannot be batched',
+}
+
+
+def _error(message):
+    return HTTPBadRequest(json_body={'error': message})
+
+
+def _subrequest(request, entry):
+    method = str(entry.get('method', 'GET')).upper()
+    path = entry.get('path')
+    if not isinstance(path, str) or not path.startswith('/api/') or path.startswith('/api/batch'):
+        raise ValueError("path must be an /api/ URL other than /api/batch")
+
+    sub = Request.blank(path, method=method, base_url=request.host_url)
+    sub.registry = request.registry
+    sub.remote_addr = request.remote_addr
+    for name in ('Authorization', 'X-Forwarded-For'):
+        if name in request.headers:
+            sub.headers[name] = request.headers[name]
+    for name, value in (entry.get('headers') or {}).items():
+        if name in REQUEST_HEADERS:
+            sub.headers[name] = str(value)
+    if 'body' in entry:
+        sub.body = json.dumps(entry['body']).encode('utf-8')
+        sub.content_type = 'application/json'
+    # One JWT decode for the whole batch (see security.jwt_claims)
+    sub.environ['forum.jwt_claims'] = request.jwt_claims
+    return sub
+
+
+def _result(response):
+    body = response.body
+    if response.content_type == 'application/json' and body:
+        body = json.loads(body)
+    else:
+        body = body.decode(response.charset or 'utf-8') if body else None
+    headers = {name: response.headers[name] for name in RESPONSE_HEADERS if name in response.headers}
+    return {'status': response.status_code, 'headers': headers, 'body': body}
+
+
+@view_config(route_name='batch', renderer='json', request_method='POST')
+def batch(request):
+    """Run ``{"requests": [{"method", "path", "body", "headers"}, ...]}`` in
+    one round trip.
+
+    The sub-requests go through the router without the tweens, in this
+    request's transaction and with its decoded JWT. With ``"atomic": true``
+    the transaction is rolled back if any of them fails. A sub-request that
+    raises stops the batch; the ones after it are answered with 424.
+    Imports and the event stream are refused (see UNBATCHED_ROUTES); the
+    unpaginated listing streams from its own connection, so it does not
+    see the batch's earlier writes.
+    """
+    try:
+        data = request.json_body
+        entries = data['requests']
+    except (ValueError, KeyError, TypeError):
+        return _error('Expected {"requests": [...]}')
+    limit = int(request.registry.settings.get('forum.batch.max_requests', DEFAULT_MAX_REQUESTS))
+    if not isinstance(entries, list) or not entries or len(entries) > limit:
+        return _error('Pass between 1 and %d requests' % limit)
+    atomic = bool(data.get('atomic'))
+    # Sub-requests skip the tweens, so the per-route rate limits and
+    # in-flight caps are applied here, to each of them
+    limiter = getattr(request.registry, 'ratelimiter', None)
+
+    results, failed = [], False
+    for entry in entries:
+        if failed:
+            results.append({'status': 424, 'headers': {}, 'body': {'error': 'Not run, an earlier request failed'}})
+            continue
+        try:
+            sub = _subrequest(request, entry if isinstance(entry, dict) else {})
+        except ValueError as err:
+            results.append({'status': 400, 'headers': {}, 'body': {'error': str(err)}})
+            continue
+        route = matched_route_name(sub)
+        if route in UNBATCHED_ROUTES:
+            results.append({'status': 400, 'headers': {}, 'body': {'error': UNBATCHED_ROUTES[route]}})
+            continue
+        release = None
+        if limiter is not None and route is not None:
+            rejection, release = limiter.admit(route, request)
+            if rejection is not None:
+                result = _result(rejection)
+                if atomic:
+                    request.tm.doom()
+                    failed = True
+                results.append(result)
+                continue
+        try:
+            try:
+                response = request.invoke_subrequest(sub, use_tweens=False)
+            except HTTPException as exc:
+                response = exc
+            # a streamed body (json_stream) runs its query while it is read,
+            # so the in-flight slot is held until then
+            result = _result(response)
+        except Exception:
+            # the session may be unusable now, so nothing after this runs
+            # and nothing of the batch is committed
+            log.exception("batch sub-request %s %s failed", sub.method, sub.path)
+            request.tm.doom()
+            failed = True
+            results.append({'status': 500, 'headers': {}, 'body': {'error': 'Internal error'}})
+            continue
+        finally:
+            if release is not None:
+                release()
+        if atomic and result['status'] >= 400:
+            request.tm.doom()
+            failed = True
+        results.append(result)
+
+    return {'responses': results}
@@ -0,0 +1,158 @@
+# backend/forum/views/bulk.py
+import json
+import logging
+from datetime import datetime
+
+from marshmallow import ValidationError
+from pyramid.httpexceptions import HTTPForbidden
+from pyramid.response import Response
+from pyramid.view import view_config
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..cache import invalidate
+from ..identity import is_admin
+from ..models.meta import DBSession
+from ..models.topic import Topic
+from ..models.user import User
+from ..renderers import json_dumps
+from ..search import reindex_topics
+from ..serializers import topic_dumper, topic_import_schema
+from ..streaming import stream_rows
+
+log = logging.getLogger(__name__)
+
+NDJSON = 'application/x-ndjson'
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+
+
+def _export_lines(rows):
+    # Write roughly one batch of rows per chunk instead of one tiny write per row
+    chunk = []
+    try:
+        for row in rows:
+            chunk.append(json_dumps(topic_dumper.dump(row)))
+            if len(chunk) >= EXPORT_BATCH_SIZE:
+                yield b'\n'.join(chunk) + b'\n'
+                chunk = []
+        if chunk:
+            yield b'\n'.join(chunk) + b'\n'
+    finally:
+        rows.close()
+
+
+@view_config(route_name='export_topics', request_method='GET')
+def export_topics(request):
+    if not is_admin(request):
+        return HTTPForbidden(json_body={'error': 'Admin only'})
+
+    stmt = select(
+        Topic.id, Topic.title, Topic.content, Topic.username,
+        Topic.reply_count, Topic.views, Topic.last_activity_at, Topic.created_at, Topic.updated_at
+    ).order_by(Topic.id)
+    response = Response(content_type=NDJSON, charset='utf-8')
+    response.app_iter = _export_lines(stream_rows(request.registry.db_engine, stmt, EXPORT_BATCH_SIZE))
+    return response
+
+
+def _insert_batch(batch):
+    # Link rows to their authors and refresh those users' topic counters
+    usernames = {row['username'] for row in batch}
+    user_ids = dict(DBSession.query(User.username, User.id).filter(User.username.in_(usernames)))
+    for row in batch:
+        row['user_id'] = user_ids.get(row['username'])
+
+    # Core inserts skip the flush hooks of the search index; the new rows
+    # are the ids after the current maximum
+    last_id = DBSession.query(func.max(Topic.id)).scalar() or 0
+    DBSession.execute(insert(Topic.__table__), batch)
+    reindex_topics(Topic.id > last_id)
+    invalidate('table:topics')
+
+    if user_ids:
+        DBSession.query(User).filter(User.id.in_(list(user_ids.values()))).update({
+            User.topic_count: select(func.count(Topic.id))
+                .where(Topic.user_id == User.id).scalar_subquery(),
+            User.last_posted_at: select(func.max(Topic.created_at))
+                .where(Topic.user_id == User.id).scalar_subquery(),
+        }, synchronize_session=False)
+
+
+def _commit_batch(tm, batch, first_line, last_line):
+    """Insert ``batch`` in a transaction of its own; an error line if the
+    database rejected it (nothing of it is written then)."""
+    try:
+        with tm:
+            _insert_batch(batch)
+    except SQLAlchemyError:
+        log.exception("import batch of lines %d-%d failed", first_line, last_line)
+        return {'lines': [first_line, last_line], 'errors': 'Rejected by the database'}
+    return None
+
+
+def _import_lines(request):
+    """The import itself, run as the response's ``app_iter``: lines are read
+    as they arrive, every ``IMPORT_BATCH_SIZE`` valid rows are committed,
+    and bad lines are reported as soon as they are seen."""
+    inserted, failed, batch, first_line = 0, 0, [], None
+    lineno = 0
+    for lineno, line in enumerate(request.body_file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = topic_import_schema.load(json.loads(line))
+        except ValidationError as err:
+            failed += 1
+            yield _ndjson({'line': lineno, 'errors': err.messages})
+            continue
+        except ValueError:
+            failed += 1
+            yield _ndjson({'line': lineno, 'errors': 'Invalid JSON'})
+            continue
+
+        # executemany needs the same keys on every row
+        now = datetime.utcnow()
+        row.setdefault('created_at', now)
+        row.setdefault('updated_at', row['created_at'])
+        batch.append(row)
+        first_line = first_line or lineno
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            error = _commit_batch(request.tm, batch, first_line, lineno)
+            if error is None:
+                inserted += len(batch)
+            else:
+                failed += len(batch)
+                yield _ndjson(error)
+            batch, first_line = [], None
+
+    if batch:
+        error = _commit_batch(request.tm, batch, first_line, lineno)
+        if error is None:
+            inserted += len(batch)
+        else:
+            failed += len(batch)
+            yield _ndjson(error)
+    yield _ndjson({'inserted': inserted, 'failed': failed})
+
+
+def _ndjson(value):
+    return json_dumps(value) + b'\n'
+
+
+@view_config(route_name='import_topics', request_method='POST')
+def import_topics(request):
+    """NDJSON in, NDJSON report out.
+
+    Not all-or-nothing: each batch of ``IMPORT_BATCH_SIZE`` rows commits on
+    its own, after the request's transaction, while the body is still being
+    read. A batch the database rejects is reported with its line range and
+    the import goes on; the last line holds the totals.
+    """
+    if not is_admin(request):
+        return HTTPForbidden(json_body={'error': 'Admin only'})
+
+    response = Response(status=200, content_type=NDJSON, charset='utf-8')
+    response.app_iter = _import_lines(request)
+    return response
@@ -0,0 +1,33 @@
+# backend/forum/views/debug.py
+from pyramid.response import Response
+from pyramid.view import view_config
+
+from ..db import pool_status
+from ..metrics import PROMETHEUS_CONTENT_TYPE, metrics
+from ..security import jwt_cache
+
+
+@view_config(route_name='debug_jwt_cache', renderer='json', request_method='GET')
+def debug_jwt_cache_view(request):
+    return jwt_cache.stats()
+
+
+@view_config(route_name='debug_pool', renderer='json', request_method='GET')
+def debug_pool_view(request):
+    status = pool_status(request.registry.db_engine)
+    replicas = request.registry.replicas
+    if replicas is not None:
+        status['replicas'] = [
+            dict(replica, **pool_status(engine))
+            for replica, engine in zip(replicas.status(), replicas.engines)
+        ]
+    return status
+
+
+@view_config(route_name='metrics', request_method='GET')
+def metrics_view(request):
+    return Response(
+        body=metrics.render_prometheus(),
+        content_type=PROMETHEUS_CONTENT_TYPE,
+        charset='utf-8'
+    )
@@ -0,0 +1,134 @@
+# backend/forum/views/post.py
+import json
+from datetime import datetime
+
+from marshmallow import ValidationError
+from pyramid.httpexceptions import HTTPBadRequest, HTTPNotFound, HTTPUnauthorized
+from pyramid.response import Response
+from pyramid.view import view_config
+
+from ..cache import invalidate
+from ..models.meta import DBSession
+from ..models.post import MAX_DEPTH, PATH_SEPARATOR, Post
+from ..models.topic import Topic
+from ..pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+from ..serializers import post_dumper, post_schema
+from .. import trending
+
+
+def _topic_id(request):
+    try:
+        return int(request.matchdict.get('topic_id'))
+    except ValueError:
+        raise HTTPNotFound(json_body={'error': 'Topic not found'})
+
+
+@view_config(route_name='create_post', renderer='json', request_method='POST')
+def create_post(request):
+    topic_id = _topic_id(request)
+    user = request.user
+    if not user:
+        return HTTPUnauthorized(json_body={'error': 'User not found'})
+
+    try:
+        data = post_schema.load(request.json_body)
+    except ValidationError as err:
+        return Response(
+            body=json.dumps({'errors': err.messages}),
+            status=400,
+            content_type='application/json',
+            charset='utf-8'
+        )
+
+    # Validate everything before the first write: a returned error
+    # response still lets pyramid_tm commit the transaction.
+    parent = None
+    parent_id = data.get('parent_id')
+    if parent_id is not None:
+        parent = DBSession.query(Post.id, Post.path, Post.depth).filter(
+            Post.id == parent_id, Post.topic_id == topic_id
+        ).first()
+        if not parent:
+            return HTTPBadRequest(json_body={'errors': {'parent_id': ['Reply not found in this topic.']}})
+        if parent.depth + 1 >= MAX_DEPTH:
+            return HTTPBadRequest(json_body={'errors': {'parent_id': ['Thread is nested too deeply.']}})
+
+    now = datetime.utcnow()
+    # Bumping the counters doubles as the existence check for the topic
+    updated = DBSession.query(Topic).filter(Topic.id == topic_id).update({
+        Topic.reply_count: Topic.reply_count + 1,
+        Topic.last_activity_at: now,
+    }, synchronize_session=False)
+    if not updated:
+        return HTTPNotFound(json_body={'error': 'Topic not found'})
+    # The owner's topic pages show the reply count as well
+    owner_id = DBSession.query(Topic.user_id).filter(Topic.id == topic_id).scalar()
+    if owner_id is not None:
+        invalidate('user-topics:%d' % owner_id)
+    if parent:
+        DBSession.query(Post).filter(Post.id == parent.id).update(
+            {Post.reply_count: Post.reply_count + 1}, synchronize_session=False
+        )
+
+    post = Post(
+        topic_id=topic_id,
+        parent_id=parent_id,
+        user_id=user.id,
+        username=user.username,
+        content=data['content'],
+        depth=parent.depth + 1 if parent else 0,
+        created_at=now,
+    )
+    DBSession.add(post)
+    DBSession.flush()  # the path is built from the new id
+    segment = Post.path_segment(post.id)
+    post.path = parent.path + PATH_SEPARATOR + segment if parent else segment
+    DBSession.flush()
+    trending.record(topic_id, 'reply', now)
+
+    request.response.status = 201
+    return post_dumper.dump(post)
+
+
+@view_config(route_name='get_posts', renderer='json', request_method='GET')
+def get_posts(request):
+    """One page of a thread, by path.
+
+    By default the top-level replies are returned, each with its
+    ``reply_count``; ``?parent_id=`` expands one reply's direct answers and
+    ``?flat=1`` walks the whole thread depth-first. Every variant is an
+    index range scan, so the cost does not depend on the thread size.
+    """
+    topic_id = _topic_id(request)
+    try:
+        limit = parse_limit(request.params.get('limit'))
+        cursor = request.params.get('cursor')
+        after = decode_cursor(cursor, str)[0] if cursor else None
+        parent_id = request.params.get('parent_id')
+        parent_id = int(parent_id) if parent_id else None
+    except (InvalidCursor, ValueError):
+        return HTTPBadRequest(json_body={'error': 'Invalid limit, cursor or parent_id'})
+
+    query = DBSession.query(
+        Post.id, Post.topic_id, Post.parent_id, Post.username, Post.content,
+        Post.depth, Post.reply_count, Post.created_at, Post.updated_at, Post.path,
+    )
+    if parent_id is not None:
+        query = query.filter(Post.parent_id == parent_id, Post.topic_id == topic_id)
+    elif request.params.get('flat') in ('1', 'true'):
+        query = query.filter(Post.topic_id == topic_id)
+    else:
+        query = query.filter(Post.topic_id == topic_id, Post.depth == 0)
+    if after:
+        query = query.filter(Post.path > after)
+    rows = query.order_by(Post.path).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].path)
+
+    return {
+        'posts': post_dumper.dump_many(rows),
+        'next_cursor': next_cursor,
+    }
@@ -0,0 +1,86 @@
+# backend/forum/views/revision.py
+from pyramid.httpexceptions import HTTPBadRequest, HTTPNotFound
+from pyramid.view import view_config
+
+from ..httpcache import is_not_modified, make_etag, not_modified, set_validators
+from ..pagination import InvalidCursor, parse_limit
+from ..revisions import RevisionNotFound, get_revision, list_revisions
+
+
+def _int_param(request, name):
+    try:
+        return int(request.matchdict.get(name))
+    except ValueError:
+        raise HTTPNotFound(json_body={'error': 'Revision not found'})
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+@view_config(route_name='topic_revisions', renderer='json', request_method='GET')
+def topic_revisions(request):
+    """A topic's revisions, newest first, without their content.
+
+    ``?before=<number>`` continues from ``next_before``.
+    """
+    topic_id = _int_param(request, 'topic_id')
+    try:
+        limit = parse_limit(request.params.get('limit'))
+        before = request.params.get('before')
+        before = int(before) if before else None
+    except (InvalidCursor, ValueError):
+        return HTTPBadRequest(json_body={'error': 'Invalid limit or before'})
+
+    rows = list_revisions(topic_id, limit + 1, before)
+    next_before = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_before = rows[-1].number
+
+    return {
+        'revisions': [{
+            'number': row.number,
+            'title': row.title,
+            'user_id': row.user_id,
+            'created_at': _isoformat(row.created_at),
+            'snapshot': row.snapshot,
+        } for row in rows],
+        'next_before': next_before,
+    }
+
+
+@view_config(route_name='topic_revision', renderer='json', request_method='GET')
+def topic_revision(request):
+    """One revision, rebuilt from its nearest snapshot.
+
+    Revisions never change, so the rebuilt payload is cached until the
+    topic itself changes or goes away.
+    """
+    topic_id = _int_param(request, 'topic_id')
+    number = _int_param(request, 'number')
+
+    def load():
+        try:
+            revision, content = get_revision(topic_id, number)
+        except RevisionNotFound:
+            return None
+        return {
+            'topic_id': topic_id,
+            'number': revision.number,
+            'title': revision.title,
+            'content': content,
+            'user_id': revision.user_id,
+            'created_at': _isoformat(revision.created_at),
+        }
+
+    payload = request.cache.get_or_create(
+        'revision:%d:%d' % (topic_id, number), load, tags=('topic:%d' % topic_id,))
+    if payload is None:
+        return HTTPNotFound(json_body={'error': 'Revision not found'})
+    # A revision never changes, its number is validator enough
+    etag = make_etag('revision', topic_id, number)
+    if is_not_modified(request, etag):
+        return not_modified(request, etag)
+    set_validators(request, request.response, etag)
+    return payload
@@ -1,44 +1,68 @@
 # backend/ecommerce/views/topic.py
 import json
+import logging
 from ..models.user import User
 from pyramid.view import view_config
 from pyramid.response import Response
 from ..models.meta import DBSession
 from ..models.topic import Topic
-from ..schemas.topic import TopicSchema
+from ..serializers import topic_dumper, topic_schema, topic_summary_dumper
 from marshmallow import ValidationError
-from pyramid.httpexceptions import HTTPUnauthorized, HTTPForbidden, HTTPNotFound, HTTPNoContent
+from pyramid.httpexceptions import HTTPUnauthorized, HTTPForbidden, HTTPNotFound, HTTPNoContent, HTTPTemporaryRedirect
 from ..security import get_user_id_from_jwt
-from sqlalchemy import cast, String
+from ..cache import cached_view, invalidate
+from ..httpcache import is_not_modified, make_etag, not_modified, set_validators
+from ..db import routed_engine
+from ..renderers import JSONStream
+from ..search import search_topics
+from ..streaming import ClosingIter, stream_rows
+from .. import counters, events, revisions, sse, trending
+from ..models.topic_score import TopicScore
+from ..pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+from sqlalchemy import cast, String, and_, func, or_, select
 from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+
+EXCERPT_LENGTH = 200
+# Seconds a trending page is served from the cache; scores move with the
+# write-behind flushes, which do not invalidate it
+TRENDING_TTL = 10
+
+log = logging.getLogger(__name__)
 
 @view_config(route_name='create_topic', renderer='json', request_method='POST')
 def create_topic(request):
-    try:
-        # Debug: Check if the request data is received correctly
-        print("Received data:", request.json_body)
+    # Outside the try: a bad token is a 401, not an error adding the topic
+    user = request.user
+    if not user:
+        return HTTPUnauthorized(json_body={'error': 'User not authenticated'})
 
+    try:
         # Parse and validate the data with Marshmallow
         data = request.json_body
-        topic_data = TopicSchema().load(data)  # Deserialize and validate data
-        
-        user_id = get_user_id_from_jwt(request)
-        user = DBSession.query(User).get(user_id)
-        if not user:
-            return HTTPUnauthorized(json_body={'error': 'User not authenticated'})
-        
-        topic_data['seller'] = user.username
+        topic_data = topic_schema.load(data)  # Deserialize and validate data
+
+        topic_data['username'] = user.username
+        topic_data['user_id'] = user.id
         # Create a new topic object and save to DB
         topic = Topic(**topic_data)
         DBSession.add(topic)
         DBSession.flush()  # Save topic and get its ID
-        print(f"Topic {topic.name} added successfully with ID {topic.id}")
+        DBSession.query(User).filter(User.id == user.id).update({
+            User.topic_count: User.topic_count + 1,
+            User.last_posted_at: topic.created_at,
+        }, synchronize_session=False)
+        invalidate('user:%d' % user.id)
+        trending.record_create(topic)
+        revisions.record_create(topic)
 
         # Return the serialized topic data
-        return TopicSchema().dump(topic)
+        payload = topic_dumper.dump(topic)
+        events.publish_after_commit(request, 'topic.created', payload)
+        return payload
     except ValidationError as err:
-        # If validation fails, print the errors and return them to the frontend
-        print("Validation error:", err.messages)
+        # If validation fails, return the errors to the frontend
+        log.debug('Topic rejected: %s', err.messages)
         return Response(
             body=json.dumps({'errors': err.messages}),
             status=400,
@@ -46,8 +70,10 @@ def create_topic(request):
             charset='utf-8'
         )
     except Exception as e:
-        # General exception handling
-        print("Error:", str(e))
+        log.exception('Error while adding a topic')
+        # The topic may be flushed already: do not let pyramid_tm commit it
+        # (and its counters and revision) behind this 500
+        request.tm.doom()
         return Response(
             body=json.dumps({'error': 'An error occurred while adding the topic.'}),
             status=500,
@@ -57,28 +83,235 @@ def create_topic(request):
 
 
 
-@view_config(route_name='get_topics', renderer='json', request_method='GET')
+@view_config(route_name='get_topics', renderer='json_stream', request_method='GET')
 def topics_api_view(request):
-    topics = DBSession.query(Topic).all()
+    # The listing only changes when a topic is added, edited or removed,
+    # which always moves max(updated_at) or count(*), and when view counts
+    # are flushed, which is what the time bucket stands for.
+    last_modified, count = DBSession.query(func.max(Topic.updated_at), func.count(Topic.id)).one()
+    views_bucket, last_modified = counters.views_validators(last_modified)
+    etag = make_etag('topics', last_modified, count, views_bucket, request.query_string)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(request, etag, last_modified)
+    set_validators(request, request.response, etag, last_modified)
+
+    # Passing ?limit= or ?cursor= switches to keyset pagination over
+    # (created_at, id); without them the old full listing is returned.
+    if 'limit' in request.params or 'cursor' in request.params:
+        page = request.cache.get_or_create(
+            'topics?' + request.query_string,
+            lambda: _topics_page(request, _summary_query()),
+            tags=('topics', 'table:topics'),
+        )
+        if 'error' in page:
+            request.response.status = 400
+        return page
+
+    # The full listing is streamed from a server-side cursor, so memory
+    # stays flat however many topics there are
+    stmt = select(
+        Topic.id, Topic.title, Topic.content, Topic.username,
+        Topic.reply_count, Topic.views, Topic.last_activity_at, Topic.created_at, Topic.updated_at
+    )
+    engine = routed_engine() or request.registry.db_engine
+    return JSONStream(stream_rows(engine, stmt), topic_dumper.dump)
 
-    # Serialize topic objects into dictionaries
-    result = []
-    for p in topics:
-        result.append({
-            'id': p.id,
-            'name': p.name,
-            'price': p.price,
-            'originalPrice': p.original_price,
-            'image': p.image_url or '/api/placeholder/300/200',
-            'rating': p.rating,
-            'sold': p.sold,
-            'seller' : p.seller,
-            'stock' : p.stock
-        })
 
-    return result
+# Most ids one GET /api/topics?ids= may ask for
+MAX_IDS = 100
+
+
+@view_config(route_name='get_topics_by_ids', renderer='json', request_method='GET')
+def topics_by_ids(request):
+    """``?ids=3,1,2``: the topics in the order asked, ``null`` for missing ids.
+
+    One IN query for the whole page of cards instead of one detail
+    request per card.
+    """
+    try:
+        ids = [int(value) for value in request.params.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        request.response.status = 400
+        return {'error': 'ids must be a comma-separated list of integers'}
+    if not ids or len(ids) > MAX_IDS:
+        request.response.status = 400
+        return {'error': 'Pass between 1 and %d ids' % MAX_IDS}
+
+    found = {
+        topic.id: topic
+        for topic in DBSession.query(Topic).filter(Topic.id.in_(set(ids)))
+    }
+    validators = []
+    for topic_id in ids:
+        topic = found.get(topic_id)
+        # views is not covered by updated_at (see counters.flush_views)
+        validators += [topic_id, topic.updated_at, topic.views] if topic else [topic_id, None]
+    etag = make_etag('topics-ids', *validators)
+    if is_not_modified(request, etag):
+        return not_modified(request, etag)
+    set_validators(request, request.response, etag)
+
+    dumped = {topic_id: topic_dumper.dump(topic) for topic_id, topic in found.items()}
+    return {
+        'topics': [dumped.get(topic_id) for topic_id in ids],
+        'missing': [topic_id for topic_id in ids if topic_id not in found],
+    }
 
 
+def _summary_query():
+    # Only the summary columns; the full content is never loaded here
+    return DBSession.query(
+        Topic.id,
+        Topic.title,
+        Topic.username,
+        Topic.reply_count,
+        Topic.views,
+        Topic.last_activity_at,
+        Topic.created_at,
+        Topic.updated_at,
+        func.substr(Topic.content, 1, EXCERPT_LENGTH).label('excerpt'),
+    )
+
+
+def _topics_page(request, query):
+    """One keyset page of ``query``, newest first, from the ``cursor`` param."""
+    try:
+        limit = parse_limit(request.params.get('limit'))
+        cursor = request.params.get('cursor')
+        after = decode_cursor(cursor, datetime, int) if cursor else None
+    except InvalidCursor as err:
+        request.response.status = 400
+        return {'error': str(err)}
+
+    if after:
+        created_at, topic_id = after
+        query = query.filter(or_(
+            Topic.created_at < created_at,
+            and_(Topic.created_at == created_at, Topic.id < topic_id),
+        ))
+    rows = query.order_by(Topic.created_at.desc(), Topic.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return {
+        'topics': topic_summary_dumper.dump_many(rows),
+        'next_cursor': next_cursor,
+    }
+
+
+@view_config(route_name='search_topics', renderer='json', request_method='GET')
+@cached_view(tags=('topics', 'table:topics'))
+def search_topics_view(request):
+    query = request.params.get('q', '').strip()
+    if not query:
+        request.response.status = 400
+        return {'error': 'Missing search query (q)'}
+    try:
+        limit = parse_limit(request.params.get('limit'))
+        offset = max(0, int(request.params.get('offset', 0)))
+    except (InvalidCursor, ValueError):
+        request.response.status = 400
+        return {'error': 'limit and offset must be integers'}
+
+    ranked = search_topics(query, limit + 1, offset)
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+
+    rows = {}
+    if ranked:
+        rows = {
+            row.id: row for row in _summary_query().filter(
+                Topic.id.in_([topic_id for topic_id, rank in ranked])
+            )
+        }
+
+    results = []
+    for topic_id, rank in ranked:
+        if topic_id in rows:
+            result = topic_summary_dumper.dump(rows[topic_id])
+            result['rank'] = round(rank, 6)
+            results.append(result)
+
+    return {
+        'results': results,
+        'next_offset': offset + limit if has_more else None,
+    }
+
+
+
+@view_config(route_name='trending_topics', renderer='json', request_method='GET')
+def trending_topics_view(request):
+    # Top K straight off ix_topic_scores_score; the ranking itself is
+    # maintained incrementally by forum/trending.py
+    try:
+        limit = parse_limit(request.params.get('limit'))
+    except InvalidCursor as err:
+        request.response.status = 400
+        return {'error': str(err)}
+
+    return request.cache.get_or_create(
+        'trending?%d' % limit,
+        lambda: _trending(limit),
+        tags=('topics', 'table:topics'),
+        ttl=TRENDING_TTL,
+    )
+
+
+@view_config(route_name='topics_stream', request_method='GET')
+def topics_stream(request):
+    # Created, updated and deleted topics as Server-Sent Events, so
+    # clients stop polling the listing
+    last_event_id = sse.parse_last_event_id(request.headers.get('Last-Event-ID'))
+    if sse.server is not None:
+        # Held by the asyncio listener (forum/sse.py), not a waitress thread
+        location = sse.PUBLIC_URL or '%s://%s:%d%s' % (
+            request.scheme, request.host.rsplit(':', 1)[0], sse.server.port, sse.STREAM_PATH)
+        if last_event_id is not None:
+            location += '?last_event_id=%d' % last_event_id
+        return HTTPTemporaryRedirect(location=location)
+
+    response = request.response
+    response.content_type = 'text/event-stream'
+    response.charset = 'utf-8'
+    response.headers['Cache-Control'] = 'no-cache, no-transform'
+    response.headers['X-Accel-Buffering'] = 'no'
+    if sse.thread_streams.acquire(sse.MAX_THREAD_STREAMS):
+        # the slot comes back when waitress closes the body
+        response.app_iter = ClosingIter(sse.thread_stream(last_event_id, sse.THREAD_SECONDS),
+                                        sse.thread_streams.release)
+    else:
+        response.app_iter = sse.busy_stream(int(sse.THREAD_SECONDS * 1000) + sse.RETRY_MS)
+    return response
+
+
+def _trending(limit):
+    rows = (
+        _summary_query()
+        .add_columns(TopicScore.score)
+        .join(TopicScore, TopicScore.topic_id == Topic.id)
+        .order_by(TopicScore.score.desc())
+        .limit(limit)
+        .all()
+    )
+    now = datetime.utcnow()
+    topics = []
+    for row in rows:
+        topic = topic_summary_dumper.dump(row)
+        topic['hotness'] = round(trending.hotness(row.score, now), 4)
+        topics.append(topic)
+    return {'topics': topics}
+
+
+def _last_posted_at(user_id):
+    return (
+        DBSession.query(func.max(Topic.created_at))
+        .filter(Topic.user_id == user_id)
+        .scalar_subquery()
+    )
+
 
 def get_topic_by_id(request, topic_id):
     topic = request.dbsession.query(Topic).filter(Topic.id == int(topic_id)).first()
@@ -90,63 +323,89 @@ def get_topic_by_id(request, topic_id):
 
 @view_config(route_name='get_topic_detail', renderer='json', request_method='GET')
 def topic_detail_api_view(request):
-    topic_id = request.matchdict.get('topic_id')
-
-    topic = DBSession.query(Topic).filter(Topic.id == int(topic_id)).first()
+    try:
+        topic_id = int(request.matchdict.get('topic_id'))
+    except ValueError:
+        request.response.status = 404
+        return {"error": "Topic not found"}
 
-    if not topic:
+    # The dumped payload is cached, so both revalidation and the full
+    # response are answered without touching the database on a hit
+    payload = request.cache.get_or_create(
+        'topic:%d' % topic_id,
+        lambda: _topic_payload(topic_id),
+        tags=('topic:%d' % topic_id, 'table:topics'),
+    )
+    if payload is None:
         request.response.status = 404
         return {"error": "Topic not found"}
+    counters.record_view(topic_id)
+    trending.record(topic_id, 'view')
 
-    return {
-        'id': topic.id,
-        'name': topic.name,
-        'price': topic.price,
-        'originalPrice': topic.original_price,
-        'image': topic.image_url or '/api/placeholder/300/200',
-        'rating': topic.rating,
-        'sold': topic.sold,
-        'seller': topic.seller,
-        'description': topic.description,
-        'stock': topic.stock
-    }
+    updated_at = datetime.fromisoformat(payload['updated_at']) if payload['updated_at'] else None
+    # views is not covered by updated_at (see counters.flush_views)
+    _, updated_at = counters.views_validators(updated_at)
+    etag = make_etag('topic', payload['id'], payload['updated_at'], payload.get('views'))
+    if is_not_modified(request, etag, updated_at):
+        return not_modified(request, etag, updated_at)
+    set_validators(request, request.response, etag, updated_at)
+    return payload
+
+
+def _topic_payload(topic_id):
+    topic = DBSession.query(Topic).filter(Topic.id == topic_id).first()
+    return topic_dumper.dump(topic) if topic else None
 
 
 @view_config(route_name='get_seller_topics', renderer='json', request_method='GET')
 def get_seller_topics(request):
-    user_id = get_user_id_from_jwt(request)
-    if not user_id:
-        return HTTPUnauthorized(json_body={"error": "Unauthorized"})
-
-    user = DBSession.query(User).get(user_id)
+    # Topics of the logged-in user
+    user = request.user
     if not user:
         return HTTPUnauthorized(json_body={"error": "User not found"})
 
-    username = user.username
-    print(f"DEBUG: User ID from token: {user_id}")
-    print(f"DEBUG: Username from DB: '{username}' (len={len(username)})")
-
-    # Query topics by seller username exactly
-    topics = DBSession.query(Topic).filter(Topic.seller == username).all()
+    return _user_topics(request, user.id)
 
-    print(f"DEBUG: Number of topics found: {len(topics)}")
-    for p in topics:
-        print(f"DEBUG: Topic ID={p.id}, Seller='{p.seller}', Name='{p.name}'")
 
-    result = []
-    for p in topics:
-        result.append({
-            'id': p.id,
-            'name': p.name,
-            'price': p.price,
-            'image': p.image_url or '/api/placeholder/300/200',
-            'rating': p.rating,
-            'sold': p.sold,
-            'seller': p.seller,
-            'stock': p.stock
-        })
-
-    return result
+@view_config(route_name='get_user_topics', renderer='json', request_method='GET')
+def get_user_topics(request):
+    try:
+        user_id = int(request.matchdict.get('user_id'))
+    except ValueError:
+        return HTTPNotFound(json_body={'error': 'User not found'})
+    return _user_topics(request, user_id)
+
+
+def _user_topics(request, user_id):
+    # The counters live on the user row, the page comes from the
+    # (user_id, created_at, id) index; the topics table is never scanned.
+    def load():
+        owner = DBSession.query(
+            User.id, User.username, User.topic_count, User.last_posted_at
+        ).filter(User.id == user_id).first()
+        if not owner:
+            return None
+
+        page = _topics_page(request, _summary_query().filter(Topic.user_id == user_id))
+        if 'error' not in page:
+            page['user'] = {
+                'id': owner.id,
+                'username': owner.username,
+                'topic_count': owner.topic_count,
+                'last_posted_at': owner.last_posted_at.isoformat() if owner.last_posted_at else None,
+            }
+        return page
+
+    page = request.cache.get_or_create(
+        'user-topics:%d?%s' % (user_id, request.query_string),
+        load,
+        tags=('user:%d' % user_id, 'user-topics:%d' % user_id, 'table:topics'),
+    )
+    if page is None:
+        return HTTPNotFound(json_body={'error': 'User not found'})
+    if 'error' in page:
+        request.response.status = 400
+    return page
 
 
 # NEW
@@ -155,30 +414,33 @@ def get_seller_topics(request):
 @view_config(route_name='edit_topic', renderer='json', request_method='PUT')
 def edit_topic(request):
     topic_id = request.matchdict.get('topic_id')
-    try:
-        user_id = get_user_id_from_jwt(request)
-        if not user_id:
-            return HTTPUnauthorized(json_body={'error': 'Authentication required'})
-
-        user = DBSession.query(User).get(user_id)
-        if not user:
-            return HTTPUnauthorized(json_body={'error': 'User not found'})
+    user = request.user
+    if not user:
+        return HTTPUnauthorized(json_body={'error': 'User not found'})
 
-        topic = DBSession.query(Topic).filter(Topic.id == int(topic_id)).first()
+    try:
+        # Locked so concurrent edits of one topic number their revisions in turn
+        topic = DBSession.query(Topic).filter(Topic.id == int(topic_id)).with_for_update().first()
         if not topic:
             return HTTPNotFound(json_body={'error': 'Topic not found'})
 
-        if topic.seller != user.username:
+        if topic.user_id != user.id:
             return HTTPForbidden(json_body={'error': 'You are not authorized to edit this topic'})
 
         data = request.json_body
-        topic_data = TopicSchema().load(data, partial=True)
+        topic_data = topic_schema.load(data, partial=True)
 
+        previous_title, previous_content = topic.title, topic.content
         for key, value in topic_data.items():
             setattr(topic, key, value)
 
         DBSession.flush() # Commit changes to the database
-        return TopicSchema().dump(topic)
+        if (topic.title, topic.content) != (previous_title, previous_content):
+            revisions.record_edit(topic, previous_title, previous_content, user.id)
+        trending.record(topic.id, 'edit')
+        payload = topic_dumper.dump(topic)
+        events.publish_after_commit(request, 'topic.updated', payload)
+        return payload
 
     except ValidationError as err:
         return Response(
@@ -188,7 +450,8 @@ def edit_topic(request):
             charset='utf-8'
         )
     except SQLAlchemyError as e:
-        DBSession.rollback() # Rollback in case of DB error
+        log.exception('Database error while updating a topic')
+        request.tm.doom()
         return Response(
             body=json.dumps({'error': 'A database error occurred while updating the topic.'}),
             status=500,
@@ -196,6 +459,9 @@ def edit_topic(request):
             charset='utf-8'
         )
     except Exception as e:
+        log.exception('Error while updating a topic')
+        # The edit may be flushed with only part of its revision
+        request.tm.doom()
         return Response(
             body=json.dumps({'error': 'An unexpected error occurred while updating the topic.'}),
             status=500,
@@ -209,17 +475,17 @@ def edit_topic(request):
 @view_config(route_name='delete_topic', renderer='json', request_method='DELETE')
 def delete_topic(request):
     topic_id = request.matchdict.get('topic_id')
-    print(f"DEBUG: DELETE request received for topic ID: {topic_id}") # ADD THIS
 
-    try:
-        # ... (your existing auth logic) ...
+    user = request.user
+    if not user:
+        return HTTPUnauthorized(json_body={'error': 'User not found'})
 
+    try:
         # Check the parsed topic_id type and value
         try:
             int_topic_id = int(topic_id)
-            print(f"DEBUG: Parsed topic_id as integer: {int_topic_id}") # ADD THIS
         except ValueError:
-            print(f"ERROR: topic_id '{topic_id}' is not a valid integer.")
+            log.debug('Invalid topic id %r', topic_id)
             return Response(
                 body=json.dumps({'error': 'Invalid topic ID format.'}),
                 status=400,
@@ -230,15 +496,27 @@ def delete_topic(request):
         # 2. Fetch the existing topic
         topic = DBSession.query(Topic).filter(Topic.id == int_topic_id).first() # Use int_topic_id
         if not topic:
-            print(f"DEBUG: Topic with ID {int_topic_id} not found in DB.") # ADD THIS
             return HTTPNotFound(json_body={'error': 'Topic not found'}) # Ensure json_body is set
 
-        # ... (rest of your logic) ... used for successful DELETE requests where no content is returned.
+        if topic.user_id != user.id:
+            return HTTPForbidden(json_body={'error': 'You are not authorized to delete this topic'})
+
+        DBSession.delete(topic)
+        DBSession.flush()
+        # Keep the owner's counters in step, in the same transaction
+        DBSession.query(User).filter(User.id == user.id).update({
+            User.topic_count: User.topic_count - 1,
+            User.last_posted_at: _last_posted_at(user.id),
+        }, synchronize_session=False)
+        invalidate('user:%d' % user.id)
+        events.publish_after_commit(request, 'topic.deleted', {'id': int_topic_id})
+
+        # used for successful DELETE requests where no content is returned.
         return HTTPNoContent()
 
     except SQLAlchemyError as e:
         DBSession.rollback() # Rollback in case of DB error
-        print(f"Database error during topic deletion: {e}")
+        log.exception('Database error during topic deletion')
         return Response(
             body=json.dumps({'error': 'A database error occurred while deleting the topic.'}),
             status=500,
@@ -246,7 +524,7 @@ def delete_topic(request):
             charset='utf-8'
         )
     except Exception as e:
-        print(f"General error during topic deletion: {e}")
+        log.exception('General error during topic deletion')
         return Response(
             body=json.dumps({'error': 'An unexpected error occurred while deleting the topic.'}),
             status=500,
@@ -1,20 +1,34 @@
 # views/user.py
 import json
+import logging
 import jwt
 from datetime import datetime, timedelta
 
-from ..views import imagekit
 from pyramid.view import view_config
 from pyramid.response import Response
-from pyramid.httpexceptions import HTTPFound, HTTPNoContent, HTTPUnauthorized
+from pyramid.httpexceptions import HTTPAccepted, HTTPFound, HTTPUnauthorized
+from sqlalchemy import delete, select
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from marshmallow import ValidationError
 
 from ..models.meta import DBSession
 from ..models.user import User
 from ..models.topic import Topic
-from ..schemas.user import UserSignupSchema, UserLoginSchema, UserUpdatePasswordSchema, UserSchema
+from ..serializers import (
+    user_dumper,
+    user_login_schema,
+    user_schema,
+    user_signup_schema,
+    user_update_password_schema,
+)
 from ..security import is_authenticated, JWT_SECRET, get_user_id_from_jwt
+from ..hashing import HashingPoolBusy
+from ..cache import invalidate
+from ..identity import invalidate_identity
+from ..jobs import enqueue_many
+from ..search import unindex_topics
+
+log = logging.getLogger(__name__)
 
 
 def create_jwt_token(user_id):
@@ -24,6 +38,17 @@ def create_jwt_token(user_id):
     return token if isinstance(token, str) else token.decode('utf-8')
 
 
+def hashing_busy_response():
+    # The bcrypt pool is saturated; tell the client to come back shortly
+    return Response(
+        body=json.dumps({'error': 'Server is busy, please try again shortly.'}),
+        status=503,
+        content_type='application/json',
+        charset='utf-8',
+        headers={'Retry-After': '1'}
+    )
+
+
 @view_config(route_name='signup', renderer='json', request_method='POST')
 def signup_view(request):
     if is_authenticated(request):
@@ -31,7 +56,7 @@ def signup_view(request):
 
     try:
         data = request.json_body
-        attrs = UserSignupSchema().load(data)
+        attrs = user_signup_schema.load(data)
         if DBSession.query(User).filter(
             (User.username == attrs['username']) |
             (User.email == attrs['email'])
@@ -61,6 +86,8 @@ def signup_view(request):
             content_type='application/json',
             charset='utf-8'
         )
+    except HashingPoolBusy:
+        return hashing_busy_response()
 
 
 @view_config(route_name='login', renderer='json', request_method='POST')
@@ -70,7 +97,7 @@ def login_view(request):
 
     try:
         data = request.json_body
-        creds = UserLoginSchema().load(data)
+        creds = user_login_schema.load(data)
         user = DBSession.query(User).filter_by(email=creds['email']).first()
         if user and user.verify_password(creds['password']):
             token = create_jwt_token(user.id)
@@ -92,42 +119,32 @@ def login_view(request):
             content_type='application/json',
             charset='utf-8'
         )
+    except HashingPoolBusy:
+        return hashing_busy_response()
     
 
 # NEW
 
 @view_config(route_name='get_user_profile', renderer='json', request_method='GET')
 def get_user_profile(request):
-    print("DEBUG: get_user_profile view hit!") # <--- ADD THIS
-    user_id = get_user_id_from_jwt(request)
-    if not user_id:
-        print("DEBUG: User not authenticated for profile fetch.") # <--- ADD THIS
-        return HTTPUnauthorized(json_body={'error': 'Authentication required'})
-
-    user = DBSession.query(User).get(user_id)
+    user = request.user
     if not user:
-        print(f"DEBUG: User with ID {user_id} not found in DB during profile fetch.") # <--- ADD THIS
         return HTTPUnauthorized(json_body={'error': 'User not found'})
 
-    print(f"DEBUG: User profile for {user.username} fetched successfully.") # <--- ADD THIS
-    return UserSchema().dump(user)
+    return user_dumper.dump(user)
 
 
 
 @view_config(route_name='update_user_profile', renderer='json', request_method='PUT')
 def update_user_profile(request):
-    user_id = get_user_id_from_jwt(request)
-    if not user_id:
-        return HTTPUnauthorized(json_body={'error': 'Authentication required'})
-
-    user = DBSession.query(User).get(user_id)
+    user = request.user
     if not user:
         return HTTPUnauthorized(json_body={'error': 'User not found'})
 
     try:
         data = request.json_body
         # Use partial=True to allow updating only a subset of fields
-        updated_data = UserSchema(partial=True).load(data)
+        updated_data = user_schema.load(data, partial=True)
 
         # Check for duplicate username or email if they are being updated
         if 'username' in updated_data and updated_data['username'] != user.username:
@@ -145,12 +162,15 @@ def update_user_profile(request):
                     content_type='application/json'
                 )
 
-        # Apply updates to the user object
-        for key, value in updated_data.items():
-            setattr(user, key, value)
-        
-        DBSession.flush() # Commit changes to the database
-        return UserSchema().dump(user)
+        # Apply updates straight to the row, no need to load it first
+        if updated_data:
+            DBSession.query(User).filter(User.id == user.id).update(
+                updated_data, synchronize_session=False
+            )
+            DBSession.flush() # Commit changes to the database
+            invalidate_identity(user.id)
+            invalidate('user:%d' % user.id)
+        return user_dumper.dump(user._replace(**updated_data))
 
     except ValidationError as err:
         return Response(
@@ -161,7 +181,7 @@ def update_user_profile(request):
         )
     except SQLAlchemyError as e:
         DBSession.rollback() # Rollback on database error
-        print(f"Database error during user profile update: {e}")
+        log.exception('Database error during user profile update')
         return Response(
             body=json.dumps({'error': 'A database error occurred while updating your profile.'}),
             status=500, # 500 Internal Server Error for DB issues
@@ -169,7 +189,7 @@ def update_user_profile(request):
             charset='utf-8'
         )
     except Exception as e:
-        print(f"General error during user profile update: {e}")
+        log.exception('General error during user profile update')
         return Response(
             body=json.dumps({'error': 'An unexpected error occurred while updating your profile.'}),
             status=500,
@@ -180,17 +200,18 @@ def update_user_profile(request):
 
 @view_config(route_name='update_user_password', renderer='json', request_method='PUT')
 def update_user_password(request):
-    user_id = get_user_id_from_jwt(request)
-    if not user_id:
-        return HTTPUnauthorized(json_body={'error': 'Authentication required'})
+    identity = request.user
+    if not identity:
+        return HTTPUnauthorized(json_body={'error': 'User not found'})
 
-    user = DBSession.query(User).get(user_id)
+    # The password hash is not part of the cached identity
+    user = DBSession.query(User).get(identity.id)
     if not user:
         return HTTPUnauthorized(json_body={'error': 'User not found'})
 
     try:
         data = request.json_body
-        attrs = UserUpdatePasswordSchema().load(data)
+        attrs = user_update_password_schema.load(data)
         # Verify current password using the method in your User model
         if not user.verify_password(attrs['current_password']):
             return Response(
@@ -212,9 +233,11 @@ def update_user_password(request):
             content_type='application/json',
             charset='utf-8'
         )
+    except HashingPoolBusy:
+        return hashing_busy_response()
     except SQLAlchemyError as e:
         DBSession.rollback()
-        print(f"Database error during password update: {e}")
+        log.exception('Database error during password update')
         return Response(
             body=json.dumps({'error': 'A database error occurred while updating your password.'}),
             status=500,
@@ -222,7 +245,7 @@ def update_user_password(request):
             charset='utf-8'
         )
     except Exception as e:
-        print(f"General error during password update: {e}")
+        log.exception('General error during password update')
         return Response(
             body=json.dumps({'error': 'An unexpected error occurred while updating your password.'}),
             status=500,
@@ -234,32 +257,41 @@ def update_user_password(request):
 
 @view_config(route_name='delete_account', renderer='json', request_method='DELETE')
 def delete_account(request):
-    user_id = get_user_id_from_jwt(request)
-    if not user_id:
-        return HTTPUnauthorized(json_body={'error': 'Authentication required'})
-
-    user = DBSession.query(User).get(user_id)
+    user = request.user
     if not user:
         return HTTPUnauthorized(json_body={'error': 'User not found'})
 
     try:
-        topics_to_delete = DBSession.query(Topic).filter(Topic.seller == user.username).all()
-        for topic in topics_to_delete:
-            if topic.imagekit_file_id:
-                try:
-                    imagekit.delete_file(topic.imagekit_file_id)
-                    print(f"ImageKit image {topic.imagekit_file_id} deleted for topic {topic.id}.")
-                except Exception as ik_err:
-                    print(f"WARNING: Failed to delete ImageKit image {topic.imagekit_file_id} during account deletion: {ik_err}")
-            DBSession.delete(topic) # Delete the topic record from your DB
-        DBSession.flush() # Flush topic deletions before user deletion to avoid foreign key issues
-
-        DBSession.delete(user) # Delete the user record itself
+        # One set-based DELETE for all of the user's topics; the topic and
+        # image ids come back through RETURNING where the database supports it.
+        topics = Topic.__table__
+        stmt = delete(topics).where(topics.c.user_id == user.id)
+        columns = (topics.c.id, topics.c.imagekit_file_id)
+        if getattr(DBSession.get_bind().dialect, 'delete_returning', False):
+            deleted = DBSession.execute(stmt.returning(*columns)).all()
+        else:
+            deleted = DBSession.execute(select(*columns).where(topics.c.user_id == user.id)).all()
+            DBSession.execute(stmt)
+        file_ids = [row.imagekit_file_id for row in deleted]
+        unindex_topics(row.id for row in deleted)
+
+        # Remote images are removed later by the job worker, the jobs are
+        # committed together with the deletion
+        jobs = enqueue_many('imagekit.delete_file', [
+            {'file_id': file_id} for file_id in file_ids if file_id
+        ])
+
+        # Delete the user record itself
+        DBSession.query(User).filter(User.id == user.id).delete(synchronize_session=False)
         DBSession.flush()
-        return HTTPNoContent() # 204 No Content for successful deletion
+        invalidate_identity(user.id)
+        invalidate('user:%d' % user.id, 'table:topics')
+        # 202 Accepted: the account is gone, image cleanup is still pending
+        return HTTPAccepted(json_body={'message': 'Account deleted', 'pending_cleanup_jobs': jobs})
 
     except SQLAlchemyError as e:
         DBSession.rollback() # Rollback on database error
+        log.exception('Database error during account deletion')
         return Response(
             body=json.dumps({'error': 'A database error occurred while deleting your account.'}),
             status=500,
@@ -267,6 +299,7 @@ def delete_account(request):
             charset='utf-8'
         )
     except Exception as e:
+        log.exception('General error during account deletion')
         return Response(
             body=json.dumps({'error': 'An unexpected error occurred while deleting your account.'}),
             status=500,
@@ -0,0 +1,140 @@
+# backend/forum/writebehind.py
+import atexit
+import logging
+import operator
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Every buffer created in this process, flushed on exit
+_buffers = []
+
+
+class WriteBehindBuffer:
+    """Aggregates values per key in memory and writes them in batches.
+
+    ``add`` only touches a dict; a background thread (one per process,
+    started on first use so it survives forum_serve's fork) hands the
+    accumulated ``{key: value}`` batch to ``flush`` every ``interval``
+    seconds, or as soon as ``max_keys`` keys are pending. A failed flush
+    is merged back and retried on the next round. Pending values are lost
+    only if the process dies without running ``flush_all``.
+    """
+
+    def __init__(self, name, flush, combine=operator.add, interval=5.0, max_keys=10000):
+        self.name = name
+        self._flush = flush
+        self.combine = combine
+        self.interval = interval
+        self.max_keys = max_keys
+        self._pending = {}
+        self._oldest = None  # time.monotonic() of the oldest pending value
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        # instrumentation
+        self.flushes = 0
+        self.failures = 0
+        self.flushed_keys = 0
+        self.last_flush_size = 0
+        self.last_flush_seconds = 0.0
+        _buffers.append(self)
+
+    def add(self, key, value):
+        with self._lock:
+            if key in self._pending:
+                self._pending[key] = self.combine(self._pending[key], value)
+            else:
+                self._pending[key] = value
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            full = len(self._pending) >= self.max_keys
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='writebehind-%s' % self.name, daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything pending now; returns the number of keys written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                oldest, self._oldest = self._oldest, None
+            if not batch:
+                return 0
+            start = time.perf_counter()
+            try:
+                self._flush(batch)
+            except Exception:
+                log.exception("write-behind flush of %d %s keys failed", len(batch), self.name)
+                with self._lock:
+                    for key, value in batch.items():
+                        if key in self._pending:
+                            self._pending[key] = self.combine(value, self._pending[key])
+                        else:
+                            self._pending[key] = value
+                    if self._oldest is None or oldest < self._oldest:
+                        self._oldest = oldest
+                    self.failures += 1
+                return 0
+            with self._lock:
+                self.flushes += 1
+                self.flushed_keys += len(batch)
+                self.last_flush_size = len(batch)
+                self.last_flush_seconds = time.perf_counter() - start
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending_keys': len(self._pending),
+                # how long the oldest unwritten value has been waiting
+                'lag_seconds': time.monotonic() - self._oldest if self._oldest else 0.0,
+                'flushes': self.flushes,
+                'failures': self.failures,
+                'flushed_keys': self.flushed_keys,
+                'last_flush_size': self.last_flush_size,
+                'last_flush_seconds': round(self.last_flush_seconds, 6),
+            }
+
+    def metric_lines(self):
+        stats = self.stats()
+        name = self.name
+        return [
+            'forum_writebehind_pending_keys{buffer="%s"} %d' % (name, stats['pending_keys']),
+            'forum_writebehind_lag_seconds{buffer="%s"} %.3f' % (name, stats['lag_seconds']),
+            'forum_writebehind_flushes_total{buffer="%s"} %d' % (name, stats['flushes']),
+            'forum_writebehind_flush_failures_total{buffer="%s"} %d' % (name, stats['failures']),
+            'forum_writebehind_flushed_keys_total{buffer="%s"} %d' % (name, stats['flushed_keys']),
+            'forum_writebehind_last_flush_size{buffer="%s"} %d' % (name, stats['last_flush_size']),
+            'forum_writebehind_last_flush_seconds{buffer="%s"} %s' % (name, stats['last_flush_seconds']),
+        ]
+
+
+def flush_all():
+    """Write out every buffer; called at exit and by forum_serve's workers."""
+    for buffer in list(_buffers):
+        try:
+            buffer.flush()
+        except Exception:
+            log.exception("final flush of %s failed", buffer.name)
+
+
+atexit.register(flush_all)
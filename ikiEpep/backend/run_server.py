@@ -1,6 +1,7 @@
-from waitress import serve
-from ecommerce import main
+# backend/run_server.py
+# Production entry point: pre-forked waitress workers configured by
+# production.ini (same as the forum_serve console script).
+from forum.scripts.serve import main
 
 if __name__ == '__main__':
-    app = main({})
-    serve(app, host='0.0.0.0', port=6543)
+    main()
@@ -28,10 +28,32 @@ setup(
         'psycopg2-binary', # Atau driver database PostgreSQL lainnya
         'pyramid-tm',
         'pyramid-sqlalchemy',
+        'marshmallow',
+        'PyJWT',
+        'bcrypt',
     ],
+    extras_require={
+        'testing': ['pytest', 'WebTest', 'fakeredis[lua]'],
+        # faster JSON rendering, picked up automatically when installed
+        'speedups': ['orjson'],
+        # remote image cleanup in the forum_jobs worker
+        'imagekit': ['imagekitio'],
+        # shared read cache (forum.cache.backend = redis)
+        'redis': ['redis'],
+        # brotli and zstd Content-Encoding (gzip is always available)
+        'compression': ['brotli', 'zstandard'],
+        # benchmarks/harness.py
+        'bench': ['WebTest'],
+    },
     entry_points={
         'paste.app_factory': [
             'main = forum:main',
         ],
+        'console_scripts': [
+            'forum_jobs = forum.scripts.jobs:main',
+            'forum_serve = forum.scripts.serve:main',
+            'forum_trending = forum.scripts.trending:main',
+            'forum_revisions = forum.scripts.revisions:main',
+        ],
     },
 )
\ No newline at end of file
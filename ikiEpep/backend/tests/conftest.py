@@ -0,0 +1,68 @@
+import pytest
+import transaction
+from pyramid import testing
+from pyramid.request import Request, apply_request_extensions
+from sqlalchemy import create_engine
+
+from forum import cache
+from forum.models.meta import Base, DBSession
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine('sqlite:///%s' % (tmp_path / 'forum.sqlite'))
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def dbsession(engine):
+    DBSession.remove()
+    DBSession.configure(bind=engine)
+    yield DBSession
+    transaction.abort()
+    DBSession.remove()
+
+
+@pytest.fixture
+def config():
+    config = testing.setUp()
+    yield config
+    testing.tearDown()
+
+
+@pytest.fixture
+def make_request(config, monkeypatch):
+    """Real (webob) requests, for views that read conditional headers.
+
+    They share an in-memory read cache (request.cache) for the test.
+    """
+    monkeypatch.setattr(cache, 'cache', None)
+    config.include('forum.cache')
+
+    def make(path='/', **kwargs):
+        request = Request.blank(path, **kwargs)
+        request.registry = config.registry
+        apply_request_extensions(request)
+        return request
+    return make
+
+
+@pytest.fixture
+def app_settings(engine):
+    return {
+        'sqlalchemy.url': str(engine.url),
+        'forum.bcrypt.workers': '0',
+        'forum.bcrypt.rounds': '4',
+    }
+
+
+@pytest.fixture
+def testapp(app_settings):
+    """The whole WSGI app (tweens, routes, pyramid_tm) over the test database."""
+    from webtest import TestApp
+    from forum import main
+
+    yield TestApp(main({}, **app_settings))
+    DBSession.remove()
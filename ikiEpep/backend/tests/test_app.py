@@ -0,0 +1,28 @@
+def _login(testapp, username):
+    email = '%s@example.com' % username
+    testapp.post_json('/signup', {'username': username, 'email': email, 'password': 'secret123'})
+    token = testapp.post_json('/login', {'email': email, 'password': 'secret123'}).json['token']
+    return {'Authorization': 'Bearer %s' % token}
+
+
+def test_topic_counters(testapp):
+    headers = _login(testapp, 'cid_highwind')
+    for title in ('Highwind', 'Rocket town'):
+        testapp.post_json('/api/topics', {'title': title, 'content': 'Airships', 'username': 'cid_highwind'}, headers=headers)
+
+    mine = testapp.get('/api/user/topics', headers=headers).json
+    assert [topic['title'] for topic in mine['topics']] == ['Rocket town', 'Highwind']
+    assert mine['user']['topic_count'] == 2
+    assert mine['user']['last_posted_at'] is not None
+
+    user_id = mine['user']['id']
+    page = testapp.get('/api/users/%d/topics?limit=1' % user_id).json
+    assert [topic['title'] for topic in page['topics']] == ['Rocket town']
+    assert page['next_cursor']
+    testapp.get('/api/users/%d/topics' % (user_id + 1), status=404)
+
+
+def test_server_timing_and_metrics(testapp):
+    response = testapp.get('/api/get-topics')
+    assert 'db;dur=' in response.headers['Server-Timing']
+    assert 'get_topics' in testapp.get('/metrics').text
@@ -0,0 +1,95 @@
+import pytest
+
+from forum import counters
+
+from .test_app import _login
+
+
+@pytest.fixture
+def app_settings(app_settings):
+    return dict(app_settings, **{
+        'forum.ratelimit.create_topic': '4/minute',
+        'forum.inflight.get_topics': '1',
+        'forum.views.flush_interval': '3600',
+        'forum.batch.max_requests': '5',
+    })
+
+
+@pytest.fixture
+def headers(testapp):
+    return _login(testapp, 'reeve_t')
+
+
+def _create(title):
+    return {'method': 'POST', 'path': '/api/topics', 'body': {'title': title, 'content': 'Shinra', 'username': 'reeve_t'}}
+
+
+def _batch(testapp, headers, requests, **extra):
+    return testapp.post_json('/api/batch', dict(extra, requests=requests), headers=headers).json['responses']
+
+
+def test_topics_by_ids(testapp, headers):
+    ids = [testapp.post_json('/api/topics', _create(title)['body'], headers=headers).json['id']
+           for title in ('Cait Sith', 'Mog')]
+    response = testapp.get('/api/topics?ids=%d,999,%d' % (ids[1], ids[0]))
+    assert [topic and topic['title'] for topic in response.json['topics']] == ['Mog', None, 'Cait Sith']
+    assert response.json['missing'] == [999]
+
+    etag = response.headers['ETag']
+    testapp.get('/api/topics?ids=%d,999,%d' % (ids[1], ids[0]), headers={'If-None-Match': etag}, status=304)
+    testapp.get('/api/topics/%d' % ids[0])
+    counters.buffer.flush()
+    # a new view count is a new ETag
+    testapp.get('/api/topics?ids=%d,999,%d' % (ids[1], ids[0]), headers={'If-None-Match': etag}, status=200)
+
+    testapp.get('/api/topics?ids=1,x', status=400)
+    testapp.get('/api/topics?ids=', status=400)
+    testapp.get('/api/topics?ids=' + ','.join(map(str, range(101))), status=400)
+
+
+def test_batch_runs_each_request(testapp, headers):
+    responses = _batch(testapp, headers, [
+        _create('Cait Sith'),
+        {'method': 'GET', 'path': '/api/get-topics?limit=5'},
+        {'method': 'GET', 'path': '/api/get-topics'},
+        {'method': 'GET', 'path': '/api/topics/999'},
+        {'method': 'GET', 'path': '/elsewhere'},
+    ])
+    assert [response['status'] for response in responses] == [200, 200, 200, 404, 400]
+    # same transaction: the page sees the topic created before it
+    assert [topic['title'] for topic in responses[1]['body']['topics']] == ['Cait Sith']
+    assert 'ETag' in responses[1]['headers']
+    # the streamed listing gave its in-flight slot back once read
+    assert isinstance(responses[2]['body'], list)
+    assert testapp.app.registry.ratelimiter.inflight.snapshot()['get_topics'] == 0
+
+    testapp.post_json('/api/batch', {'requests': [_create('x')] * 6}, headers=headers, status=400)
+    testapp.post_json('/api/batch', {'nothing': []}, headers=headers, status=400)
+
+
+def test_batch_refuses_some_routes(testapp, headers):
+    responses = _batch(testapp, headers, [
+        {'method': 'POST', 'path': '/api/batch', 'body': {'requests': []}},
+        {'method': 'POST', 'path': '/api/topics/import', 'body': {}},
+        {'method': 'GET', 'path': '/api/topics/stream'},
+    ])
+    assert [response['status'] for response in responses] == [400, 400, 400]
+    assert responses[1]['body'] == {'error': 'Imports cannot be batched'}
+
+
+def test_atomic_batch_is_rolled_back(testapp, headers):
+    responses = _batch(testapp, headers, [_create('Cait Sith'), {'method': 'POST', 'path': '/api/topics', 'body': {}},
+                                          _create('Mog')], atomic=True)
+    assert [response['status'] for response in responses] == [200, 400, 424]
+    assert testapp.get('/api/get-topics').json == []
+
+    # without atomic the first one stays
+    _batch(testapp, headers, [_create('Cait Sith'), {'method': 'POST', 'path': '/api/topics', 'body': {}}])
+    assert [topic['title'] for topic in testapp.get('/api/get-topics').json] == ['Cait Sith']
+
+
+def test_batch_applies_the_route_limits(testapp, headers):
+    responses = _batch(testapp, headers, [_create(title) for title in ('One', 'Two', 'Three', 'Four', 'Five')])
+    assert [response['status'] for response in responses] == [200, 200, 200, 200, 429]
+    assert responses[4]['body'] == {'error': 'Too many requests, slow down.'}
+    assert 'Retry-After' in responses[4]['headers']
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+import transaction
+from pyramid import testing
+from pyramid.httpexceptions import HTTPForbidden
+from sqlalchemy.exc import OperationalError
+
+from forum import search
+from forum.identity import Identity
+from forum.models.topic import Topic
+from forum.search import InvertedIndex, search_topics
+from forum.views import bulk
+
+ADMIN = Identity(1, 'admin', 'admin@example.com')
+
+
+@pytest.fixture
+def config():
+    config = testing.setUp(settings={'forum.admin_usernames': 'admin'})
+    yield config
+    testing.tearDown()
+
+
+@pytest.fixture
+def admin_request(make_request, engine):
+    def make(path, body=b'', user=ADMIN):
+        request = make_request(path, method='POST', body=body)
+        request.registry.db_engine = engine
+        request.tm = transaction.manager
+        request.user = user
+        return request
+    return make
+
+
+def _lines(*rows):
+    return b''.join((row if isinstance(row, str) else json.dumps(row)).encode('utf-8') + b'\n' for row in rows)
+
+
+def _report(response):
+    return [json.loads(line) for line in b''.join(response.app_iter).splitlines()]
+
+
+def _topic(n, **extra):
+    return dict({'title': 'Imported %d' % n, 'content': 'Body %d' % n, 'username': 'cid'}, **extra)
+
+
+def test_admin_only(admin_request, dbsession):
+    for view in (bulk.import_topics, bulk.export_topics):
+        request = admin_request('/', user=Identity(2, 'cid', 'cid@example.com'))
+        assert isinstance(view(request), HTTPForbidden)
+
+
+def test_import_reports_bad_lines(admin_request, dbsession):
+    body = _lines(_topic(1), '{not json', _topic(2), {'title': 'No body'}, '', _topic(3))
+    report = _report(bulk.import_topics(admin_request('/api/topics/import', body)))
+    assert report[0] == {'line': 2, 'errors': 'Invalid JSON'}
+    assert report[1]['line'] == 4 and 'content' in report[1]['errors']
+    assert report[-1] == {'inserted': 3, 'failed': 2}
+    transaction.abort()
+    assert sorted(t.title for t in dbsession.query(Topic)) == ['Imported 1', 'Imported 2', 'Imported 3']
+
+
+def test_import_streams_errors_before_reading_on(admin_request, dbsession):
+    body = _lines('{not json', *[_topic(n) for n in range(50)])
+    request = admin_request('/api/topics/import', body)
+    lines = bulk.import_topics(request).app_iter
+    assert json.loads(next(lines)) == {'line': 1, 'errors': 'Invalid JSON'}
+    assert request.body_file.tell() < len(body)
+    assert json.loads(list(lines)[-1]) == {'inserted': 50, 'failed': 1}
+
+
+def test_import_commits_per_batch(admin_request, dbsession, monkeypatch):
+    monkeypatch.setattr(bulk, 'IMPORT_BATCH_SIZE', 2)
+    insert_batch, calls = bulk._insert_batch, []
+
+    def flaky(batch):
+        calls.append(len(batch))
+        if len(calls) == 2:
+            raise OperationalError('INSERT', {}, Exception('disk full'))
+        insert_batch(batch)
+    monkeypatch.setattr(bulk, '_insert_batch', flaky)
+
+    body = _lines(*[_topic(n) for n in range(1, 6)])
+    report = _report(bulk.import_topics(admin_request('/api/topics/import', body)))
+    assert report == [
+        {'lines': [3, 4], 'errors': 'Rejected by the database'},
+        {'inserted': 3, 'failed': 2},
+    ]
+    assert calls == [2, 2, 1]
+    transaction.abort()
+    assert sorted(t.title for t in dbsession.query(Topic)) == ['Imported 1', 'Imported 2', 'Imported 5']
+
+
+def test_imported_topics_are_searchable(admin_request, dbsession, monkeypatch):
+    monkeypatch.setattr(search, 'index', InvertedIndex())
+    search_topics('anything', 10)  # build the (empty) index first
+    _report(bulk.import_topics(admin_request('/api/topics/import', _lines(_topic(1), _topic(2)))))
+    assert len(search_topics('imported', 10)) == 2
+
+
+def test_export_round_trip(admin_request, dbsession):
+    _report(bulk.import_topics(admin_request('/api/topics/import', _lines(
+        _topic(1, created_at='2024-01-01T10:00:00'), _topic(2)))))
+    response = bulk.export_topics(admin_request('/api/topics/export'))
+    assert response.content_type == bulk.NDJSON
+    rows = _report(response)
+    assert [row['title'] for row in rows] == ['Imported 1', 'Imported 2']
+    assert rows[0]['created_at'] == '2024-01-01T10:00:00'
+    assert rows[0]['updated_at'] == rows[0]['created_at']
+
+    # and back in: the exported ids are ignored, new rows are added
+    body = b''.join(json.dumps(row).encode('utf-8') + b'\n' for row in rows)
+    assert _report(bulk.import_topics(admin_request('/api/topics/import', body)))[-1]['inserted'] == 2
+    transaction.abort()
+    assert dbsession.query(Topic).count() == 4
@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+import transaction
+
+from forum import cache as cache_module
+from forum import identity
+from forum.cache import MemoryBackend, RedisBackend, TaggedCache, invalidate
+from forum.identity import configure_identity_cache, invalidate_identity, load_identity
+from forum.models.topic import Topic
+from forum.models.user import User
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def backend(request):
+    if request.param == 'memory':
+        return MemoryBackend()
+    backend = RedisBackend('fakeredis://', prefix='test:')
+    backend.client.flushall()
+    return backend
+
+
+@pytest.fixture
+def cache(backend, monkeypatch):
+    cache = TaggedCache(backend, default_ttl=60)
+    monkeypatch.setattr(cache_module, 'cache', cache)
+    return cache
+
+
+class Creator:
+    def __init__(self, value=None):
+        self.calls = 0
+        self.value = value
+
+    def __call__(self):
+        self.calls += 1
+        return self.value if self.value is not None else {'call': self.calls}
+
+
+def test_cached_until_a_tag_is_bumped(cache):
+    creator = Creator()
+    assert cache.get_or_create('topic:1', creator, tags=['topic:1', 'topics']) == {'call': 1}
+    assert cache.get_or_create('topic:1', creator, tags=['topic:1', 'topics']) == {'call': 1}
+    cache.invalidate_tags('topics')
+    assert cache.get_or_create('topic:1', creator, tags=['topic:1', 'topics']) == {'call': 2}
+    cache.invalidate_tags('topic:2')
+    assert cache.get_or_create('topic:1', creator, tags=['topic:1', 'topics']) == {'call': 2}
+    assert cache.tag_version('topics') == 1
+
+
+def test_entries_expire(cache):
+    creator = Creator()
+    cache.get_or_create('k', creator, ttl=1)
+    time.sleep(1.1)
+    cache.get_or_create('k', creator, ttl=1)
+    assert creator.calls == 2
+
+
+def test_concurrent_misses_compute_once(cache):
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_create('k', slow)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['value'] * 5
+    assert len(calls) == 1
+
+
+def test_tags_are_bumped_on_commit_only(dbsession, cache):
+    dbsession.add(Topic(title='Sephiroth', content='One-winged angel', username='zack'))
+    transaction.commit()
+    topic_id = dbsession.query(Topic.id).scalar()
+    assert cache.tag_version('topic:%d' % topic_id) == 1
+
+    dbsession.get(Topic, topic_id).title = 'Genesis'
+    dbsession.flush()
+    assert cache.tag_version('topic:%d' % topic_id) == 1
+    transaction.commit()
+    assert cache.tag_version('topic:%d' % topic_id) == 2
+    assert cache.tag_version('topics') == 2
+
+    invalidate('table:topics')
+    dbsession.query(Topic).filter(Topic.id == topic_id).update({Topic.title: 'Angeal'})
+    transaction.abort()
+    assert cache.tag_version('table:topics') == 0
+    assert 'cache_tags' not in dbsession().info
+
+
+def test_identity_follows_the_shared_user_tag(dbsession, cache):
+    configure_identity_cache({})
+    dbsession.add(User(username='vincent', email='vincent@example.com', password='x'))
+    transaction.commit()
+    user_id = dbsession.query(User.id).scalar()
+    assert load_identity(user_id).username == 'vincent'
+
+    # another process renames the user and bumps the tag; our local entry
+    # is still there, but stale
+    dbsession.query(User).filter(User.id == user_id).update({User.username: 'valentine'})
+    transaction.commit()
+    cache.invalidate_tags('user:%d' % user_id)
+    assert identity.identity_cache.get(user_id) is not None
+    assert load_identity(user_id).username == 'valentine'
+
+    dbsession.query(User).filter(User.id == user_id).update({User.username: 'chaos'})
+    invalidate_identity(user_id)
+    transaction.commit()
+    assert cache.tag_version('user:%d' % user_id) == 3
+    assert load_identity(user_id).username == 'chaos'
+
+
+def test_detail_cached_and_invalidated(testapp):
+    testapp.post_json('/signup', {'username': 'reeve_t', 'email': 'reeve@example.com',
+                                  'password': 'secret123'})
+    token = testapp.post_json('/login', {'email': 'reeve@example.com',
+                                         'password': 'secret123'}).json['token']
+    headers = {'Authorization': 'Bearer %s' % token}
+    topic = testapp.post_json('/api/topics', {'title': 'Cait Sith', 'content': 'Fortunes',
+                                              'username': 'reeve_t'}, headers=headers).json
+
+    url = '/api/topics/%d' % topic['id']
+    assert testapp.get(url).json['title'] == 'Cait Sith'
+    assert testapp.get('/api/get-topics?limit=5').json['topics'][0]['title'] == 'Cait Sith'
+    testapp.put_json(url, {'title': 'Shinra'}, headers=headers)
+    assert testapp.get(url).json['title'] == 'Shinra'
+    assert testapp.get('/api/get-topics?limit=5').json['topics'][0]['title'] == 'Shinra'
+
+    # replies move reply_count through a bulk update, on every cached page
+    mine = '/api/user/topics'
+    assert testapp.get(mine, headers=headers).json['topics'][0]['reply_count'] == 0
+    testapp.post_json(url + '/posts', {'content': 'Mog!'}, headers=headers)
+    assert testapp.get(url).json['reply_count'] == 1
+    assert testapp.get('/api/get-topics?limit=5').json['topics'][0]['reply_count'] == 1
+    assert testapp.get(mine, headers=headers).json['topics'][0]['reply_count'] == 1
@@ -0,0 +1,88 @@
+import gzip
+import json
+
+import pytest
+from webob import Request
+
+from forum import counters
+from forum.security import compressed_cache, negotiate_encoding
+
+from .test_app import _login
+
+
+@pytest.mark.parametrize('header, available, expected', [
+    ('gzip, br', ('br', 'zstd', 'gzip'), 'br'),
+    ('gzip, deflate', ('br', 'zstd', 'gzip'), 'gzip'),
+    ('gzip;q=1.0, br;q=0.5', ('br', 'zstd', 'gzip'), 'gzip'),
+    ('br, gzip', ('gzip',), 'gzip'),
+    ('*', ('br', 'zstd', 'gzip'), 'br'),
+    ('*;q=0.1, gzip', ('br', 'gzip'), 'gzip'),
+    ('br;q=0, gzip;q=0', ('br', 'gzip'), None),
+    ('br;q=oops, GZIP', ('br', 'gzip'), 'gzip'),
+    ('identity', ('br', 'gzip'), None),
+    ('', ('br', 'gzip'), None),
+    (None, ('br', 'gzip'), None),
+])
+def test_negotiate_encoding(header, available, expected):
+    assert negotiate_encoding(header, available) == expected
+
+
+@pytest.fixture
+def app_settings(app_settings):
+    return dict(app_settings, **{'forum.views.flush_interval': '3600'})
+
+
+@pytest.fixture
+def topic_id(testapp):
+    compressed_cache.clear()
+    headers = _login(testapp, 'tifa_lockhart')
+    return testapp.post_json('/api/topics', {
+        'title': '7th Heaven', 'content': 'Drinks menu. ' * 200, 'username': 'tifa_lockhart',
+    }, headers=headers).json['id']
+
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+def _get(testapp, path, headers=GZIP):
+    # WebTest decodes gzip bodies itself, so the app is called directly
+    return Request.blank(path, headers=headers).get_response(testapp.app)
+
+
+def test_buffered_body(testapp, topic_id):
+    plain = testapp.get('/api/topics/%d' % topic_id)
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    response = _get(testapp, '/api/topics/%d' % topic_id)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == 'W/' + plain.headers['ETag']
+    assert json.loads(gzip.decompress(response.body)) == plain.json
+    assert len(response.body) < len(plain.body)
+    assert len(compressed_cache) == 1
+
+    # the weak ETag still revalidates
+    revalidated = _get(testapp, '/api/topics/%d' % topic_id, dict(GZIP, **{'If-None-Match': response.headers['ETag']}))
+    assert revalidated.status_int == 304
+    # small bodies are left alone
+    assert 'Content-Encoding' not in _get(testapp, '/api/topics/trending').headers
+
+
+def test_cache_key_is_the_body(testapp, topic_id):
+    first = _get(testapp, '/api/topics/%d' % topic_id)
+    _get(testapp, '/api/topics/%d' % topic_id)
+    assert len(compressed_cache) == 1
+
+    counters.buffer.flush()
+    # new view count, new body: not the cached bytes of the old one
+    again = json.loads(gzip.decompress(_get(testapp, '/api/topics/%d' % topic_id).body))
+    assert again['views'] == json.loads(gzip.decompress(first.body))['views'] + 2
+    assert len(compressed_cache) == 2
+
+
+def test_streamed_listing(testapp, topic_id):
+    plain = testapp.get('/api/get-topics')
+    response = _get(testapp, '/api/get-topics')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert gzip.decompress(response.body) == plain.body
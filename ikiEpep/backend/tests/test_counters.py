@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from forum import counters
+from forum.models.topic import Topic
+
+from .test_app import _login
+
+
+@pytest.fixture
+def app_settings(app_settings):
+    # the tests flush the buffer themselves
+    return dict(app_settings, **{'forum.views.flush_interval': '3600'})
+
+
+def test_flush_views_adds_up_and_keeps_updated_at(engine):
+    at = datetime(2026, 5, 1)
+    with engine.begin() as conn:
+        first, second = [
+            conn.execute(Topic.__table__.insert().values(
+                title=title, content='...', username='barret', created_at=at, updated_at=at,
+            )).inserted_primary_key[0]
+            for title in ('Sector 7', 'Corel')
+        ]
+
+    counters.flush_views(engine, {first: 3, second: 1})
+    counters.flush_views(engine, {first: 2})
+    with engine.connect() as conn:
+        rows = dict(conn.execute(select(Topic.id, Topic.views)).all())
+        updated = set(conn.execute(select(Topic.updated_at)).scalars())
+    assert rows == {first: 5, second: 1}
+    assert updated == {at}
+
+
+def test_views_validators_move_last_modified_to_the_bucket():
+    bucket, last_modified = counters.views_validators(datetime(2000, 1, 1))
+    assert last_modified == datetime.utcfromtimestamp(bucket * counters.VIEWS_VALIDATOR_SECONDS)
+    future = datetime(2100, 1, 1)
+    assert counters.views_validators(future) == (bucket, future)
+
+
+def test_detail_shows_flushed_views(testapp):
+    headers = _login(testapp, 'barret')
+    topic_id = testapp.post_json('/api/topics', {'title': 'Avalanche', 'content': 'Meeting', 'username': 'barret'},
+                                 headers=headers).json['id']
+
+    first = testapp.get('/api/topics/%d' % topic_id)
+    second = testapp.get('/api/topics/%d' % topic_id, headers={'If-None-Match': first.headers['ETag']}, status=304)
+    assert first.json['views'] == 0
+    assert counters.buffer.stats()['pending_keys'] == 1
+
+    assert counters.buffer.flush() == 1
+    # the flush bumped topic:<id>, so the cached payload is rebuilt
+    third = testapp.get('/api/topics/%d' % topic_id, headers={'If-None-Match': second.headers['ETag']})
+    assert third.status_int == 200
+    assert third.json['views'] == 2
+    assert third.json['updated_at'] == first.json['updated_at']
+    assert 'forum_writebehind_pending_keys{buffer="topic_views"} 1' in testapp.get('/metrics').text
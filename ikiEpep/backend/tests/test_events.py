@@ -0,0 +1,147 @@
+import time
+
+import fakeredis
+import pytest
+from webob import Request
+
+from forum import sse
+from forum.events import EventHub, RedisBridge
+
+from .test_app import _login
+
+
+def _ids(events):
+    return [event.id for event in events]
+
+
+def _hub(history=1000, queue_size=100, published=0):
+    hub = EventHub(history=history, queue_size=queue_size)
+    for i in range(published):
+        hub.publish('topic.updated', {'id': i})
+    return hub
+
+
+def test_subscribe_without_last_event_id():
+    subscriber, backlog, complete = _hub(published=3).subscribe(lambda: None)
+    assert (backlog, complete) == ([], True)
+
+
+def test_subscribe_resumes_from_ring_buffer():
+    _, backlog, complete = _hub(published=3).subscribe(lambda: None, last_event_id=1)
+    assert _ids(backlog) == [2, 3]
+    assert complete
+
+
+def test_subscribe_up_to_date():
+    _, backlog, complete = _hub(published=3).subscribe(lambda: None, last_event_id=3)
+    assert (backlog, complete) == ([], True)
+
+
+def test_subscribe_too_far_behind():
+    _, backlog, complete = _hub(history=2, published=5).subscribe(lambda: None, last_event_id=1)
+    assert _ids(backlog) == [4, 5]
+    assert not complete
+
+
+def test_subscribe_just_within_ring_buffer():
+    _, backlog, complete = _hub(history=2, published=5).subscribe(lambda: None, last_event_id=3)
+    assert _ids(backlog) == [4, 5]
+    assert complete
+
+
+def test_subscribe_from_the_future():
+    # e.g. the id came from before a restart of a memory-backed hub
+    _, backlog, complete = _hub(published=2).subscribe(lambda: None, last_event_id=10)
+    assert (backlog, complete) == ([], False)
+
+
+def test_publish_reaches_subscribers():
+    hub, notified = _hub(), []
+    subscriber, _, _ = hub.subscribe(lambda: notified.append(1))
+    hub.publish('topic.created', {'id': 7})
+    assert notified == [1]
+    [event] = subscriber.drain()
+    assert (event.id, event.type, event.data) == (1, 'topic.created', '{"id":7}')
+
+
+def test_publish_ignores_old_ids():
+    hub = _hub()
+    hub.publish('a', {}, event_id=5)
+    hub.publish('b', {}, event_id=4)
+    hub.publish('c', {}, event_id=5)
+    assert hub.last_id == 5
+    assert hub.stats()['published'] == 1
+
+
+def test_slow_subscriber_is_dropped():
+    hub = _hub(queue_size=2)
+    subscriber, _, _ = hub.subscribe(lambda: None)
+    for i in range(3):
+        hub.publish('topic.updated', {'id': i})
+    assert subscriber.dropped
+    assert hub.stats()['subscribers'] == 0
+    assert hub.stats()['dropped'] == 1
+
+
+def test_redis_ids_are_shared_between_processes():
+    server = fakeredis.FakeServer()
+    hubs = [EventHub(), EventHub()]
+    bridges = [RedisBridge(hub, client=fakeredis.FakeRedis(server=server)) for hub in hubs]
+    subscribers = [hub.subscribe(lambda: None)[0] for hub in hubs]
+    for bridge in bridges:
+        bridge.ensure_listening()
+    time.sleep(0.2)  # let both listeners subscribe
+
+    bridges[0].publish('topic.created', {'id': 1})
+    bridges[1].publish('topic.updated', {'id': 1})
+    deadline = time.monotonic() + 5
+    while any(hub.last_id < 2 for hub in hubs) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for subscriber in subscribers:
+        assert [(event.id, event.type) for event in subscriber.drain()] == [(1, 'topic.created'), (2, 'topic.updated')]
+
+
+@pytest.fixture
+def app_settings(app_settings):
+    return dict(app_settings, **{'forum.sse.thread_seconds': '0.1'})
+
+
+def _open_stream(testapp, **headers):
+    # Called as plain WSGI so the body stays open until it is closed
+    status = []
+    environ = Request.blank('/api/topics/stream', headers=headers).environ
+    app_iter = testapp.app(environ, lambda s, h, exc_info=None: status.append(s))
+    return status[0], app_iter
+
+
+def test_stream_replays_committed_events(testapp):
+    headers = _login(testapp, 'vincent')
+    topic_id = testapp.post_json('/api/topics', {'title': 'Coffin', 'content': 'Nibelheim', 'username': 'vincent'},
+                                 headers=headers).json['id']
+    testapp.delete('/api/topics/%d' % topic_id, headers=headers)
+    # a rejected topic is never committed, so never announced
+    testapp.post_json('/api/topics', {'title': 'No content'}, headers=headers, status=400)
+
+    status, app_iter = _open_stream(testapp, **{'Last-Event-ID': '0'})
+    body = b''.join(app_iter)
+    app_iter.close()
+    assert status == '200 OK'
+    assert body.startswith(b'retry: ')
+    assert b'id: 1\nevent: topic.created\n' in body
+    assert b'id: 2\nevent: topic.deleted\ndata: {"id":%d}' % topic_id in body
+    assert b'id: 3' not in body
+
+
+def test_fallback_streams_are_capped(testapp):
+    _, held = _open_stream(testapp)
+    # the one thread stream is taken: the next client is told to retry later
+    status, busy = _open_stream(testapp)
+    assert status == '200 OK'
+    assert b''.join(busy) == b'retry: %d\n\n' % (100 + sse.RETRY_MS)
+    busy.close()
+
+    held.close()
+    _, again = _open_stream(testapp)
+    assert b''.join(again).startswith(b'retry: %d\n\n' % sse.RETRY_MS)
+    again.close()
+    assert sse.thread_streams.count == 0
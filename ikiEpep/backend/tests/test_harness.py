@@ -0,0 +1,41 @@
+import json
+
+from benchmarks import harness
+
+
+def _results(**scenarios):
+    return {'scenarios': scenarios}
+
+
+def test_compare_flags_regressions_only():
+    baseline = _results(login={'requests_per_second': 100.0, 'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 0})
+    faster = _results(login={'requests_per_second': 130.0, 'p50_ms': 8.0, 'p95_ms': 23.0, 'p99_ms': 5.0})
+    assert harness.compare(faster, baseline, 0.2) == []
+
+    slower = _results(login={'requests_per_second': 70.0, 'p50_ms': 13.0, 'p95_ms': 20.0, 'p99_ms': 5.0},
+                      topics_page={'requests_per_second': 1.0})
+    assert harness.compare(slower, baseline, 0.2) == [
+        'login requests_per_second: 100.0 -> 70.0 (-30%)',
+        'login p50_ms: 10.0 -> 13.0 (+30%)',
+    ]
+
+
+def test_tiny_run_against_its_own_baseline(tmp_path, capsys):
+    argv = [
+        'harness', '--database-url', 'sqlite:///%s' % (tmp_path / 'bench.sqlite'),
+        '--users', '5', '--topics', '30', '--bcrypt-rounds', '4',
+        '--requests', '6', '--warmup', '1', '--concurrency', '2',
+        '--save-baseline', str(tmp_path / 'baseline.json'),
+    ]
+    assert harness.main_cli(argv) == 0
+    results = json.loads(capsys.readouterr().out)
+    assert results['meta']['topics'] == 30
+    assert set(results['scenarios']) == {'login', 'topics_page', 'topic_detail', 'create_topic'}
+    for scenario in results['scenarios'].values():
+        assert (scenario['requests'], scenario['errors']) == (6, 0)
+
+    # the database is reused, and a run never regresses against itself
+    # by more than an absurd tolerance
+    argv = argv[:-2] + ['--scenario', 'topic_detail', '--baseline', str(tmp_path / 'baseline.json'),
+                        '--tolerance', '1000']
+    assert harness.main_cli(argv) == 0
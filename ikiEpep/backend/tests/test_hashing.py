@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from forum.hashing import HashingPool, HashingPoolBusy
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(**kwargs):
+        kwargs.setdefault('rounds', 4)
+        pools.append(HashingPool(**kwargs))
+        return pools[-1]
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+@pytest.mark.parametrize('workers', [0, 1])
+def test_hash_and_verify(make_pool, workers):
+    pool = make_pool(workers=workers)
+    hashed = pool.hash_password('highwind')
+    assert hashed.startswith('$2b$04$')
+    assert pool.verify_password('highwind', hashed)
+    assert not pool.verify_password('lowwind', hashed)
+
+
+def test_full_pool_fails_fast(make_pool):
+    pool = make_pool(workers=1, max_pending=1)
+    pool.hash_password('warm up')  # start the worker process
+    busy = threading.Thread(target=pool._run, args=(time.sleep, 1.0))
+    busy.start()
+    time.sleep(0.2)
+    started = time.monotonic()
+    with pytest.raises(HashingPoolBusy):
+        pool.hash_password('second')
+    assert time.monotonic() - started < 0.5
+    busy.join()
+    assert pool.verify_password('second', pool.hash_password('second'))
+
+
+def test_timed_out_job_keeps_its_slot(make_pool):
+    pool = make_pool(workers=1, max_pending=1, timeout=0.2)
+    pool.hash_password('warm up')
+    with pytest.raises(HashingPoolBusy):
+        pool._run(time.sleep, 1.0)
+    # the sleep is still running in the worker, so nothing else is admitted
+    with pytest.raises(HashingPoolBusy):
+        pool._run(time.sleep, 0)
+    time.sleep(1.2)
+    assert pool._run(time.sleep, 0) is None
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import transaction
+from pyramid.httpexceptions import HTTPNotModified
+
+from forum.httpcache import is_not_modified
+from forum.models.topic import Topic
+from forum.views.topic import topic_detail_api_view, topics_api_view
+
+MODIFIED = datetime(2024, 5, 1, 12, 0, 0, 500000)
+
+
+class FakeRequest:
+    def __init__(self, headers=None, if_modified_since=None):
+        self.headers = headers or {}
+        self.if_modified_since = if_modified_since
+
+
+@pytest.mark.parametrize('header', ['"abc"', 'W/"abc"', '"x", "abc"', '*'])
+def test_if_none_match_hit(header):
+    assert is_not_modified(FakeRequest({'If-None-Match': header}), 'abc')
+
+
+def test_if_none_match_miss():
+    assert not is_not_modified(FakeRequest({'If-None-Match': '"x"'}), 'abc')
+
+
+def test_if_none_match_wins_over_if_modified_since():
+    request = FakeRequest({'If-None-Match': '"x"'}, datetime(2030, 1, 1, tzinfo=timezone.utc))
+    assert not is_not_modified(request, 'abc', MODIFIED)
+
+
+def test_if_modified_since_ignores_microseconds():
+    request = FakeRequest(if_modified_since=datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc))
+    assert is_not_modified(request, 'abc', MODIFIED)
+
+
+def test_if_modified_since_older():
+    request = FakeRequest(if_modified_since=datetime(2024, 5, 1, 11, 59, 59, tzinfo=timezone.utc))
+    assert not is_not_modified(request, 'abc', MODIFIED)
+
+
+def test_unconditional():
+    assert not is_not_modified(FakeRequest(), 'abc', MODIFIED)
+    request = FakeRequest(if_modified_since=datetime(2024, 5, 1, tzinfo=timezone.utc))
+    assert not is_not_modified(request, 'abc')
+
+
+@pytest.fixture
+def topic_id(dbsession):
+    dbsession.add(Topic(title='Chocobo racing', content='Gold Saucer tips', username='cid',
+                        created_at=MODIFIED, updated_at=MODIFIED))
+    transaction.commit()
+    return dbsession.query(Topic.id).scalar()
+
+
+def _detail(make_request, topic_id, **headers):
+    request = make_request('/api/topics/%d' % topic_id, headers=headers)
+    request.matchdict = {'topic_id': str(topic_id)}
+    return request, topic_detail_api_view(request)
+
+
+def test_detail_revalidation(make_request, dbsession, topic_id):
+    request, payload = _detail(make_request, topic_id)
+    assert payload['title'] == 'Chocobo racing'
+    etag = request.response.etag
+    assert etag and request.response.headers['Cache-Control'] == 'no-cache'
+
+    _, response = _detail(make_request, topic_id, **{'If-None-Match': '"%s"' % etag})
+    assert isinstance(response, HTTPNotModified)
+    assert response.etag == etag
+
+    topic = dbsession.get(Topic, topic_id)
+    topic.content = 'Gold Saucer tips, revised'
+    topic.updated_at = MODIFIED + timedelta(minutes=1)
+    transaction.commit()
+    _, payload = _detail(make_request, topic_id, **{'If-None-Match': '"%s"' % etag})
+    assert payload['content'] == 'Gold Saucer tips, revised'
+
+
+def test_detail_if_modified_since(make_request, dbsession, topic_id):
+    # Last-Modified is the start of the current view count bucket, not the
+    # older updated_at (see counters.views_validators)
+    request, _ = _detail(make_request, topic_id)
+    last_modified = request.response.headers['Last-Modified']
+    _, response = _detail(make_request, topic_id, **{'If-Modified-Since': 'Wed, 01 May 2024 12:00:00 GMT'})
+    assert not isinstance(response, HTTPNotModified)
+    _, response = _detail(make_request, topic_id, **{'If-Modified-Since': last_modified})
+    assert isinstance(response, HTTPNotModified)
+
+
+def test_listing_etag_moves_with_new_topics(make_request, dbsession, topic_id):
+    request = make_request('/api/get-topics?limit=10')
+    topics_api_view(request)
+    etag = request.response.etag
+
+    request = make_request('/api/get-topics?limit=10', headers={'If-None-Match': '"%s"' % etag})
+    assert isinstance(topics_api_view(request), HTTPNotModified)
+
+    dbsession.add(Topic(title='Another', content='...', username='cid'))
+    transaction.commit()
+    request = make_request('/api/get-topics?limit=10', headers={'If-None-Match': '"%s"' % etag})
+    assert len(topics_api_view(request)['topics']) == 2
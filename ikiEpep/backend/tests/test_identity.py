@@ -0,0 +1,54 @@
+import pytest
+import transaction
+
+from forum import identity
+from forum.identity import configure_identity_cache, invalidate_identity, load_identity
+from forum.models.user import User
+
+
+@pytest.fixture
+def user_id(dbsession):
+    configure_identity_cache({})
+    dbsession.add(User(username='tifa', email='tifa@example.com', password='x'))
+    transaction.commit()
+    return dbsession.query(User.id).scalar()
+
+
+def _rename(dbsession, user_id, username):
+    dbsession.query(User).filter(User.id == user_id).update({User.username: username})
+
+
+def test_identity_is_cached(dbsession, user_id):
+    assert load_identity(user_id).username == 'tifa'
+    _rename(dbsession, user_id, 'lockhart')
+    assert load_identity(user_id).username == 'tifa'
+
+
+def test_unknown_user(dbsession, user_id):
+    assert load_identity(user_id + 1) is None
+
+
+def test_invalidated_after_commit(dbsession, user_id):
+    load_identity(user_id)
+    _rename(dbsession, user_id, 'lockhart')
+    invalidate_identity(user_id)
+    # not before the commit: a concurrent request would cache the old row
+    assert identity.identity_cache.get(user_id) is not None
+    transaction.commit()
+    assert identity.identity_cache.get(user_id) is None
+    assert load_identity(user_id).username == 'lockhart'
+
+
+def test_rollback_keeps_entry(dbsession, user_id):
+    load_identity(user_id)
+    invalidate_identity(user_id)
+    transaction.abort()
+    assert identity.identity_cache.get(user_id) is not None
+    assert 'identity_ids' not in dbsession().info
+
+
+def test_ttl_zero_disables_the_cache(dbsession, user_id):
+    configure_identity_cache({'forum.identity_cache.ttl': '0'})
+    load_identity(user_id)
+    _rename(dbsession, user_id, 'lockhart')
+    assert load_identity(user_id).username == 'lockhart'
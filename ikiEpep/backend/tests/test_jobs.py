@@ -0,0 +1,125 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+import transaction
+
+from forum import jobs, search
+from forum.identity import Identity
+from forum.models.job import Job
+from forum.models.topic import Topic
+from forum.models.user import User
+from forum.views.user import delete_account
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    calls = []
+
+    def delete_file(file_id):
+        calls.append(file_id)
+        if file_id.startswith('broken'):
+            raise IOError('ImageKit is down')
+
+    monkeypatch.setitem(jobs.HANDLERS, 'imagekit.delete_file', delete_file)
+    return calls
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def _jobs(dbsession):
+    dbsession.expire_all()
+    return {json.loads(job.payload)['file_id']: job for job in dbsession.query(Job)}
+
+
+def test_enqueue_commits_with_the_caller(dbsession):
+    assert jobs.enqueue_many('imagekit.delete_file', [{'file_id': 'a'}, {'file_id': 'b'}]) == 2
+    transaction.commit()
+    assert set(_jobs(dbsession)) == {'a', 'b'}
+
+    jobs.enqueue('imagekit.delete_file', file_id='c')
+    transaction.abort()
+    assert set(_jobs(dbsession)) == {'a', 'b'}
+
+
+def test_enqueue_rejects_unknown_kinds(dbsession):
+    with pytest.raises(ValueError):
+        jobs.enqueue('mail.send', to='cid@example.com')
+    assert jobs.enqueue_many('imagekit.delete_file', []) == 0
+
+
+def test_run_batch(dbsession, handler, executor):
+    jobs.enqueue_many('imagekit.delete_file', [{'file_id': 'ok'}, {'file_id': 'broken'}])
+    transaction.commit()
+
+    assert jobs.run_batch(executor, 10) == 2
+    assert sorted(handler) == ['broken', 'ok']
+    done = _jobs(dbsession)
+    assert done['ok'].status == 'done'
+    assert done['broken'].status == 'pending'
+    assert done['broken'].attempts == 1
+    assert 'ImageKit is down' in done['broken'].last_error
+    # retried with a backoff, not on the next poll
+    assert done['broken'].run_after > datetime.utcnow()
+    assert jobs.run_batch(executor, 10) == 0
+
+
+def test_failing_job_ends_up_dead(dbsession, handler, executor):
+    jobs.enqueue('imagekit.delete_file', file_id='broken')
+    transaction.commit()
+
+    for attempt in range(2):
+        dbsession.query(Job).update({Job.run_after: datetime.utcnow() - timedelta(seconds=1)})
+        transaction.commit()
+        assert jobs.run_batch(executor, 10, max_attempts=2) == 1
+    job = _jobs(dbsession)['broken']
+    assert (job.status, job.attempts) == ('dead', 2)
+
+
+def test_expired_lease_is_claimed_again(dbsession, handler):
+    jobs.enqueue('imagekit.delete_file', file_id='ok')
+    transaction.commit()
+    assert len(jobs.claim(10)) == 1
+    # the worker holding the lease died
+    assert jobs.claim(10) == []
+    dbsession.query(Job).update({Job.run_after: datetime.utcnow() - timedelta(seconds=1)})
+    transaction.commit()
+    [(job_id, kind, payload, attempts)] = jobs.claim(10)
+    assert (kind, payload, attempts) == ('imagekit.delete_file', {'file_id': 'ok'}, 2)
+
+
+def test_delete_account_queues_image_cleanup(dbsession, make_request, monkeypatch):
+    monkeypatch.setattr(search, 'index', search.InvertedIndex())
+    barret = User(username='barret', email='barret@example.com', password='x')
+    aerith = User(username='aerith', email='aerith@example.com', password='x')
+    dbsession.add_all([barret, aerith])
+    dbsession.flush()
+    dbsession.add_all([
+        Topic(title='Gun arm', content='upgrades', username='barret', user_id=barret.id,
+              imagekit_file_id='img-1'),
+        Topic(title='Avalanche', content='meeting', username='barret', user_id=barret.id),
+        Topic(title='Flowers', content='for sale', username='aerith', user_id=aerith.id,
+              imagekit_file_id='img-2'),
+    ])
+    transaction.commit()
+    search.index.load(dbsession())
+    user = dbsession.query(User).filter_by(username='barret').one()
+
+    request = make_request('/api/account', method='DELETE')
+    request.user = Identity(user.id, user.username, user.email)
+    response = delete_account(request)
+    transaction.commit()
+
+    assert response.status_code == 202
+    assert response.json_body['pending_cleanup_jobs'] == 1
+    assert set(_jobs(dbsession)) == {'img-1'}
+    assert [t.username for t in dbsession.query(Topic)] == ['aerith']
+    assert [u.username for u in dbsession.query(User)] == ['aerith']
+    # the set-based DELETE bypasses the flush hooks; the index follows anyway
+    assert search.index.search('avalanche', 10) == []
+    assert len(search.index.search('flowers', 10)) == 1
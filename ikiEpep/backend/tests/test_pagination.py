@@ -0,0 +1,95 @@
+from datetime import datetime
+from urllib.parse import urlencode
+
+import pytest
+import transaction
+
+from forum.models.topic import Topic
+from forum.pagination import MAX_LIMIT, InvalidCursor, decode_cursor, encode_cursor, parse_limit
+from forum.views.topic import EXCERPT_LENGTH, topics_api_view
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(T0, 42)
+    assert '=' not in token
+    assert decode_cursor(token, datetime, int) == (T0, 42)
+
+
+@pytest.mark.parametrize('token', ['', 'not base64!', encode_cursor(1), encode_cursor('x', 1)])
+def test_decode_cursor_rejects(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, datetime, int)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, 20), ('', 20), ('5', 5), ('0', 1), ('-3', 1), ('100000', MAX_LIMIT),
+])
+def test_parse_limit(value, expected):
+    assert parse_limit(value) == expected
+
+
+def test_parse_limit_rejects_garbage():
+    with pytest.raises(InvalidCursor):
+        parse_limit('ten')
+
+
+def _seed(dbsession):
+    # two topics share a created_at, so the id has to break the tie
+    times = [T0.replace(hour=h) for h in (1, 2, 3, 3, 4, 5, 6)]
+    for n, created_at in enumerate(times):
+        dbsession.add(Topic(title='Topic %d' % n, content='x' * 500, username='cloud',
+                            created_at=created_at, updated_at=created_at))
+    dbsession.flush()
+    return [t.id for t in dbsession.query(Topic).order_by(Topic.created_at.desc(), Topic.id.desc())]
+
+
+@pytest.fixture
+def get_page(make_request):
+    def get_page(params):
+        return topics_api_view(make_request('/api/get-topics?' + urlencode(params)))
+    return get_page
+
+
+def test_pages_walk_every_topic_once(get_page, dbsession):
+    expected = _seed(dbsession)
+    seen, params = [], {'limit': '3'}
+    while True:
+        page = get_page(params)
+        assert len(page['topics']) <= 3
+        seen.extend(topic['id'] for topic in page['topics'])
+        if page['next_cursor'] is None:
+            break
+        params = {'limit': '3', 'cursor': page['next_cursor']}
+    assert seen == expected
+
+
+def test_page_holds_summaries(get_page, dbsession):
+    _seed(dbsession)
+    [topic] = get_page({'limit': '1'})['topics']
+    assert topic['title'] == 'Topic 6'
+    assert len(topic['excerpt']) == EXCERPT_LENGTH
+    assert 'content' not in topic
+
+
+def test_last_page_has_no_cursor(get_page, dbsession):
+    expected = _seed(dbsession)
+    page = get_page({'limit': str(len(expected))})
+    assert [topic['id'] for topic in page['topics']] == expected
+    assert page['next_cursor'] is None
+
+
+def test_bad_cursor_is_a_400(make_request, dbsession):
+    request = make_request('/api/get-topics?cursor=garbage')
+    assert topics_api_view(request) == {'error': 'Invalid cursor'}
+    assert request.response.status_code == 400
+
+
+def test_without_paging_params_everything_is_listed(testapp, dbsession):
+    expected = _seed(dbsession)
+    transaction.commit()
+    # streamed by the json_stream renderer, in chunks
+    response = testapp.get('/api/get-topics')
+    assert response.content_type == 'application/json'
+    assert sorted(topic['id'] for topic in response.json) == sorted(expected)
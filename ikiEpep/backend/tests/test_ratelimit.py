@@ -0,0 +1,154 @@
+from types import SimpleNamespace
+
+import pytest
+from pyramid.exceptions import ConfigurationError
+from pyramid.response import Response
+
+from forum.ratelimit import (
+    Limit,
+    MemoryStore,
+    RedisStore,
+    make_limiter,
+    parse_limit,
+    ratelimit_tween_factory,
+)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('10/minute', Limit(10, 60.0)),
+    ('10/minutes', Limit(10, 60.0)),
+    ('3/Hours', Limit(3, 3600.0)),
+    ('5/30', Limit(5, 30.0)),
+    ('5 / s', Limit(5, 1.0)),
+    ('2', Limit(2, 1.0)),
+])
+def test_parse_limit(value, expected):
+    assert parse_limit(value) == expected
+
+
+@pytest.mark.parametrize('value', ['off', 'OFF', 'none', '0', ''])
+def test_parse_limit_off(value):
+    assert parse_limit(value) is None
+
+
+@pytest.mark.parametrize('value', ['10/fortnight', 'ten/minute', '5/0'])
+def test_parse_limit_rejects(value):
+    with pytest.raises(ValueError):
+        parse_limit(value)
+
+
+def test_make_limiter_names_bad_key():
+    with pytest.raises(ConfigurationError, match='forum.ratelimit.login'):
+        make_limiter({'forum.ratelimit.login': '5/fortnight'})
+
+
+# Both stores must make the same decisions; every scenario runs on each.
+
+@pytest.fixture(params=['memory', 'redis'])
+def store(request):
+    if request.param == 'memory':
+        return MemoryStore()
+    store = RedisStore('fakeredis://', prefix='test:rl:')
+    store.client.flushall()
+    return store
+
+
+LIMIT = Limit(2, 10)
+START = 1000.0  # the start of a 10 second window
+
+
+def test_limit_per_window(store):
+    assert store.hit(['a'], LIMIT, START) == (True, 0)
+    assert store.hit(['a'], LIMIT, START + 1) == (True, 0)
+    allowed, retry_after = store.hit(['a'], LIMIT, START + 2)
+    assert not allowed
+    assert retry_after == pytest.approx(8.0)
+    # other clients have their own counters
+    assert store.hit(['b'], LIMIT, START + 2) == (True, 0)
+
+
+def test_window_slides(store):
+    store.hit(['a'], LIMIT, START)
+    store.hit(['a'], LIMIT, START)
+    # halfway through the next window the previous one still weighs 2 * 0.5
+    assert store.hit(['a'], LIMIT, START + 15) == (True, 0)
+    allowed, retry_after = store.hit(['a'], LIMIT, START + 15)
+    assert not allowed
+    assert retry_after == pytest.approx(5.0)
+    assert store.hit(['a'], LIMIT, START + 15 + retry_after) == (True, 0)
+    # two windows later nothing is left
+    assert store.hit(['a'], LIMIT, START + 40) == (True, 0)
+    assert store.hit(['a'], LIMIT, START + 40) == (True, 0)
+
+
+def test_rejected_requests_are_not_counted(store):
+    store.hit(['a'], LIMIT, START)
+    store.hit(['a'], LIMIT, START)
+    for _ in range(5):
+        assert not store.hit(['a'], LIMIT, START + 1)[0]
+    # only the two accepted requests weigh on the next window
+    assert store.hit(['a'], LIMIT, START + 15) == (True, 0)
+
+
+def test_every_key_must_have_room(store):
+    store.hit(['ip:1'], LIMIT, START)
+    store.hit(['ip:1'], LIMIT, START)
+    allowed, retry_after = store.hit(['ip:1', 'user:7'], LIMIT, START + 1)
+    assert not allowed
+    assert retry_after == pytest.approx(9.0)
+    # the rejected request was not counted against the user either
+    assert store.hit(['ip:2', 'user:7'], LIMIT, START + 1) == (True, 0)
+    assert store.hit(['ip:3', 'user:7'], LIMIT, START + 1) == (True, 0)
+    assert not store.hit(['ip:4', 'user:7'], LIMIT, START + 1)[0]
+
+
+def _login(testapp, username):
+    email = '%s@example.com' % username
+    testapp.post_json('/signup', {'username': username, 'email': email, 'password': 'secret123'})
+    token = testapp.post_json('/login', {'email': email, 'password': 'secret123'}).json['token']
+    return {'Authorization': 'Bearer %s' % token}
+
+
+@pytest.fixture
+def app_settings(app_settings):
+    app_settings.update({
+        'forum.ratelimit.create_topic': '2/minute',
+        'forum.inflight.default': '4',
+    })
+    return app_settings
+
+
+def _post(testapp, username, headers, address, status='*'):
+    return testapp.post_json('/api/topics', {'title': 'Limit', 'content': 'x', 'username': username},
+                             headers=headers, extra_environ={'REMOTE_ADDR': address}, status=status)
+
+
+def test_user_and_address_are_both_limited(testapp):
+    yuffie, vincent = _login(testapp, 'yuffie_k'), _login(testapp, 'vincent_v')
+    assert _post(testapp, 'yuffie_k', yuffie, '10.0.0.1').status_int == 200
+    assert _post(testapp, 'yuffie_k', yuffie, '10.0.0.1').status_int == 200
+    # another account does not help the same address
+    rejected = _post(testapp, 'vincent_v', vincent, '10.0.0.1')
+    assert rejected.status_int == 429
+    assert 1 <= int(rejected.headers['Retry-After']) <= 60
+    assert rejected.json == {'error': 'Too many requests, slow down.'}
+    # nor does another address help the same user
+    assert _post(testapp, 'yuffie_k', yuffie, '10.0.0.2').status_int == 429
+    assert _post(testapp, 'vincent_v', vincent, '10.0.0.2').status_int == 200
+    assert 'forum_ratelimit_rejected_total{route="create_topic",reason="rate"} 2' in testapp.get('/metrics').text
+
+
+def test_streamed_body_holds_its_inflight_slot(config):
+    config.registry.settings['forum.inflight.get_topics'] = '1'
+    tween = ratelimit_tween_factory(
+        lambda request: Response(app_iter=(chunk for chunk in [b'[', b']'])), config.registry)
+    request = SimpleNamespace(matched_route=SimpleNamespace(name='get_topics'))
+    limiter = config.registry.ratelimiter
+
+    response = tween(request)
+    assert limiter.inflight.snapshot() == {'get_topics': 1}
+    # the body is produced after the view returned; a second request waits
+    assert tween(request).status_int == 503
+    assert b''.join(response.app_iter) == b'[]'
+    response.app_iter.close()
+    assert limiter.inflight.snapshot() == {'get_topics': 0}
@@ -0,0 +1,104 @@
+import pytest
+import transaction
+from sqlalchemy import create_engine, insert
+
+from forum import db
+from forum.cache import MemoryBackend, TaggedCache
+from forum.db import ReplicaSet
+from forum.models.meta import Base
+from forum.models.topic import Topic
+
+
+@pytest.fixture
+def replica(tmp_path):
+    engine = create_engine('sqlite:///%s' % (tmp_path / 'replica.sqlite'))
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def app_settings(app_settings, replica):
+    app_settings.update({
+        'sqlalchemy.replicas': str(replica.url),
+        'forum.replicas.sticky_seconds': '5',
+    })
+    return app_settings
+
+
+def _add_topic(engine, title):
+    # what replication would eventually do
+    with engine.begin() as conn:
+        conn.execute(insert(Topic.__table__), {'title': title, 'content': '...', 'username': 'cid'})
+
+
+def _titles(response):
+    return [topic['title'] for topic in response.json['topics']]
+
+
+def _login(testapp, username):
+    email = '%s@example.com' % username
+    testapp.post_json('/signup', {'username': username, 'email': email, 'password': 'secret123'})
+    token = testapp.post_json('/login', {'email': email, 'password': 'secret123'}).json['token']
+    return {'Authorization': 'Bearer %s' % token}
+
+
+def test_reads_go_to_the_replica(testapp, replica):
+    _add_topic(replica, 'Only on the replica')
+    assert _titles(testapp.get('/api/get-topics?limit=5')) == ['Only on the replica']
+
+
+def test_writers_read_their_own_writes(testapp, replica):
+    headers = _login(testapp, 'cid_highwind')
+    testapp.post_json('/api/topics', {'title': 'Written', 'content': '...', 'username': 'cid_highwind'},
+                      headers=headers)
+    # the writer is stuck to the primary for a while
+    assert _titles(testapp.get('/api/get-topics?limit=5', headers=headers)) == ['Written']
+    # everyone else still reads the (lagging) replica
+    assert _titles(testapp.get('/api/get-topics?limit=5&anonymous')) == []
+
+
+def test_routing_session(dbsession, replica):
+    _add_topic(replica, 'Replica')
+    db._routing.engine = replica
+    try:
+        assert [t.title for t in dbsession.query(Topic)] == ['Replica']
+        dbsession.add(Topic(title='Primary', content='...', username='cid'))
+        dbsession.flush()
+        # once the request wrote, it reads from the primary
+        assert db.routed_engine() is None
+        assert [t.title for t in dbsession.query(Topic)] == ['Primary']
+    finally:
+        db._routing.engine = None
+    transaction.abort()
+
+
+def test_unhealthy_replicas_are_skipped(replica, tmp_path):
+    broken = create_engine('sqlite:///%s' % (tmp_path / 'missing' / 'replica.sqlite'))
+    replicas = ReplicaSet([replica, broken])
+    replicas._pid = db.os.getpid()  # no background checker
+    replicas.check()
+    assert replicas.healthy == [True, False]
+    assert {replicas.choose() for _ in range(4)} == {replica}
+    replicas.healthy = [False, False]
+    assert replicas.choose() is None
+
+
+def test_replica_reads_are_not_cached_right_after_a_bump(replica):
+    cache = TaggedCache(MemoryBackend(), replica_window=5)
+    cache.invalidate_tags('topics')
+    calls = []
+
+    def creator():
+        calls.append(1)
+        return len(calls)
+
+    db._routing.engine = replica
+    try:
+        assert cache.get_or_create('topics', creator, tags=['topics']) == 1
+        assert cache.get_or_create('topics', creator, tags=['topics']) == 2
+    finally:
+        db._routing.engine = None
+    # the primary is always current
+    assert cache.get_or_create('topics', creator, tags=['topics']) == 3
+    assert cache.get_or_create('topics', creator, tags=['topics']) == 3
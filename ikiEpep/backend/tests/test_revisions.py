@@ -0,0 +1,104 @@
+from collections import namedtuple
+
+from forum import revisions
+from forum.revisions import apply_delta, decode, encode, make_delta
+
+from .test_app import _login
+
+Row = namedtuple('Row', 'snapshot data')
+
+LONG = 'The Buster Sword was passed from Angeal to Zack, and from Zack to Cloud. ' * 20
+
+
+def test_delta_round_trip():
+    old = 'Cloud joins AVALANCHE in Midgar.'
+    new = 'Cloud reluctantly joins AVALANCHE in Sector 7, Midgar!'
+    assert apply_delta(old, make_delta(old, new)) == new
+
+
+def test_delta_copies_unchanged_ranges():
+    old = 'one two three'
+    ops = make_delta(old, 'one two three four')
+    assert ops[0] == [0, len(old)]
+    assert ops[1:] == [' four']
+
+
+def test_delta_from_and_to_empty():
+    assert apply_delta('', make_delta('', 'new text')) == 'new text'
+    assert apply_delta('old text', make_delta('old text', '')) == ''
+
+
+def test_encode_first_revision_is_a_snapshot():
+    assert encode(None, 'hello', 0)[:2] == (True, 0)
+
+
+def test_encode_small_edit_is_a_delta():
+    snapshot, chain, data = encode(LONG, LONG + ' The end.', 3)
+    assert (snapshot, chain) == (False, 4)
+    assert decode([Row(True, encode(None, LONG, 0)[2]), Row(False, data)]) == LONG + ' The end.'
+
+
+def test_encode_snapshots_at_chain_limit(monkeypatch):
+    monkeypatch.setattr(revisions, 'SNAPSHOT_EVERY', 5)
+    assert encode(LONG, LONG + '!', 3)[:2] == (False, 4)
+    assert encode(LONG, LONG + '!', 4)[:2] == (True, 0)
+
+
+def test_encode_snapshots_when_delta_is_not_smaller():
+    assert encode('abc', 'xyz', 0)[:2] == (True, 0)
+
+
+def test_decode_chain():
+    versions = [LONG]
+    for i in range(5):
+        versions.append(versions[-1].replace('Zack', 'Zack %d' % i, 1) + ' Edit %d.' % i)
+    rows, chain = [], 0
+    for previous, content in zip([None] + versions, versions):
+        snapshot, chain, data = encode(previous, content, chain)
+        rows.append(Row(snapshot, data))
+    assert rows[0].snapshot and not any(row.snapshot for row in rows[1:])
+    for number in range(len(versions)):
+        assert decode(rows[:number + 1]) == versions[number]
+
+
+def _edit(testapp, topic_id, headers, **changes):
+    return testapp.put_json('/api/topics/%d' % topic_id, changes, headers=headers, expect_errors=True)
+
+
+def test_edit_history(testapp):
+    headers = _login(testapp, 'aerith')
+    topic_id = testapp.post_json('/api/topics', {'title': 'Flowers', 'content': LONG, 'username': 'aerith'},
+                                 headers=headers).json['id']
+    _edit(testapp, topic_id, headers, content=LONG + ' Sold in Sector 5.')
+    _edit(testapp, topic_id, headers, title='Flowers, one gil each')
+    # no change, no revision
+    _edit(testapp, topic_id, headers, title='Flowers, one gil each')
+
+    listing = testapp.get('/api/topics/%d/revisions?limit=2' % topic_id).json
+    assert [row['number'] for row in listing['revisions']] == [3, 2]
+    assert listing['next_before'] == 2
+    assert testapp.get('/api/topics/%d/revisions?before=2' % topic_id).json['revisions'][0]['snapshot']
+
+    assert testapp.get('/api/topics/%d/revisions/1' % topic_id).json['content'] == LONG
+    second = testapp.get('/api/topics/%d/revisions/2' % topic_id)
+    assert second.json['content'] == LONG + ' Sold in Sector 5.'
+    testapp.get('/api/topics/%d/revisions/2' % topic_id, headers={'If-None-Match': second.headers['ETag']},
+                status=304)
+    testapp.get('/api/topics/%d/revisions/9' % topic_id, status=404)
+
+
+def test_failed_edit_is_rolled_back(testapp, monkeypatch):
+    headers = _login(testapp, 'aerith')
+    topic_id = testapp.post_json('/api/topics', {'title': 'Flowers', 'content': LONG, 'username': 'aerith'},
+                                 headers=headers).json['id']
+
+    def broken(*args):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(revisions, 'record_edit', broken)
+    assert _edit(testapp, topic_id, headers, content='Gone').status_int == 500
+    # the flushed edit was not committed without its revision
+    assert testapp.get('/api/topics/%d' % topic_id).json['content'] == LONG
+
+    assert _edit(testapp, topic_id, {'Authorization': 'Bearer nonsense'}, content='x').status_int == 401
+    testapp.post_json('/api/topics', {'title': 'x', 'content': 'x', 'username': 'x'},
+                      headers={'Authorization': 'Bearer nonsense'}, status=401)
@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+
+import pytest
+import transaction
+
+from forum import search
+from forum.models.topic import Topic
+from forum.search import InvertedIndex, search_topics, tokenize
+from forum.views.topic import search_topics_view
+
+
+def test_tokenize():
+    assert tokenize("Cloud's Buster-Sword, a 2nd look!") == ['cloud', 'buster', 'sword', '2nd', 'look']
+    assert tokenize(None) == []
+
+
+@pytest.fixture
+def index():
+    index = InvertedIndex()
+    index.add(1, 'Materia guide', 'How to level materia fast', 'yuffie')
+    index.add(2, 'Chocobo breeding', 'Feed them greens; materia is useless here', 'cid')
+    index.add(3, 'Weapons', 'The Ultima Weapon fight needs materia', 'materia')
+    return index
+
+
+def test_every_term_must_match(index):
+    assert [topic_id for topic_id, rank in index.search('materia weapon', 10)] == [3]
+    assert index.search('materia unicorn', 10) == []
+    assert index.search('!!', 10) == []
+
+
+def test_title_outranks_content(index):
+    ranked = index.search('materia', 10)
+    assert ranked[0][0] == 1
+    assert {topic_id for topic_id, rank in ranked} == {1, 2, 3}
+    assert ranked == sorted(ranked, key=lambda item: -item[1])
+
+
+def test_limit_and_offset(index):
+    ranked = index.search('materia', 10)
+    assert index.search('materia', 2) == ranked[:2]
+    assert index.search('materia', 2, offset=2) == ranked[2:]
+
+
+def test_add_replaces_and_remove_drops(index):
+    index.add(2, 'Chocobo racing', 'Gold Saucer', 'cid')
+    assert 2 not in [topic_id for topic_id, rank in index.search('materia', 10)]
+    assert index.search('saucer', 10)[0][0] == 2
+    index.remove(2)
+    assert index.search('saucer', 10) == []
+    assert 'saucer' not in index._postings
+
+
+@pytest.fixture
+def live_index(monkeypatch, dbsession):
+    monkeypatch.setattr(search, 'index', InvertedIndex())
+    dbsession.add(Topic(title='Materia guide', content='Level it fast', username='yuffie'))
+    transaction.commit()
+    assert [topic_id for topic_id, rank in search_topics('materia', 10)]
+    return search.index
+
+
+def _ids(query):
+    return [topic_id for topic_id, rank in search_topics(query, 10)]
+
+
+def test_index_follows_commits(dbsession, live_index):
+    dbsession.add(Topic(title='Chocobo breeding', content='Greens', username='cid'))
+    dbsession.flush()
+    assert _ids('chocobo') == []  # not committed yet
+    transaction.commit()
+    [topic_id] = _ids('chocobo')
+
+    topic = dbsession.get(Topic, topic_id)
+    topic.title = 'Chocobo racing'
+    transaction.commit()
+    assert _ids('breeding') == []
+    assert _ids('racing') == [topic_id]
+
+    dbsession.delete(dbsession.get(Topic, topic_id))
+    transaction.commit()
+    assert _ids('chocobo') == []
+
+
+def test_aborted_changes_never_reach_the_index(dbsession, live_index):
+    dbsession.add(Topic(title='Chocobo breeding', content='Greens', username='cid'))
+    dbsession.flush()
+    transaction.abort()
+    assert 'search_pending' not in dbsession().info
+    # a later commit must not apply them either
+    dbsession.add(Topic(title='Weapons', content='Ultima', username='cid'))
+    transaction.commit()
+    assert _ids('chocobo') == []
+    assert len(_ids('ultima')) == 1
+
+
+def _search(make_request, query):
+    request = make_request('/api/topics/search?' + query)
+    request.matched_route = SimpleNamespace(name='search_topics')  # for @cached_view
+    return request, search_topics_view(request)
+
+
+def test_view(make_request, dbsession, monkeypatch):
+    monkeypatch.setattr(search, 'index', InvertedIndex())
+    for n in range(3):
+        dbsession.add(Topic(title='Materia %d' % n, content='x' * 300, username='yuffie'))
+    dbsession.flush()
+
+    _, page = _search(make_request, 'q=materia&limit=2')
+    assert len(page['results']) == 2
+    assert page['next_offset'] == 2
+    assert {'id', 'title', 'excerpt', 'rank'} <= set(page['results'][0])
+    _, page = _search(make_request, 'q=materia&limit=2&offset=2')
+    assert len(page['results']) == 1
+    assert page['next_offset'] is None
+
+    request, body = _search(make_request, 'q=+')
+    assert request.response.status_code == 400
+    request, body = _search(make_request, 'q=materia&offset=x')
+    assert request.response.status_code == 400
@@ -0,0 +1,125 @@
+import math
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from forum import trending
+from forum.models.topic import Topic
+from forum.models.topic_score import TopicScore
+from forum.writebehind import WriteBehindBuffer
+
+from .test_app import _login
+
+
+@pytest.fixture
+def app_settings(app_settings):
+    # the test flushes the buffer itself
+    return dict(app_settings, **{'forum.trending.flush_interval': '3600'})
+
+
+def _scores(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(select(TopicScore.topic_id, TopicScore.score)).all())
+
+
+def _add_topics(engine, *created):
+    with engine.begin() as conn:
+        return [
+            conn.execute(Topic.__table__.insert().values(
+                title='Topic %d' % n, content='...', username='yuffie', created_at=at, updated_at=at,
+            )).inserted_primary_key[0]
+            for n, at in enumerate(created)
+        ]
+
+
+def test_logaddexp():
+    assert trending.logaddexp(math.log(2), math.log(3)) == pytest.approx(math.log(5))
+    # far apart scores must not overflow
+    assert trending.logaddexp(1000.0, 0.0) == pytest.approx(1000.0)
+
+
+def test_hotness_halves_every_half_life():
+    at = datetime(2026, 1, 1)
+    score = trending.event_score(4.0, at)
+    assert trending.hotness(score, at) == pytest.approx(4.0)
+    later = at + timedelta(hours=trending.HALF_LIFE_HOURS)
+    assert trending.hotness(score, later) == pytest.approx(2.0)
+
+
+def test_apply_scores_folds_events_in(engine):
+    now = datetime.utcnow()
+    first, second, gone = _add_topics(engine, now, now, now)
+    with engine.begin() as conn:
+        conn.execute(Topic.__table__.delete().where(Topic.id == gone))
+
+    trending.apply_scores(engine, {first: trending.event_score(1.0, now)})
+    trending.apply_scores(engine, {
+        first: trending.event_score(1.0, now),
+        second: trending.event_score(1.5, now),
+        gone: trending.event_score(1.0, now),
+    })
+    scores = _scores(engine)
+    # deleted topics get no row
+    assert set(scores) == {first, second}
+    assert trending.hotness(scores[first], now) == pytest.approx(2.0)
+    assert scores[first] > scores[second]
+
+
+def test_compact_and_rebuild(engine):
+    now = datetime.utcnow()
+    old, new = _add_topics(engine, now - timedelta(days=60), now)
+    assert trending.rebuild(engine) == 2
+    # only the missing ones the second time
+    assert trending.rebuild(engine) == 0
+
+    assert trending.compact(engine, now) == 1
+    assert set(_scores(engine)) == {new}
+    assert trending.rebuild(engine, missing_only=False) == 2
+
+
+def test_trending_view_orders_by_activity(testapp):
+    headers = _login(testapp, 'yuffie')
+    ids = [
+        testapp.post_json('/api/topics', {'title': title, 'content': 'Materia', 'username': 'yuffie'},
+                          headers=headers).json['id']
+        for title in ('Wutai', 'Da-chao', 'Pagoda')
+    ]
+    # the middle topic gets replies and views, the others none
+    for _ in range(3):
+        testapp.post_json('/api/topics/%d/posts' % ids[1], {'content': 'Nice'}, headers=headers)
+        testapp.get('/api/topics/%d' % ids[1])
+    assert trending.buffer.stats()['pending_keys'] == 1
+    assert trending.buffer.flush() == 1
+
+    topics = testapp.get('/api/topics/trending?limit=2').json['topics']
+    assert [topic['id'] for topic in topics] == [ids[1], ids[2]]
+    assert topics[0]['hotness'] > topics[1]['hotness']
+    assert 'forum_writebehind_flushes_total{buffer="trending"}' in testapp.get('/metrics').text
+    testapp.get('/api/topics/trending?limit=many', status=400)
+
+
+def test_buffer_combines_and_retries_failed_flushes():
+    written, fail = [], [True]
+
+    def flush(batch):
+        if fail[0]:
+            raise RuntimeError('database is down')
+        written.append(batch)
+
+    buffer = WriteBehindBuffer('test', flush, interval=3600)
+    buffer.add('a', 1)
+    buffer.add('a', 2)
+    buffer.add('b', 5)
+    assert buffer.flush() == 0
+    assert buffer.stats()['failures'] == 1
+
+    # values added after the failure are merged with the ones put back
+    buffer.add('a', 10)
+    fail[0] = False
+    assert buffer.flush() == 2
+    assert written == [{'a': 13, 'b': 5}]
+    assert buffer.flush() == 0
+    stats = buffer.stats()
+    assert stats['pending_keys'] == 0
+    assert stats['flushed_keys'] == 2